@@ -10,8 +10,20 @@ from pathlib import Path
 from werkzeug.utils import secure_filename
 from utils.event_notifier import notify_event
 from utils.auth import get_current_user
+from utils.data_versions import bump_for_endpoint
 from utils.db import get_db_connection, db_config
 from controllers.reports_controller import reports_bp
+from controllers.ai_metrics_controller import ai_metrics_bp
+from services.archive_service import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVED_TABLES,
+    archive_closed_requirements,
+    archive_table_name,
+    ensure_archive_tables,
+    pipeline_source,
+    wants_archived,
+)
+from utils.profile_digest import backfill_profile_digests, ensure_profile_digest_schema, store_profile_digest
 try:
     from dotenv import load_dotenv
 except ImportError:
@@ -21,6 +33,7 @@ except ImportError:
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173"]}}, supports_credentials=True)
 app.register_blueprint(reports_bp)
+app.register_blueprint(ai_metrics_bp)
 
 # -------------------------------------
 # Environment loading (.env preferred; fallback to config.env for local dev)
@@ -38,6 +51,22 @@ if load_dotenv:
 else:
     print("⚠️ python-dotenv not installed, using system environment variables")
 
+
+# -------------------------------------
+# Table versions for AI chat context caching (utils/data_versions.py)
+# and incremental updates of the chat retrieval and entity indexes
+# (utils/retrieval_index.py, utils/entity_index.py)
+# -------------------------------------
+@app.after_request
+def bump_data_versions(response):
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        bump_for_endpoint(request.endpoint)
+        from utils import entity_index, retrieval_index
+        response_json = response.get_json(silent=True) if response.is_json and not response.is_streamed else None
+        retrieval_index.note_write(request.endpoint, request.view_args, response_json)
+        entity_index.note_write(request.endpoint, request.view_args, response_json)
+    return response
+
 # -------------------------------------
 # Database connection configuration
 # -------------------------------------
@@ -368,7 +397,48 @@ def initialize_database():
             );
         """)
 
+        # Async screening job columns (imported lazily: utils.gemini reads env at import)
+        from services.screening_queue import ensure_screening_queue_schema
+        try:
+            ensure_screening_queue_schema(cursor)
+        except Exception as e:
+            print(f"❌ Error updating assesment_queue schema: {e}")
+
+        # Screening result cache (+ candidate_screening.result_source)
+        from utils.screening_cache import ensure_screening_cache_schema
+        try:
+            ensure_screening_cache_schema(cursor)
+        except Exception as e:
+            print(f"❌ Error creating screening cache table: {e}")
+
+        # Compact candidate profile digests for prompts
+        try:
+            ensure_profile_digest_schema(cursor)
+        except Exception as e:
+            print(f"❌ Error adding profile_digest column: {e}")
+
+        # Per-call LLM token/latency accounting and per-user daily budgets
+        from utils.llm_usage import ensure_llm_usage_schema
+        try:
+            ensure_llm_usage_schema(cursor)
+        except Exception as e:
+            print(f"❌ Error creating llm_usage tables: {e}")
+
+        # ---------------- ARCHIVE TIER (closed requirements) ----------------
+        try:
+            ensure_archive_tables(cursor)
+        except Exception as e:
+            print(f"❌ Error creating archive tables: {e}")
+
         conn.commit()
+
+        try:
+            backfilled = backfill_profile_digests(conn)
+            if backfilled:
+                print(f"🧾 Backfilled profile digests for {backfilled} candidates")
+        except Exception as e:
+            print(f"❌ Error backfilling profile digests: {e}")
+
         cursor.close()
         conn.close()
 
@@ -574,6 +644,9 @@ def submit_candidate():
             """, (name, email, phone, skills, education, experience,
                   filename, ctc, ectc))
 
+        # Compact profile line reused by screening prompts and chat context
+        store_profile_digest(cursor, cursor.lastrowid, skills, experience, education)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -717,6 +790,8 @@ def update_candidate(id):
                 WHERE id=%s
             """, (name, email, phone, skills, education, experience, ctc, ectc, id))
 
+        store_profile_digest(cursor, id, skills, experience, education)
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -1514,6 +1589,10 @@ def create_requirement():
 @app.route("/api/candidate-tracker/<int:candidate_id>", methods=["GET"])
 def get_candidate_tracker(candidate_id):
     try:
+        include_archived = wants_archived(request.args)
+        progress_src = pipeline_source("candidate_progress", include_archived)
+        screening_src = pipeline_source("candidate_screening", include_archived)
+
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
@@ -1525,7 +1604,7 @@ def get_candidate_tracker(candidate_id):
 
         # Single Query to get requirements + stages + progress
         # We join requirements with stages and then left join candidate_progress
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 r.id AS req_id, r.title, r.client_id, c.name AS client_name, r.no_of_rounds,
                 rs.id AS stage_id, rs.stage_order, rs.stage_name,
@@ -1533,11 +1612,11 @@ def get_candidate_tracker(candidate_id):
             FROM requirements r
             LEFT JOIN clients c ON c.id = r.client_id
             JOIN requirement_stages rs ON rs.requirement_id = r.id
-            LEFT JOIN candidate_progress cp ON cp.stage_id = rs.id AND cp.candidate_id = %s
+            LEFT JOIN {progress_src} cp ON cp.stage_id = rs.id AND cp.candidate_id = %s
             WHERE r.id IN (
-                SELECT DISTINCT requirement_id FROM candidate_progress WHERE candidate_id = %s
+                SELECT DISTINCT p.requirement_id FROM {progress_src} p WHERE p.candidate_id = %s
                 UNION
-                SELECT DISTINCT requirement_id FROM candidate_screening WHERE candidate_id = %s
+                SELECT DISTINCT s.requirement_id FROM {screening_src} s WHERE s.candidate_id = %s
             )
             ORDER BY r.created_at DESC, rs.stage_order ASC
         """, (candidate_id, candidate_id, candidate_id))
@@ -1746,9 +1825,10 @@ def assign_requirement():
 @app.route("/requirements/<string:req_id>/allocations", methods=["GET"])
 def get_requirement_allocations(req_id):
     try:
+        allocations_src = pipeline_source("requirement_allocations", wants_archived(request.args))
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 ra.id,
                 ra.requirement_id,
@@ -1759,7 +1839,7 @@ def get_requirement_allocations(req_id):
                 recruiter.name AS recruiter_name,
                 assigner.name AS assigned_by_name,
                 req.title AS requirement_title
-            FROM requirement_allocations ra
+            FROM {allocations_src} ra
             LEFT JOIN users recruiter ON recruiter.id = ra.recruiter_id
             LEFT JOIN users assigner ON assigner.id = ra.assigned_by
             LEFT JOIN requirements req ON req.id = ra.requirement_id
@@ -1782,8 +1862,9 @@ def get_recruiter_requirements(recruiter_id):
         if not conn:
             return jsonify({"error": "Database connection failed"}), 500
 
+        allocations_src = pipeline_source("requirement_allocations", wants_archived(request.args))
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 ra.id AS allocation_id,
                 ra.requirement_id,
@@ -1800,7 +1881,7 @@ def get_recruiter_requirements(recruiter_id):
                 req.created_by,
                 client.name AS client_name,
                 assigner.name AS assigned_by
-            FROM requirement_allocations ra
+            FROM {allocations_src} ra
             JOIN requirements req ON req.id = ra.requirement_id
             LEFT JOIN clients client ON client.id = req.client_id
             LEFT JOIN users assigner ON assigner.id = ra.assigned_by
@@ -1890,7 +1971,17 @@ def delete_requirement(req_id):
             (req_id,)
         )
 
-        # 7. Finally, delete the requirement itself
+        # 7. Drop any archived pipeline rows for this requirement
+        for table in ARCHIVED_TABLES:
+            try:
+                cursor.execute(
+                    f"DELETE FROM {archive_table_name(table)} WHERE requirement_id = %s",
+                    (req_id,)
+                )
+            except Exception:
+                pass  # Archive tables may not exist yet
+
+        # 8. Finally, delete the requirement itself
         cursor.execute(
             "DELETE FROM requirements WHERE id = %s",
             (req_id,)
@@ -1909,6 +2000,27 @@ def delete_requirement(req_id):
         cursor.close()
         conn.close()
 
+# -----------------------------
+#  Archive closed requirements (admin)
+# -----------------------------
+@app.route("/api/admin/archive-requirements", methods=["POST"])
+def archive_requirements():
+    requester = get_current_user()
+    if not requester or (requester.get("role") or "").upper() != "ADMIN":
+        return jsonify({"error": "Only ADMIN can archive requirements"}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        days = int(data.get("older_than_days", request.args.get("days", ARCHIVE_AFTER_DAYS)))
+        batch_size = int(data.get("batch_size", 50))
+    except (TypeError, ValueError):
+        return jsonify({"error": "older_than_days and batch_size must be integers"}), 400
+
+    summary = archive_closed_requirements(days, batch_size, dry_run=bool(data.get("dry_run")))
+    status = 500 if summary.get("error") else 200
+    return jsonify(summary), status
+
+
 @app.route("/recent-requirements", methods=["GET"])
 def recent_requirements():
     try:
@@ -2051,10 +2163,31 @@ def update_requirement(req_id):
         req_id
     ))
 
+    # Track when a requirement was closed so the archive job can age it out
+    if str(data["status"] or "").upper() == "CLOSED":
+        if str(row.get("status") or "").upper() != "CLOSED":
+            cursor.execute("UPDATE requirements SET closed_at=%s WHERE id=%s", (datetime.now(), req_id))
+    else:
+        cursor.execute("UPDATE requirements SET closed_at=NULL WHERE id=%s", (req_id,))
+
+    # Existing AI scores are stale once the screened fields change: re-screen in the background.
+    # A closed requirement needs no fresh scores, so its pending re-screens are dropped.
+    rescreen_queued = 0
+    if str(data["status"] or "").upper() != "CLOSED":
+        from services.rescreen_service import schedule_rescreen, screening_fields_changed
+        try:
+            if screening_fields_changed(row, data):
+                rescreen_queued = schedule_rescreen(conn, req_id)
+        except Exception as e:
+            print(f"⚠️ Could not queue re-screening for requirement {req_id}: {e}")
+    else:
+        from services.screening_queue import cancel_rescreens
+        cancel_rescreens(cursor, [req_id])
+
     conn.commit()
     cursor.close()
     conn.close()
-    return jsonify({"message": "Requirement updated"})
+    return jsonify({"message": "Requirement updated", "rescreen_queued": rescreen_queued})
 
 
 
@@ -2464,6 +2597,8 @@ def delete_user(id):
 @app.route("/api/reports/stats", methods=["GET"])
 def get_reports_stats():
     try:
+        progress_src = pipeline_source("candidate_progress", wants_archived(request.args))
+
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
@@ -2483,13 +2618,13 @@ def get_reports_stats():
 
         # 3. Selections (Qualified Candidates)
         # Candidates who have status='COMPLETED' in the LAST round of any requirement
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 c.name as candidate_name,
                 r.title as requirement_title,
                 cl.name as client_name,
                 cp.updated_at as selection_date
-            FROM candidate_progress cp
+            FROM {progress_src} cp
             JOIN candidates c ON c.id = cp.candidate_id
             JOIN requirements r ON r.id = cp.requirement_id
             JOIN requirement_stages rs ON rs.id = cp.stage_id
@@ -2535,18 +2670,19 @@ def get_candidate_progress():
 
     try:
         cursor = conn.cursor(dictionary=True)
+        progress_src = pipeline_source("candidate_progress", wants_archived(request.args))
 
-        sql = """
+        sql = f"""
             SELECT cp.id, cp.candidate_id, cp.requirement_id, cp.stage_name,
                    cp.status, c.name AS candidate_name,
                    rs.stage_name
-            FROM candidate_progress cp
+            FROM {progress_src} cp
             LEFT JOIN candidates c ON cp.candidate_id = c.id
             LEFT JOIN requirement_stages rs ON cp.stage_id = rs.id
             WHERE cp.id IN (
-                SELECT MAX(id)
-                FROM candidate_progress
-                GROUP BY candidate_id
+                SELECT MAX(latest.id)
+                FROM {progress_src} latest
+                GROUP BY latest.candidate_id
             )
             ORDER BY cp.id
         """
@@ -2580,6 +2716,7 @@ if __name__ == '__main__':
     from controllers.ai_chat_controller import register_ai_routes
     from controllers.ai_jd_controller import jd_bp
     from controllers.ai_screening import screening_bp
+    from services.screening_queue import start_screening_workers
     initialize_database()
     ensure_admin_exists()
     ensure_user_status_defaults()
@@ -2587,4 +2724,7 @@ if __name__ == '__main__':
     register_ai_routes(app)
     app.register_blueprint(jd_bp)
     app.register_blueprint(screening_bp)
+    # Background workers for async screening jobs (skip the reloader's parent process)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_screening_workers()
     app.run(debug=True, port=5001)
@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from typing import Any, Dict, Optional
-
-from utils.llm_client import call_llm
+import re
+
+from utils.answer_cache import cached_answer
+from utils.chat_context_cache import cached_context, role_scope, user_scope
+from utils.context_assembler import assemble_context
+from utils.entity_index import find_entities, requirements_of_clients
+from utils.llm_client import call_llm, is_failure_reply, stream_llm
+from utils.retrieval_index import search_records
+from utils.sse import SSE_HEADERS, sse_event
 from services.ai_data_service import (
-	get_candidate_by_name_for_user,
+	get_candidate_by_id_for_user,
 	get_candidate_track_for_user,
 	get_interviews_for_user,
 	get_requirement_by_id_for_user,
@@ -19,7 +26,8 @@ from services.ai_data_service import (
     list_candidates_for_user,
     list_requirement_allocations,
     list_usersdata,
-    build_user_self_context,
+    ContextGatherer,
+    self_context_fetchers,
     get_candidate_progress_for_requirement,
     get_candidates_in_last_round,
     get_qualified_candidates,
@@ -32,7 +40,8 @@ ai_bp = Blueprint("ai", __name__, url_prefix="/api/ai")
 
 DATA_CONTEXT_PROMPT = (
 	"The ATS database includes these tables and columns:\n"
-	"- candidates: id, name, email, phone, skills, education, experience, ctc, ectc, resume_filename, created_by, created_at, source\n"
+	"- candidates: id, name, email, phone, skills, education, experience, ctc, ectc, resume_filename, created_by, created_at, source "
+	"(in context data, skills/experience/education arrive as one 'profile' digest: 'skills: ... | exp: <years>y | edu: ...')\n"
 	"- requirements: id, client_id, title, description, location, skills_required, experience_required, ctc_range, no_of_rounds, status, created_at, created_by\n"
 	"- requirement_stages: id, requirement_id, stage_order, stage_name, is_mandatory (tracks custom stage names like 'Technical Round', 'HR Round')\n"
 	"- candidate_progress: id, candidate_id, requirement_id, stage_id, stage_name, status (PENDING/IN_PROGRESS/COMPLETED/REJECTED), decision, manual_decision, updated_at (tracks stage progress)\n"
@@ -44,6 +53,9 @@ DATA_CONTEXT_PROMPT = (
 	"- usersdata: id, name, email, phone, role, status, created_at\n"
 	"- interaction_logs: id, session_id, user_id, user_role, message_in, message_out, emotion, created_at (history of avatar chats)\n\n"
 	"If the context contains self_profile, self_assignments, use them to answer questions about the logged-in user.\n"
+	"Keys listed under 'unavailable' could not be loaded for this message; say that data is temporarily unavailable instead of guessing.\n"
+	"'relevant_records' holds the requirements, candidates, clients and interviews whose text best matches the question (type, relevance, fields); use them when the question names something the other keys don't cover.\n"
+	"Long lists are cut to the rows most relevant to the question; 'omitted' gives each cut list's full total and counts by status/role. Use those numbers for totals and mention that more records exist when it matters.\n"
 	"Role rules: ADMIN and DELIVERY_MANAGER can see everything. RECRUITERS see only their allocated requirements, candidates they added, and interviews relevant to them. CLIENTS see only their own data.\n"
 	"Never invent data. If a record is missing, say so directly dont give all colums or tables name just say missing or cannot find it or you wont have access if that particular role doesnt have access to it or you dont have access to it."
 )
@@ -82,154 +94,247 @@ def _detect_intent(message: str) -> str:
 	return "general"
 
 
-def _process_chat_request(user: Dict[str, Any], message: str, system_prompt: str) -> Dict[str, Any]:
+# Tables every answer is built from: the self context blocks and relevant_records
+ANSWER_TABLES = ("users", "usersdata", "requirements", "requirement_allocations", "clients", "candidates", "interviews")
+
+# Further tables read for an intent's context
+INTENT_TABLES = {
+	"requirement": ("requirement_stages", "candidate_progress", "candidate_screening"),
+	"screening": ("candidate_screening",),
+	"logs": ("interaction_logs",),
+}
+
+
+def _process_chat_request(user: Dict[str, Any], message: str, system_prompt: str, feature: str = "chat") -> Dict[str, Any]:
 	"""
 	Core logic to gather context and call LLM.
 	Returns a dict with 'answer' and 'context'.
+	A repeated question from the same user is answered from the answer cache
+	until one of the tables its intent reads changes.
 	"""
-	# 1) Simple routing/intent
-	intent = _detect_intent(message)
+	tables = ANSWER_TABLES + INTENT_TABLES.get(_detect_intent(message), ())
+	result, _hit = cached_answer(
+		feature,
+		message,
+		user_scope(user),
+		tables,
+		lambda: _answer_chat_request(user, message, system_prompt, feature),
+		_cacheable_result,
+	)
+	return result
+
+
+def _cacheable_result(result: Dict[str, Any]) -> bool:
+	"""Only complete answers are reused: no errors, no context blocks missing, no LLM failure reply."""
+	return "error" not in result and "unavailable" not in result["context"] and not is_failure_reply(result["answer"])
 
-	context: Dict[str, Any] = {"user": {"id": user.get("id"), "role": user.get("role"), "client_id": user.get("client_id")}, "query": message}
-	self_context = build_user_self_context(user)
-	if self_context:
-		context.update(self_context)
 
+def _answer_chat_request(user: Dict[str, Any], message: str, system_prompt: str, feature: str) -> Dict[str, Any]:
+	context = _base_context(user, message)
 	try:
-		# 2) Fetch ATS data with role-based filtering
-		if intent == "requirement":
-			# try to extract a requirement id pattern like R-123
-			req_id = None
-			for tok in message.replace("#", " ").replace(",", " ").split():
-				if tok.upper().startswith("R-") or tok.upper().startswith("REQ-"):
-					req_id = tok.upper().replace("REQ-", "R-")
-					break
-			
-			# If no explicit ID found, try to match by Title/Client from user's accessible list
-			if not req_id:
-				all_reqs = []
-				role = user.get("role", "").upper()
-				if role == "ADMIN":
-					all_reqs = list_requirements_for_admin()
-				elif role == "RECRUITER":
-					all_reqs = list_requirements_for_recruiter(user.get("id"))
-				elif role == "CLIENT":
-					all_reqs = list_requirements_for_client(user.get("client_id"))
-				
-				msg_lower = message.lower()
-				best_match = None
-				
-				for r in all_reqs:
-					title = (r.get("title") or "").lower()
-					client = (r.get("client_name") or "").lower()
-					
-					score = 0
-					if title and title in msg_lower:
-						score += 2
-					if client and client in msg_lower:
-						score += 3
-					
-					if score > 0:
-						if best_match is None or score > best_match[1]:
-							best_match = (r["id"], score)
-				
-				if best_match:
-					req_id = best_match[0]
-
-			# if explicit id present fetch exact, else leave None and let LLM summarize available lists
-			context["requirement"] = get_requirement_by_id_for_user(req_id, user) if req_id else None
-			if req_id:
-				context["allocations"] = get_allocations_for_requirement(req_id)
-				# Add tracking data for the requirement
-				context["candidate_progress"] = get_candidate_progress_for_requirement(req_id, user)
-				context["tracking_stats"] = get_tracking_stats_for_requirement(req_id, user)
-				# Check if asking about last round or qualified candidates
-				if any(k in message.lower() for k in ["last round", "final round", "qualified", "passed", "selected", "completed"]):
-					context["candidates_in_last_round"] = get_candidates_in_last_round(req_id, user)
-					context["qualified_candidates"] = get_qualified_candidates(req_id, user)
-			# For admins, if no specific requirement id, include full list
-			if not req_id and (user.get("role", "").upper() == "ADMIN"):
-				context["requirements"] = list_requirements_for_admin()
-
-		elif intent == "client":
-			# extract numeric/id after 'client'
-			client_id = None
-			parts = message.split()
-			if "client" in [p.lower() for p in parts]:
-				idx = [p.lower() for p in parts].index("client")
-				if idx + 1 < len(parts):
-					client_id = parts[idx + 1]
-			# Specific client details
-			context["client"] = get_client_by_id_for_user(client_id, user) if client_id else None
-			# Also include this client's requirements for convenience
-			if context.get("client"):
-				context["requirements"] = list_requirements_for_client(client_id)
-			# Generic client listing
-			if any(k in (message.lower()) for k in ["clients", "all clients", "list clients", "get clients"]) and not context.get("client"):
-				context["clients"] = list_clients_for_user(user)
-
-		elif intent == "allocations":
-			# recruiter scope
-			if user.get("role", "").upper() == "RECRUITER":
-				context["requirements"] = list_requirements_for_recruiter(user.get("id"))
-			else:
-				context["requirements"] = []
-
-		elif intent == "candidates":
-			# Fetch candidates list for admin and delivery manager
-			context["candidates"] = list_candidates_for_user(user)
-			# Also try to extract candidate name if mentioned
-			ml = message.lower()
-			for word in message.split():
-				if len(word) > 2:  # Skip very short words
-					candidate = get_candidate_by_name_for_user(word, user)
-					if candidate:
-						context["candidate"] = candidate
-						break
-
-
-		elif intent == "interview":
-			from services.ai_data_service import get_interviews_for_user
-			context["interviews"] = get_interviews_for_user(user)
-
-		elif intent == "screening":
-			from services.ai_data_service import get_candidate_screening_for_user
-			context["screenings"] = get_candidate_screening_for_user(user)
-
-		elif intent == "logs":
-			from services.ai_data_service import get_interaction_logs_for_admin
-			if user.get("role", "").upper() == "ADMIN":
-				context["logs"] = get_interaction_logs_for_admin()
-			else:
-				context["logs"] = "Access Denied. Only Admin can view logs."
-
-		elif intent == "users":
-			# If admin wants users/recruiters, include list; else scope appropriately
-			role = (user.get("role") or "").upper()
-			if role == "ADMIN":
-				context["users"] = list_users_for_admin()
-				context["usersdata"] = list_usersdata()
-			else:
-				context["recruiters"] = list_recruiters_for_user(user)
-
-		# If admin or delivery manager with a general question, provide broad context to answer freely
-		if (user.get("role", "").upper() in ["ADMIN", "DELIVERY_MANAGER"]) and intent == "general":
-			# Load key datasets so LLM can answer "anything" within ATS
-			context["clients"] = context.get("clients") or list_clients_for_user(user)
-			context["users"] = context.get("users") or list_users_for_admin()
-			context["usersdata"] = context.get("usersdata") or list_usersdata()
-			context["requirements"] = context.get("requirements") or list_requirements_for_admin()
-			context["candidates"] = context.get("candidates") or list_candidates_for_user(user)
-			context["allocations"] = context.get("allocations") or list_requirement_allocations()
-
-		# 3) Call LLM with system prompt, original question, and structured context
-		answer = call_llm(system_prompt, context, message)
+		_gather_chat_context(user, message, context)
+
+		# 4) Call LLM with system prompt, original question, and structured context
+		answer = call_llm(system_prompt, context, message, feature=feature, user_id=user.get("id"))
 		return {"answer": answer, "context": context}
 
 	except Exception as e:
 		return {"answer": f"AI processing failed: {e}", "context": context, "error": str(e)}
 
 
+# Tables each cached context block is read from; a write to any of them reloads the block
+CONTEXT_TABLES = {
+	"self_profile": ("users", "usersdata"),
+	"self_assignments": ("requirement_allocations", "requirements", "clients", "users"),
+	"self_candidates": ("candidates",),
+	"self_org_stats": ("requirements", "candidates", "users", "clients"),
+	"requirements": ("requirements", "clients", "requirement_allocations"),
+	"requirement_allocations": ("requirement_allocations", "requirements", "users"),
+	"clients": ("clients", "requirements", "requirement_allocations"),
+	"candidates": ("candidates", "requirement_allocations"),
+	"users": ("users",),
+	"usersdata": ("usersdata",),
+	"recruiters": ("users", "requirement_allocations", "requirements"),
+}
+
+# Same for every user of a role
+ROLE_SHARED_BLOCKS = {"self_org_stats"}
+
+
+def _cached(name: str, user: Dict[str, Any], loader, shared_by_role: bool = False) -> Any:
+	"""Context block `name` from the chat context cache; org-wide lists are shared by role."""
+	scope = role_scope(user) if shared_by_role or name in ROLE_SHARED_BLOCKS else user_scope(user)
+	return cached_context(name, CONTEXT_TABLES[name], loader, scope)
+
+
+def _base_context(user: Dict[str, Any], message: str) -> Dict[str, Any]:
+	return {"user": {"id": user.get("id"), "role": user.get("role"), "client_id": user.get("client_id")}, "query": message}
+
+
+def _match_requirement(user: Dict[str, Any], role: str, mentioned: Dict[str, Any]) -> Optional[str]:
+	"""
+	Best requirement named in the message among those the user can see:
+	a matching title scores 2, a matching client name 3; ties go to the newest.
+	"""
+	if role == "ADMIN":
+		allowed = None
+	elif role == "RECRUITER":
+		allowed = {r["id"] for r in _cached("requirements", user, lambda: list_requirements_for_recruiter(user.get("id")))}
+	elif role == "CLIENT":
+		allowed = {r["id"] for r in _cached("requirements", user, lambda: list_requirements_for_client(user.get("client_id")))}
+	else:
+		return None
+
+	scores: Dict[Any, list] = {}
+	for req in mentioned["requirement"]:
+		scores.setdefault(req["id"], [0, req["rank"]])[0] += 2
+	for req in requirements_of_clients(c["id"] for c in mentioned["client"]):
+		scores.setdefault(req["id"], [0, req["rank"]])[0] += 3
+
+	candidates = [(-score, rank, req_id) for req_id, (score, rank) in scores.items() if allowed is None or req_id in allowed]
+	return min(candidates)[2] if candidates else None
+
+
+def _gather_chat_context(user: Dict[str, Any], message: str, context: Dict[str, Any]) -> None:
+	"""
+	Fill `context` in place with the ATS data relevant to the message (role-filtered).
+	Independent fetchers run concurrently (ContextGatherer); whatever misses the
+	deadline or fails is listed under context["unavailable"].
+	"""
+	gather = ContextGatherer()
+	for key, fetch in self_context_fetchers(user).items():
+		gather.submit(key, _cached, key, user, fetch)
+	# Best lexical matches across requirements/candidates/clients/interviews, whatever the intent
+	gather.submit("relevant_records", search_records, message, user)
+
+	# 1) Simple routing/intent
+	intent = _detect_intent(message)
+	role = (user.get("role") or "").upper()
+
+	# 2) Fetch ATS data with role-based filtering
+	if intent == "requirement":
+		# try to extract a requirement id pattern like R-123
+		req_id = None
+		for tok in message.replace("#", " ").replace(",", " ").split():
+			if tok.upper().startswith("R-") or tok.upper().startswith("REQ-"):
+				req_id = tok.upper().replace("REQ-", "R-")
+				break
+		
+		# If no explicit ID found, try to match by Title/Client (or id) among the user's accessible requirements
+		if not req_id:
+			req_id = _match_requirement(user, role, find_entities(message, ("requirement", "client")))
+
+		# if explicit id present fetch exact, else leave None and let LLM summarize available lists
+		context["requirement"] = None
+		if req_id:
+			gather.submit("requirement", get_requirement_by_id_for_user, req_id, user)
+			gather.submit("allocations", get_allocations_for_requirement, req_id)
+			# Add tracking data for the requirement
+			gather.submit("candidate_progress", get_candidate_progress_for_requirement, req_id, user)
+			gather.submit("tracking_stats", get_tracking_stats_for_requirement, req_id, user)
+			# Check if asking about last round or qualified candidates
+			if any(k in message.lower() for k in ["last round", "final round", "qualified", "passed", "selected", "completed"]):
+				gather.submit("candidates_in_last_round", get_candidates_in_last_round, req_id, user)
+				gather.submit("qualified_candidates", get_qualified_candidates, req_id, user)
+		# For admins, if no specific requirement id, include full list
+		if not req_id and role == "ADMIN":
+			gather.submit("requirements", _cached, "requirements", user, list_requirements_for_admin, True)
+
+	elif intent == "client":
+		# extract numeric/id after 'client'
+		client_id = None
+		parts = message.split()
+		if "client" in [p.lower() for p in parts]:
+			idx = [p.lower() for p in parts].index("client")
+			if idx + 1 < len(parts):
+				client_id = parts[idx + 1]
+		# A client named in the message beats a non-numeric word after 'client'
+		if not (client_id and client_id.isdigit()):
+			named = find_entities(message, ("client",))["client"]
+			if named:
+				client_id = str(named[0]["id"])
+		# Specific client details, plus this client's requirements for convenience (kept only if the client is visible)
+		context["client"] = None
+		if client_id:
+			gather.submit("client", get_client_by_id_for_user, client_id, user)
+			gather.submit("requirements", list_requirements_for_client, client_id)
+		# Generic client listing (dropped below when a specific client was found)
+		if any(k in (message.lower()) for k in ["clients", "all clients", "list clients", "get clients"]):
+			gather.submit("clients", _cached, "clients", user, lambda: list_clients_for_user(user))
+
+	elif intent == "allocations":
+		# recruiter scope
+		if role == "RECRUITER":
+			gather.submit("requirements", _cached, "requirements", user, lambda: list_requirements_for_recruiter(user.get("id")))
+		else:
+			context["requirements"] = []
+
+	elif intent == "candidates":
+		# Fetch candidates list for admin and delivery manager
+		gather.submit("candidates", _cached, "candidates", user, lambda: list_candidates_for_user(user))
+		# Also include the best-matching candidate if one is named (full name or email beats first name/surname)
+		named = find_entities(message, ("candidate",))["candidate"]
+		if named:
+			gather.submit("candidate", get_candidate_by_id_for_user, named[0]["id"], user)
+
+	elif intent == "interview":
+		from services.ai_data_service import get_interviews_for_user
+		gather.submit("interviews", get_interviews_for_user, user)
+
+	elif intent == "screening":
+		from services.ai_data_service import get_candidate_screening_for_user
+		gather.submit("screenings", get_candidate_screening_for_user, user)
+
+	elif intent == "logs":
+		from services.ai_data_service import get_interaction_logs_for_admin
+		if role == "ADMIN":
+			gather.submit("logs", get_interaction_logs_for_admin)
+		else:
+			context["logs"] = "Access Denied. Only Admin can view logs."
+
+	elif intent == "users":
+		# If admin wants users/recruiters, include list; else scope appropriately
+		if role == "ADMIN":
+			gather.submit("users", _cached, "users", user, list_users_for_admin, True)
+			gather.submit("usersdata", _cached, "usersdata", user, list_usersdata, True)
+		else:
+			gather.submit("recruiters", _cached, "recruiters", user, lambda: list_recruiters_for_user(user))
+		# A recruiter named in the message (visibility checked by get_recruiter_by_query)
+		named = find_entities(message, ("recruiter",))["recruiter"]
+		if named:
+			gather.submit("recruiter", get_recruiter_by_query, str(named[0]["id"]), user)
+
+	# If admin or delivery manager with a general question, provide broad context to answer freely
+	if role in ["ADMIN", "DELIVERY_MANAGER"] and intent == "general":
+		# Load key datasets so LLM can answer "anything" within ATS
+		gather.submit("clients", _cached, "clients", user, lambda: list_clients_for_user(user))
+		gather.submit("users", _cached, "users", user, list_users_for_admin, True)
+		gather.submit("usersdata", _cached, "usersdata", user, list_usersdata, True)
+		gather.submit("requirements", _cached, "requirements", user, list_requirements_for_admin, True)
+		gather.submit("candidates", _cached, "candidates", user, lambda: list_candidates_for_user(user))
+		gather.submit("allocations", _cached, "requirement_allocations", user, list_requirement_allocations, True)
+
+	results, missing = gather.collect()
+
+	if intent == "client" and "client" in gather:
+		if results.get("client"):
+			results.pop("clients", None)
+			missing.pop("clients", None)
+		else:
+			results.pop("requirements", None)
+			missing.pop("requirements", None)
+
+	context.update(results)
+	if missing:
+		context["unavailable"] = missing
+
+	# 3) Keep the prompt within the token budget: most relevant rows, the rest as counts
+	assembled = assemble_context(context, message)
+	if assembled is not context:
+		context.clear()
+		context.update(assembled)
+
+
 @ai_bp.route("/chat", methods=["POST"])
 def chat() -> Any:
 	data = request.get_json() or {}
@@ -261,20 +366,36 @@ def avatar_chat() -> Any:
 	if not message:
 		return jsonify({"text": "I'm listening...", "emotion": "NEUTRAL"}), 400
 
-	result = _process_chat_request(user, message, AVATAR_SYSTEM_PROMPT)
+	result = _process_chat_request(user, message, AVATAR_SYSTEM_PROMPT, feature="avatar")
 	raw_answer = result.get("answer", "I'm having trouble connecting to my brain right now.")
 	
 	# Extract emotion tag
-	emotion = "NEUTRAL"
-	clean_text = raw_answer
+	emotion, clean_text = _split_emotion(raw_answer)
+	clean_text = clean_text.strip()
 	
-	import re
-	match = re.search(r"^\s*\[(HAPPY|NEUTRAL|THINKING|CONCERNED|EXCITED|SAD)\]", raw_answer, re.IGNORECASE)
-	if match:
-		emotion = match.group(1).upper()
-		clean_text = re.sub(r"^\s*\[(HAPPY|NEUTRAL|THINKING|CONCERNED|EXCITED|SAD)\]", "", raw_answer, flags=re.IGNORECASE).strip()
+	_log_interaction(session_id, user, message, clean_text, emotion)
 	
-	# TODO: Log interaction with session_id
+	return jsonify({
+		"text": clean_text,
+		"emotion": emotion
+	}), 200
+
+
+EMOTION_TAG_RE = re.compile(r"^\s*\[(HAPPY|NEUTRAL|THINKING|CONCERNED|EXCITED|SAD)\]", re.IGNORECASE)
+
+
+def _split_emotion(raw_answer: str):
+	"""
+	Return (emotion, text without the leading emotion tag).  Only whitespace
+	after the tag is dropped: a streamed chunk keeps its end.
+	"""
+	match = EMOTION_TAG_RE.search(raw_answer)
+	if match:
+		return match.group(1).upper(), EMOTION_TAG_RE.sub("", raw_answer).lstrip()
+	return "NEUTRAL", raw_answer
+
+
+def _log_interaction(session_id, user: Dict[str, Any], message: str, text: str, emotion: str) -> None:
 	try:
 		from utils.db import get_db_connection
 		conn = get_db_connection()
@@ -283,17 +404,97 @@ def avatar_chat() -> Any:
 			cursor.execute("""
 				INSERT INTO interaction_logs (session_id, user_id, user_role, message_in, message_out, emotion)
 				VALUES (%s, %s, %s, %s, %s, %s)
-			""", (session_id, user.get("id"), user.get("role"), message, clean_text, emotion))
+			""", (session_id, user.get("id"), user.get("role"), message, text, emotion))
 			conn.commit()
 			cursor.close()
 			conn.close()
 	except Exception as e:
 		print(f"Failed to log interaction: {e}")
-	
-	return jsonify({
-		"text": clean_text,
-		"emotion": emotion
-	}), 200
+
+
+def _sse_response(events) -> Response:
+	return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@ai_bp.route("/chat/stream", methods=["POST"])
+def chat_stream() -> Any:
+	"""
+	Streaming /chat. SSE events: `token` {"text": chunk} as Gemini generates,
+	then `done` {"answer": full_text, "context": {...}} (or `error`).
+	"""
+	data = request.get_json() or {}
+	message = (data.get("message") or "").strip()
+	user = data.get("user") or {}
+
+	if not user or not user.get("role"):
+		return jsonify({"answer": "Unauthorized: missing user/role.", "context": None}), 401
+	if not message:
+		return jsonify({"answer": "Please provide a message.", "context": None}), 400
+
+	def events():
+		context = _base_context(user, message)
+		try:
+			_gather_chat_context(user, message, context)
+			parts = []
+			for chunk in stream_llm(DEFAULT_SYSTEM_PROMPT, context, message, feature="chat", user_id=user.get("id")):
+				parts.append(chunk)
+				yield sse_event({"text": chunk}, event="token")
+			yield sse_event({"answer": "".join(parts), "context": context}, event="done")
+		except Exception as e:
+			yield sse_event({"answer": f"AI processing failed: {e}", "error": str(e)}, event="error")
+
+	return _sse_response(events())
+
+
+@ai_bp.route("/avatar-chat/stream", methods=["POST"])
+def avatar_chat_stream() -> Any:
+	"""
+	Streaming /avatar-chat. SSE events: `emotion` {"emotion": ...} as soon as
+	the leading tag is known, `token` {"text": chunk} (tag stripped), then
+	`done` {"text": full_text, "emotion": ...}.  The interaction is logged
+	when the stream closes, including when the client disconnects early.
+	"""
+	data = request.get_json() or {}
+	message = (data.get("message") or "").strip()
+	user = data.get("user") or {}
+	session_id = data.get("session_id")
+
+	if not user or not user.get("role"):
+		return jsonify({"text": "I need to know who you are first.", "emotion": "NEUTRAL"}), 401
+	if not message:
+		return jsonify({"text": "I'm listening...", "emotion": "NEUTRAL"}), 400
+
+	def events():
+		emotion, pending, parts = None, "", []
+		try:
+			context = _base_context(user, message)
+			_gather_chat_context(user, message, context)
+			for chunk in stream_llm(AVATAR_SYSTEM_PROMPT, context, message, feature="avatar", user_id=user.get("id")):
+				if emotion is None:
+					# Buffer until the leading "[TAG]" is complete (or clearly absent)
+					pending += chunk
+					head = pending.lstrip()
+					if head.startswith("[") and "]" not in head and len(head) < 16:
+						continue
+					emotion, chunk = _split_emotion(pending)
+					yield sse_event({"emotion": emotion}, event="emotion")
+					if not chunk:
+						continue
+				parts.append(chunk)
+				yield sse_event({"text": chunk}, event="token")
+
+			if emotion is None:
+				emotion, tail = _split_emotion(pending or "I'm having trouble connecting to my brain right now.")
+				yield sse_event({"emotion": emotion}, event="emotion")
+				parts.append(tail)
+				yield sse_event({"text": tail}, event="token")
+			yield sse_event({"text": "".join(parts).strip(), "emotion": emotion}, event="done")
+		except Exception as e:
+			yield sse_event({"text": f"AI processing failed: {e}", "emotion": "CONCERNED", "error": str(e)}, event="error")
+		finally:
+			_log_interaction(session_id, user, message, "".join(parts).strip(), emotion or "NEUTRAL")
+
+	return _sse_response(events())
 
 
 def register_ai_routes(app) -> None:
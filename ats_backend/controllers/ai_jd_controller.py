@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from utils.auth import get_current_user
 from utils.llm_client import call_llm
 import json
 
@@ -22,7 +23,8 @@ def jd_to_requirement():
         )
 
         # call_llm signature: (system, context, user_message)
-        llm_output = call_llm(system_prompt, {}, jd_text)
+        requester = get_current_user() or {}
+        llm_output = call_llm(system_prompt, {}, jd_text, feature="jd", user_id=requester.get("id"))
         
         # Try to parse JSON from LLM response (it might be wrapped in markdown or have extra text)
         try:
@@ -0,0 +1,151 @@
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, jsonify, request
+from utils.auth import get_current_user
+from utils.context_cache import context_cache_stats, reset_context_cache_stats
+from utils.llm_scheduler import reset_scheduler_stats, scheduler_stats
+from utils.llm_transport import reset_transport_metrics, transport_metrics
+from utils.llm_usage import (
+    daily_budget,
+    set_daily_budget,
+    tokens_spent_today,
+    usage_buffer_stats,
+    usage_summary,
+)
+from utils.model_router import reset_routing_stats, routing_stats
+
+ai_metrics_bp = Blueprint('ai_metrics', __name__)
+
+
+def _is_admin(user):
+    return bool(user) and (user.get("role") or "").upper() == "ADMIN"
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+@ai_metrics_bp.route('/api/ai/metrics', methods=['GET'])
+def get_ai_metrics():
+    """LLM transport counters and latency histograms (per call site), model routing, scheduler queues."""
+    requester = get_current_user()
+    if not _is_admin(requester):
+        return jsonify({"error": "Only ADMIN can view AI metrics"}), 403
+    # lazily: these modules read env at import
+    from services.ai_data_service import context_gather_stats
+    from utils.answer_cache import answer_cache_stats
+    from utils.chat_context_cache import chat_context_cache_stats
+    from utils.context_assembler import context_assembly_stats
+    from utils.entity_index import entity_index_stats
+    from utils.gemini import parse_stats
+    from utils.retrieval_index import retrieval_index_stats
+    return jsonify({
+        "transport": transport_metrics(),
+        "context_cache": context_cache_stats(),
+        "chat_context_cache": chat_context_cache_stats(),
+        "chat_context_gather": context_gather_stats(),
+        "entity_index": entity_index_stats(),
+        "retrieval_index": retrieval_index_stats(),
+        "chat_context_assembly": context_assembly_stats(),
+        "answer_cache": answer_cache_stats(),
+        "routing": routing_stats(),
+        "scheduler": scheduler_stats(),
+        "screening_parse": parse_stats(),
+    }), 200
+
+
+@ai_metrics_bp.route('/api/ai/metrics/reset', methods=['POST'])
+def reset_ai_metrics():
+    requester = get_current_user()
+    if not _is_admin(requester):
+        return jsonify({"error": "Only ADMIN can reset AI metrics"}), 403
+    reset_transport_metrics()
+    reset_context_cache_stats()
+    reset_routing_stats()
+    reset_scheduler_stats()
+    from services.ai_data_service import reset_context_gather_stats
+    from utils.answer_cache import reset_answer_cache_stats
+    from utils.chat_context_cache import reset_chat_context_cache_stats
+    from utils.context_assembler import reset_context_assembly_stats
+    from utils.entity_index import reset_entity_index_stats
+    from utils.gemini import reset_parse_stats
+    from utils.retrieval_index import reset_retrieval_index_stats
+    reset_chat_context_cache_stats()
+    reset_context_gather_stats()
+    reset_entity_index_stats()
+    reset_retrieval_index_stats()
+    reset_answer_cache_stats()
+    reset_context_assembly_stats()
+    reset_parse_stats()
+    return jsonify({"message": "AI metrics reset"}), 200
+
+
+@ai_metrics_bp.route('/api/ai/usage', methods=['GET'])
+def get_ai_usage():
+    """
+    Token/latency aggregates from llm_usage.
+    Query: group_by=feature|model|user|outcome|day, days=7 or from/to=YYYY-MM-DD, user_id.
+    """
+    requester = get_current_user()
+    if not _is_admin(requester):
+        return jsonify({"error": "Only ADMIN can view AI usage"}), 403
+
+    try:
+        if request.args.get("from"):
+            since = _parse_day(request.args["from"])
+        else:
+            days = int(request.args.get("days", 7))
+            since = datetime.combine(date.today() - timedelta(days=max(days, 1) - 1), datetime.min.time())
+        # "to" is inclusive of the whole day
+        until = _parse_day(request.args["to"]) + timedelta(days=1) if request.args.get("to") else None
+        user_id = request.args.get("user_id", type=int)
+        rows = usage_summary(request.args.get("group_by", "feature"), since, until, user_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "group_by": request.args.get("group_by", "feature"),
+        "from": since.date().isoformat(),
+        "to": (until - timedelta(days=1)).date().isoformat() if until else None,
+        "rows": rows,
+        "buffer": usage_buffer_stats(),
+    }), 200
+
+
+@ai_metrics_bp.route('/api/ai/usage/me', methods=['GET'])
+def get_my_ai_usage():
+    requester = get_current_user()
+    if not requester or not requester.get("id"):
+        return jsonify({"error": "Authentication required"}), 401
+    user_id = requester["id"]
+    spent = tokens_spent_today(user_id)
+    budget = daily_budget(user_id)
+    return jsonify({
+        "user_id": user_id,
+        "tokens_today": spent,
+        "daily_budget": budget or None,
+        "remaining": max(budget - spent, 0) if budget else None,
+    }), 200
+
+
+@ai_metrics_bp.route('/api/ai/usage/budgets/<int:user_id>', methods=['PUT'])
+def put_ai_budget(user_id):
+    """Body: {"daily_tokens": N} to override LLM_DAILY_TOKEN_BUDGET for a user, null to clear."""
+    requester = get_current_user()
+    if not _is_admin(requester):
+        return jsonify({"error": "Only ADMIN can set AI budgets"}), 403
+
+    data = request.get_json(silent=True) or {}
+    if "daily_tokens" not in data:
+        return jsonify({"error": "daily_tokens is required (null clears the override)"}), 400
+    daily_tokens = data["daily_tokens"]
+    if daily_tokens is not None:
+        try:
+            daily_tokens = int(daily_tokens)
+        except (TypeError, ValueError):
+            return jsonify({"error": "daily_tokens must be an integer or null"}), 400
+        if daily_tokens < 0:
+            return jsonify({"error": "daily_tokens must be >= 0"}), 400
+
+    set_daily_budget(user_id, daily_tokens)
+    return jsonify({"user_id": user_id, "daily_tokens": daily_tokens}), 200
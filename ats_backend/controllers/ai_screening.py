@@ -1,20 +1,35 @@
-from flask import Blueprint, request, jsonify
-from utils.gemini import run_gemini_screening
-from utils.gemini import run_gemini_screening
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from services.ai_data_service import get_db_connection
+from services.archive_service import pipeline_source, wants_archived
+from services.batch_screening import SCREEN_BATCH_CONCURRENCY, BatchRequestError, build_batch_pairs, run_batch
+from services.screening_queue import enqueue_screening, find_active_screening_job, get_screening_job
+from services.screening_service import (
+    SCREEN_PACK_SIZE,
+    notify_screen_complete,
+    resolve_requirement,
+    screen_and_record_once,
+    touch_candidate_progress,
+)
+from utils.auth import get_current_user
+from utils.idempotency import idempotent
+from utils.llm_usage import usage_context
+from utils.screening_cache import invalidate_screening_cache
+from utils.sse import SSE_HEADERS, sse_event
 import pymysql.cursors
 import requests
-import json
+import time
 
 screening_bp = Blueprint('screening', __name__, url_prefix="/api")
 
 
 @screening_bp.route("/screen-candidate", methods=["POST"])
+@idempotent("screen-candidate")
 def screen_candidate():
     try:
         body = request.json or {}
         candidate_id = body.get("candidate_id")
         requirement_ref = body.get("requirement_id") or body.get("requirement_ref")
+        run_async = bool(body.get("async")) or request.args.get("async") in ("1", "true")
 
         if not candidate_id:
             return jsonify({"error": "candidate_id is required"}), 400
@@ -31,107 +46,50 @@ def screen_candidate():
         cursor.execute("SELECT * FROM candidates WHERE id = %s", (candidate_id,))
         candidate = cursor.fetchone()
 
-        requirement = _resolve_requirement(cursor, requirement_ref)
+        requirement = resolve_requirement(cursor, requirement_ref)
 
         if not candidate:
             return jsonify({"error": "Candidate not found"}), 404
         if not requirement:
             return jsonify({"error": "Requirement not found"}), 404
 
-        # --- AI Screening ---
-        ai_success = False
-        ai_error_msg = None
-        normalized_output = {}
-
-        try:
-            ai_output = run_gemini_screening(candidate, requirement)
-            normalized_output, normalize_error = _normalize_ai_output(ai_output)
-            if normalize_error:
-                ai_error_msg = normalize_error
-            else:
-                ai_success = True
-        except Exception as ai_e:
-            ai_error_msg = str(ai_e)
-            print(f"⚠️ Gemini screening failed: {ai_e}")
-
-        # --- Tracker / Progress Update (RUNS EVEN IF AI FAILS) ---
-        
-        # 1. Insert Screening Record (only if success, or maybe partial?)
-        # For now, we only insert screening record if AI succeeded, 
-        # but we ALWAYS update candidate_progress to avoid "hanging" state.
-        
-        if ai_success:
-            cursor.execute("""
-                INSERT INTO candidate_screening
-                (candidate_id, requirement_id, ai_score, ai_rationale, recommend, red_flags, model_version)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (
-                candidate_id,
-                requirement["id"],
-                normalized_output["score"],
-                json.dumps(normalized_output["rationale"]),
-                normalized_output["recommend"],
-                json.dumps(normalized_output["red_flags"]),
-                "gemini-2.5"
-            ))
-            
-            # Update progress for success case
-            _touch_candidate_progress(
-                cursor,
-                candidate_id,
-                requirement["id"],
-                requirement.get("category", "IT"),
-                stage="Manual Review",
-                status="PENDING", # Was REVIEW_REQUIRED (invalid enum)
-                decision="NONE"
-            )
-            
-            # Queue for assessment
-            cursor.execute("SHOW TABLES LIKE 'assesment_queue'")
-            if cursor.fetchone():
-                cursor.execute("""
-                    INSERT INTO assesment_queue (candidate_id, requirement_id, status)
-                    VALUES (%s, %s, 'PENDING')
-                """, (candidate_id, requirement["id"]))
-                
-        else:
-            # AI Failed Case - Update tracker to indicate failure/manual need
-            print(f"⚠️ Updating tracker for failed screening: {ai_error_msg}")
-            _touch_candidate_progress(
-                cursor,
-                candidate_id,
-                requirement["id"],
-                requirement.get("category", "IT"),
-                stage="Screening Failed", 
-                status="PENDING",  # Was REVIEW_REQUIRED (invalid enum)
-                decision="HOLD"            # Valid ENUM (instead of RETRY_NEEDED)
-            )
-
-        conn.commit()
-        
-        # Webhook Notification (Best Effort)
-        if ai_success:
-            try:
-                requests.post(
-                    "http://localhost:5678/webhook/screen_complete",
-                    json={
-                        "candidate_id": candidate_id,
-                        "requirement_id": requirement["id"],
-                        "ai_score": normalized_output.get("score"),
-                        "recommend": normalized_output.get("recommend")
-                    },
-                    timeout=3
-                )
-            except requests.RequestException:
-                print("⚠️ Could not send event to n8n (server offline).")
+        # --- Async mode: enqueue and return immediately ---
+        if run_async:
+            # A duplicate of a job that is still queued/running gets that job back
+            job_id = find_active_screening_job(cursor, candidate_id, requirement["id"])
+            deduplicated = job_id is not None
+            if not deduplicated:
+                job_id = enqueue_screening(cursor, candidate_id, requirement["id"], body.get("callback_url"))
+                conn.commit()
+            cursor.close()
+            conn.close()
+            return jsonify({
+                "message": "Screening already queued" if deduplicated else "Screening queued",
+                "job_id": job_id,
+                "deduplicated": deduplicated,
+                "status": "PENDING",
+                "status_url": f"/api/screening-jobs/{job_id}",
+                "events_url": f"/api/screening-jobs/{job_id}/events",
+            }), 202
+
+        # --- AI Screening + Tracker / Progress Update (tracker RUNS EVEN IF AI FAILS) ---
+        requester = get_current_user() or {}
+        with usage_context(requester.get("id")):
+            normalized_output, ai_error_msg, source, shared = screen_and_record_once(conn, cursor, candidate, requirement)
+
+        # Cached and coalesced results were already announced when first computed
+        if normalized_output and source not in ("memory", "db") and not shared:
+            notify_screen_complete(candidate_id, requirement["id"], normalized_output)
 
         cursor.close()
         conn.close()
 
-        if ai_success:
+        if normalized_output:
             return jsonify({
                 "message": "✅ Candidate screened successfully!",
-                "result": normalized_output
+                "result": normalized_output,
+                "source": source,
+                "coalesced": shared
             }), 200
         else:
             # Return success (200) even if AI failed, because we successfully created a manual tracker entry.
@@ -146,6 +104,118 @@ def screen_candidate():
         return jsonify({"error": str(e)}), 500
 
 
+@screening_bp.route("/screen-batch", methods=["POST"])
+def screen_batch():
+    """
+    Screen many pairs at once. Body:
+      {"requirement_id": ..., "candidate_ids": [...]} or {"requirement_id": ..., "filter": {...}}
+      {"candidate_id": ..., "all_open_requirements": true}
+    Optional: "prerank" (true or {"top_k": 50, "min_score": 60}: heuristic
+    shortlist of the requirement's pool before any LLM call), "concurrency", "pack_size" (candidates per LLM prompt, 1 disables
+    packing), "stream" (default true → SSE progress events).
+    """
+    body = request.get_json(silent=True) or {}
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+
+    try:
+        pairs = build_batch_pairs(cursor, body)
+    except BatchRequestError as e:
+        cursor.close()
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        cursor.close()
+        print("❌ screen_batch error:", e)
+        return jsonify({"error": str(e)}), 500
+
+    concurrency = body.get("concurrency") or SCREEN_BATCH_CONCURRENCY
+    pack_size = body.get("pack_size") or SCREEN_PACK_SIZE
+    requester = get_current_user() or {}
+    batch = run_batch(cursor, conn, pairs, concurrency, pack_size, user_id=requester.get("id"))
+
+    if body.get("stream", True) is False:
+        results, summary = [], {}
+        for event, data in batch:
+            if event == "progress":
+                results.append(data)
+            else:
+                summary = data
+        cursor.close()
+        status = 500 if "error" in summary else 200
+        return jsonify({**summary, "results": results}), status
+
+    def generate():
+        try:
+            yield sse_event({"total": len(pairs)}, event="start")
+            for event, data in batch:
+                yield sse_event(data, event=event)
+        finally:
+            batch.close()  # saves packs still running before the cursor goes
+            cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+@screening_bp.route("/admin/screening-cache/invalidate", methods=["POST"])
+def invalidate_screening_cache_route():
+    """Body: {"requirement_id": ...} and/or {"model": ...}; {"all": true} clears everything."""
+    requester = get_current_user()
+    if not requester or (requester.get("role") or "").upper() != "ADMIN":
+        return jsonify({"error": "Only ADMIN can invalidate the screening cache"}), 403
+
+    body = request.get_json(silent=True) or {}
+    requirement_id = body.get("requirement_id")
+    model = body.get("model")
+    if not requirement_id and not model and not body.get("all"):
+        return jsonify({"error": "requirement_id, model or all=true is required"}), 400
+
+    try:
+        removed = invalidate_screening_cache(requirement_id=requirement_id, model=model)
+        return jsonify({"message": "Screening cache invalidated", "removed": removed}), 200
+    except Exception as e:
+        print("❌ invalidate_screening_cache error:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@screening_bp.route("/screening-jobs/<int:job_id>", methods=["GET"])
+def get_screening_job_status(job_id):
+    try:
+        job = get_screening_job(job_id)
+        if not job:
+            return jsonify({"error": "Screening job not found"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        print("❌ get_screening_job_status error:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@screening_bp.route("/screening-jobs/<int:job_id>/events", methods=["GET"])
+def stream_screening_job(job_id):
+    """SSE stream: emits `status` events until the job is DONE/ERROR/CANCELLED (or times out, 1-600 s)."""
+    timeout = max(1.0, min(request.args.get("timeout", 120, type=float), 600.0))
+
+    def generate():
+        deadline = time.time() + timeout
+        last_status = None
+        while time.time() < deadline:
+            job = get_screening_job(job_id)
+            if not job:
+                yield sse_event({"error": "Screening job not found"}, event="error")
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield sse_event(job, event="status")
+            if last_status in ("DONE", "ERROR", "CANCELLED"):
+                return
+            time.sleep(1)
+        yield sse_event({"job_id": job_id, "status": last_status}, event="timeout")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
 @screening_bp.route("/create-interview", methods=["POST"])
 def create_interview():
     try:
@@ -190,7 +260,7 @@ def create_interview():
             data.get("notes", ""),
             data.get("status", "Scheduled")
         ))
-        _touch_candidate_progress(
+        touch_candidate_progress(
             cursor,
             data["candidate_id"],
             data["requirement_id"],
@@ -220,14 +290,15 @@ def get_interviews():
         cursor = conn.cursor()
 
         # Removed _ensure_screening_tables(cursor)
+        interviews_src = pipeline_source("interviews", wants_archived(request.args))
 
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 i.*,
                 c.name AS candidate_name,
                 c.email AS candidate_email,
                 r.title AS requirement_title
-            FROM interviews i
+            FROM {interviews_src} i
             LEFT JOIN candidates c ON c.id = i.candidate_id
             LEFT JOIN requirements r ON r.id = i.requirement_id
             WHERE i.status != 'Cancelled'
@@ -265,7 +336,7 @@ def update_stage():
         )
         conn.commit()
 
-        _touch_candidate_progress(
+        touch_candidate_progress(
             cursor,
             data["candidate_id"],
             data["requirement_id"],
@@ -307,7 +378,7 @@ def recruiter_decision():
 
         # Removed _ensure_screening_tables(cursor)
 
-        requirement = _resolve_requirement(cursor, requirement_ref)
+        requirement = resolve_requirement(cursor, requirement_ref)
         if not requirement:
             return jsonify({"error": "Requirement not found"}), 404
 
@@ -389,7 +460,7 @@ def assign_candidate():
             return jsonify({"error": "Database connection failed"}), 500
         cursor = conn.cursor()
 
-        requirement = _resolve_requirement(cursor, requirement_ref)
+        requirement = resolve_requirement(cursor, requirement_ref)
         if not requirement:
             cursor.close()
             conn.close()
@@ -400,7 +471,7 @@ def assign_candidate():
         # If it exists, we might not want to reset it unless user explicit. 
         # For now, we'll just ensure it exists.
         
-        _touch_candidate_progress(
+        touch_candidate_progress(
             cursor,
             candidate_id,
             requirement["id"],
@@ -435,31 +506,33 @@ def get_candidate_progress(candidate_id, req_ref):
         if not candidate:
             return jsonify({"error": "Candidate not found"}), 404
 
-        requirement = _resolve_requirement(cursor, req_ref)
+        requirement = resolve_requirement(cursor, req_ref)
         if not requirement:
             return jsonify({"error": "Requirement not found"}), 404
 
-        cursor.execute("""
+        include_archived = wants_archived(request.args)
+
+        cursor.execute(f"""
             SELECT *
-            FROM candidate_progress
-            WHERE candidate_id=%s AND requirement_id=%s
+            FROM {pipeline_source("candidate_progress", include_archived)} cp
+            WHERE cp.candidate_id=%s AND cp.requirement_id=%s
         """, (candidate_id, requirement["id"]))
         progress = cursor.fetchone()
 
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT *
-            FROM candidate_screening
-            WHERE candidate_id=%s AND requirement_id=%s
-            ORDER BY created_at DESC
+            FROM {pipeline_source("candidate_screening", include_archived)} cs
+            WHERE cs.candidate_id=%s AND cs.requirement_id=%s
+            ORDER BY cs.created_at DESC
             LIMIT 1
         """, (candidate_id, requirement["id"]))
         screening = cursor.fetchone()
 
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT *
-            FROM interviews
-            WHERE candidate_id=%s AND requirement_id=%s
-            ORDER BY date DESC, time DESC
+            FROM {pipeline_source("interviews", include_archived)} i
+            WHERE i.candidate_id=%s AND i.requirement_id=%s
+            ORDER BY i.date DESC, i.time DESC
         """, (candidate_id, requirement["id"]))
         interviews = cursor.fetchall()
 
@@ -488,88 +561,3 @@ def get_candidate_progress(candidate_id, req_ref):
     except Exception as e:
         print("❌ get_candidate_progress error:", e)
         return jsonify({"error": str(e)}), 500
-
-
-# --------------------- Helper functions ---------------------
-
-def _touch_candidate_progress(cursor, candidate_id, requirement_id, category, stage, status="PENDING", decision="NONE"):
-    # Using stage_name instead of current_stage to match app.py schema
-    cursor.execute("""
-        INSERT INTO candidate_progress (candidate_id, requirement_id, category, stage_name, status, manual_decision)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            category=VALUES(category),
-            stage_name=VALUES(stage_name),
-            status=VALUES(status),
-            manual_decision=VALUES(manual_decision)
-    """, (candidate_id, requirement_id, category or "IT", stage, status, decision or "NONE"))
-
-
-def _resolve_requirement(cursor, identifier):
-    if not identifier:
-        return None
-
-    cursor.execute("SELECT * FROM requirements WHERE id = %s", (str(identifier),))
-    row = cursor.fetchone()
-    if row:
-        return row
-
-    cursor.execute(
-        """
-        SELECT * FROM requirements
-        WHERE LOWER(title) = LOWER(%s)
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        (identifier,)
-    )
-    row = cursor.fetchone()
-    if row:
-        return row
-
-    cursor.execute(
-        """
-        SELECT * FROM requirements
-        WHERE LOWER(CONCAT(title, ' ', COALESCE(location, ''))) LIKE %s
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        (f"%{identifier.lower()}%",)
-    )
-    return cursor.fetchone()
-
-
-def _normalize_ai_output(ai_output):
-    if not isinstance(ai_output, dict):
-        return None, "AI returned non-JSON output"
-
-    if ai_output.get("error"):
-        return None, ai_output.get("error")
-
-    try:
-        score = float(ai_output.get("score", 0))
-    except (TypeError, ValueError):
-        return None, "AI response missing numeric score"
-
-    rationale = ai_output.get("rationale") or []
-    if isinstance(rationale, str):
-        rationale = [rationale]
-    if not isinstance(rationale, list):
-        rationale = [str(rationale)]
-
-    red_flags = ai_output.get("red_flags") or []
-    if isinstance(red_flags, str):
-        red_flags = [red_flags]
-    if not isinstance(red_flags, list):
-        red_flags = [str(red_flags)]
-
-    recommend = (ai_output.get("recommend") or "NEEDS_INTERVIEW").upper()
-    if recommend not in {"SHORTLISTED", "REJECTED", "NEEDS_INTERVIEW"}:
-        recommend = "NEEDS_INTERVIEW"
-
-    return {
-        "score": round(score, 2),
-        "rationale": rationale,
-        "red_flags": red_flags,
-        "recommend": recommend
-    }, None
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from utils.db import get_db_connection
+from services.archive_service import pipeline_source, wants_archived
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -40,6 +41,7 @@ def get_requirement_stats(req_id):
         if not conn:
             return jsonify({"error": "Database connection failed"}), 500
         cursor = conn.cursor(dictionary=True)
+        progress_src = pipeline_source("candidate_progress", wants_archived(request.args))
         
         # Get requirement details (including amount for billing)
         cursor.execute("SELECT title, no_of_rounds, status, amount FROM requirements WHERE id=%s", (req_id,))
@@ -51,9 +53,9 @@ def get_requirement_stats(req_id):
             return jsonify({"error": "Requirement not found"}), 404
 
         # Get stats from candidate_progress
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT cp.stage_name, cp.status, COUNT(*) as count, rs.stage_order 
-            FROM candidate_progress cp
+            FROM {progress_src} cp
             LEFT JOIN requirement_stages rs ON rs.id = cp.stage_id
             WHERE cp.requirement_id=%s 
             AND cp.stage_name NOT IN ('Manual Review', 'Manual Assignments', 'Manual Assignment')
@@ -63,14 +65,14 @@ def get_requirement_stats(req_id):
         progress_stats = cursor.fetchall()
         
         # Get total candidates applied/mapped
-        cursor.execute("SELECT COUNT(DISTINCT candidate_id) as total FROM candidate_progress WHERE requirement_id=%s", (req_id,))
+        cursor.execute(f"SELECT COUNT(DISTINCT cp.candidate_id) as total FROM {progress_src} cp WHERE cp.requirement_id=%s", (req_id,))
         total_res = cursor.fetchone()
         total_candidates = total_res['total'] if total_res else 0
 
         # Get selections (candidates who are hired/selected - Completed LAST round)
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(DISTINCT cp.candidate_id) as count
-            FROM candidate_progress cp
+            FROM {progress_src} cp
             JOIN requirements r ON r.id = cp.requirement_id
             JOIN requirement_stages rs ON rs.id = cp.stage_id
             WHERE cp.requirement_id = %s
@@ -103,11 +105,12 @@ def get_stage_candidates(req_id):
         if not conn:
             return jsonify({"error": "Database connection failed"}), 500
         cursor = conn.cursor(dictionary=True)
+        progress_src = pipeline_source("candidate_progress", wants_archived(request.args))
 
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 c.id, c.name, c.email, cp.status, cp.updated_at
-            FROM candidate_progress cp
+            FROM {progress_src} cp
             JOIN candidates c ON c.id = cp.candidate_id
             WHERE cp.requirement_id=%s AND cp.stage_name=%s
         """, (req_id, stage_name))
@@ -141,7 +144,8 @@ def get_general_stats():
         cand_stats = cursor.fetchone()
 
         # Total Selections (This is tricky without a clear 'SELECTED' flag, approximating with 'COMPLETED' status in progress)
-        cursor.execute("SELECT COUNT(*) as count FROM candidate_progress WHERE status='COMPLETED'") # Approximation
+        progress_src = pipeline_source("candidate_progress", wants_archived(request.args))
+        cursor.execute(f"SELECT COUNT(*) as count FROM {progress_src} cp WHERE cp.status='COMPLETED'") # Approximation
         sel_stats = cursor.fetchone()
         selections_count = sel_stats['count'] if sel_stats else 0
 
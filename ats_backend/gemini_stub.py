@@ -0,0 +1,415 @@
+"""
+Local Gemini stub for load testing the AI paths without spending quota.
+
+Implements the `generateContent` and `streamGenerateContent?alt=sse` shapes
+parsed by utils/gemini.py and utils/llm_client.py, with configurable latency,
+error rates, 429 bursts and payloads.  Point the backend at it with:
+
+    python gemini_stub.py --port 8089 --latency lognormal:400,0.6 --error-rate 0.02
+    GEMINI_BASE_URL=http://127.0.0.1:8089 GEMINI_API_KEY=stub python app.py
+
+Latency specs: fixed:MS | uniform:MIN,MAX | normal:MEAN,STDDEV | lognormal:MEDIAN,SIGMA
+Every option can also be set through the matching STUB_* environment variable
+(e.g. STUB_LATENCY, STUB_ERROR_RATE).  GET /stats returns request counters.
+
+`POST /v1beta/cachedContents` stores a system instruction and returns its
+name; generateContent calls that reference it get the stored text prepended
+and report it as cachedContentTokenCount.  --prompt-ms-per-1k adds latency
+per 1k uncached prompt tokens so the effect of context caching is visible.
+
+--model-latency "gemini-2.5-flash-lite=fixed:80;gemini-2.5-pro=fixed:900"
+gives individual models their own latency, and --unknown-models answers 404
+for the listed models, to exercise utils/model_router.py.
+
+Recorded responses (used by screening_eval.py):
+
+    # once, online: proxy to the real API and record every answer
+    python gemini_stub.py --upstream https://generativelanguage.googleapis.com \
+        --upstream-key $GEMINI_API_KEY --record-file eval/recorded.json
+    # offline: answer recorded prompts with the recorded text
+    python gemini_stub.py --replay-file eval/recorded.json
+
+Recordings map sha256(prompt text) to the model's text; prompts missing from
+a replay file get the usual fake answer (counted as replay_misses).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+def parse_latency(spec):
+    """Return a zero-arg sampler (milliseconds) for a latency spec string."""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return lambda rng: rng.lognormvariate(math.log(max(median, 1.0)), sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+def parse_model_latency(spec):
+    """'model=spec;model=spec' -> {model: sampler}."""
+    samplers = {}
+    for item in (spec or "").split(";"):
+        model, _, latency = item.partition("=")
+        if model.strip() and latency.strip():
+            samplers[model.strip()] = parse_latency(latency.strip())
+    return samplers
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def load_recordings(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle).get("responses", {})
+
+
+def _stable_int(text, low, high):
+    digest = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+    return low + digest % (high - low + 1)
+
+
+def _screening_object(seed_text, candidate_id=None):
+    score = _stable_int(seed_text, 35, 95)
+    recommend = "SHORTLISTED" if score >= 75 else "REJECTED" if score <= 45 else "NEEDS_INTERVIEW"
+    result = {
+        "score": score,
+        "rationale": ["Stub evaluation of skills overlap", "Stub evaluation of experience"],
+        "recommend": recommend,
+        "red_flags": [] if score > 50 else ["Stub: weak match"],
+    }
+    if candidate_id is not None:
+        result = {"candidate_id": candidate_id, **result}
+    return result
+
+
+def fake_output(prompt):
+    """Deterministic answer matching what the calling module expects to parse."""
+    if "JSON array" in prompt:
+        ids = re.findall(r"- id=(\S+?) \|", prompt)
+        return json.dumps([_screening_object(prompt + cid, int(cid) if cid.isdigit() else cid) for cid in ids])
+    if '"score"' in prompt and "recommend" in prompt:
+        return json.dumps(_screening_object(prompt))
+    if "Extract structured information from the job description" in prompt:
+        return json.dumps({
+            "title": "Software Engineer",
+            "location": "Remote",
+            "skills_required": "Python, SQL",
+            "experience_required": "3-5 years",
+            "ctc_range": "10-15 LPA",
+            "ectc_range": "12-18 LPA",
+            "description": "Stub requirement extracted from the job description.",
+        })
+    question = re.search(r"User Question: (.*)", prompt)
+    topic = question.group(1).strip()[:120] if question else "your request"
+    emotion = "[HAPPY] " if "emotion tag" in prompt else ""
+    return (
+        f"{emotion}Stub reply: here is a summary for: {topic}. "
+        "This answer was generated by the local Gemini stub and contains no real analysis."
+    )
+
+
+class StubState:
+    def __init__(self, options):
+        self.options = options
+        self.sample_latency = parse_latency(options.latency)
+        self.model_latency = parse_model_latency(options.model_latency)
+        self.unknown_models = {m.strip() for m in (options.unknown_models or "").split(",") if m.strip()}
+        self.rng = random.Random(options.seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "hung": 0, "streams": 0,
+                         "cache_created": 0, "cache_rejected": 0, "cache_hits": 0, "cache_misses": 0,
+                         "replay_hits": 0, "replay_misses": 0, "recorded": 0, "models": {}}
+        self.cached_contents = {}
+        self.fixed_payload = None
+        if options.payload_file:
+            with open(options.payload_file, encoding="utf-8") as handle:
+                self.fixed_payload = handle.read()
+        self.replay = load_recordings(options.replay_file)
+        self.recorded = load_recordings(options.record_file) if options.record_file else {}
+
+    def draw(self, model=None):
+        """Decide this request's fate under the lock so runs with a seed are repeatable."""
+        with self.lock:
+            self.counters["requests"] += 1
+            number = self.counters["requests"]
+            latency_ms = self.model_latency.get(model, self.sample_latency)(self.rng)
+            roll = self.rng.random()
+            opts = self.options
+            in_burst = opts.burst_every > 0 and (number - 1) % opts.burst_every < opts.burst_length
+            if in_burst or roll < opts.rate_429:
+                fate = "429"
+            elif roll < opts.rate_429 + opts.error_rate:
+                fate = "error"
+            elif roll < opts.rate_429 + opts.error_rate + opts.hang_rate:
+                fate = "hang"
+            elif roll < opts.rate_429 + opts.error_rate + opts.hang_rate + opts.malformed_rate:
+                fate = "malformed"
+            else:
+                fate = "ok"
+            return fate, latency_ms
+
+    def record(self, prompt, text):
+        with self.lock:
+            self.recorded[prompt_key(prompt)] = text
+            self.counters["recorded"] += 1
+            snapshot = dict(self.recorded)
+        with open(self.options.record_file, "w", encoding="utf-8") as handle:
+            json.dump({"responses": snapshot}, handle, indent=1, sort_keys=True)
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+
+def _usage(prompt, text, cached_text=""):
+    usage = {
+        "promptTokenCount": max(1, len(prompt) // 4),
+        "candidatesTokenCount": max(1, len(text) // 4),
+        "totalTokenCount": max(1, len(prompt) // 4) + max(1, len(text) // 4),
+    }
+    if cached_text:
+        usage["cachedContentTokenCount"] = len(cached_text) // 4
+    return usage
+
+
+def _parts_text(content):
+    return " ".join(part.get("text", "") for part in (content or {}).get("parts", []))
+
+
+def make_handler(state):
+    class GeminiStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if state.options.verbose:
+                super().log_message(fmt, *args)
+
+        def _send_json(self, status, body, headers=None):
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/stats":
+                with state.lock:
+                    return self._send_json(200, dict(state.counters))
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload"}})
+
+            if re.search(r"/v1(beta)?/cachedContents$", path):
+                return self._create_cached_content(body)
+
+            match = re.search(r"/models/([^/:]+):(generateContent|streamGenerateContent)$", path)
+            if not match:
+                return self._send_json(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+            model = match.group(1)
+            with state.lock:
+                state.counters["models"][model] = state.counters["models"].get(model, 0) + 1
+            if model in state.unknown_models:
+                return self._send_json(404, {"error": {"code": 404, "message": f"models/{model} is not found", "status": "NOT_FOUND"}})
+
+            prompt = " ".join(_parts_text(content) for content in body.get("contents", []))
+            if state.options.upstream and path.endswith(":generateContent"):
+                return self._proxy(path, body, prompt)
+            cached_text = ""
+            if body.get("cachedContent"):
+                with state.lock:
+                    entry = state.cached_contents.get(body["cachedContent"])
+                    if entry and entry["expires_at"] <= time.time():
+                        del state.cached_contents[body["cachedContent"]]
+                        entry = None
+                if not entry:
+                    state.count("cache_misses")
+                    return self._send_json(404, {"error": {"code": 404, "message": f"CachedContent not found: {body['cachedContent']}", "status": "NOT_FOUND"}})
+                state.count("cache_hits")
+                cached_text = entry["text"]
+            fate, latency_ms = state.draw(model)
+            # Uncached prompt tokens cost processing time; cached ones don't
+            latency_ms += state.options.prompt_ms_per_1k * (len(prompt) / 4) / 1000.0
+
+            if fate == "429":
+                state.count("rate_limited")
+                return self._send_json(
+                    429,
+                    {"error": {"code": 429, "message": "Resource has been exhausted (stub)", "status": "RESOURCE_EXHAUSTED"}},
+                    {"Retry-After": str(state.options.retry_after)},
+                )
+
+            if fate == "hang":
+                state.count("hung")
+                time.sleep(state.options.hang_seconds)
+            else:
+                time.sleep(latency_ms / 1000.0)
+
+            if fate == "error":
+                state.count("errors")
+                status = state.rng.choice([500, 503])
+                return self._send_json(status, {"error": {"code": status, "message": "Stub server error", "status": "UNAVAILABLE"}})
+
+            full_prompt = f"{cached_text} {prompt}" if cached_text else prompt
+            if state.fixed_payload is not None:
+                text = state.fixed_payload
+            elif state.options.replay_file:
+                text = state.replay.get(prompt_key(full_prompt))
+                state.count("replay_hits" if text is not None else "replay_misses")
+                text = text if text is not None else fake_output(full_prompt)
+            else:
+                text = fake_output(full_prompt)
+            if fate == "malformed":
+                state.count("malformed")
+                text = "Sorry, I cannot produce JSON right now."
+            else:
+                state.count("ok")
+
+            if path.endswith(":streamGenerateContent"):
+                return self._stream(full_prompt, text, cached_text)
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+                "usageMetadata": _usage(full_prompt, text, cached_text),
+            })
+
+        def _proxy(self, path, body, prompt):
+            """Forward to the real API (--upstream) and record the answer text."""
+            import requests
+
+            upstream = state.options.upstream.rstrip("/")
+            try:
+                resp = requests.post(f"{upstream}{path}", params={"key": state.options.upstream_key}, json=body, timeout=60)
+            except requests.RequestException as e:
+                return self._send_json(502, {"error": {"code": 502, "message": f"Upstream failed: {e}"}})
+            try:
+                data = resp.json()
+            except ValueError:
+                return self._send_json(502, {"error": {"code": 502, "message": "Upstream returned non-JSON"}})
+            if resp.status_code == 200 and state.options.record_file:
+                try:
+                    state.record(prompt, data["candidates"][0]["content"]["parts"][0]["text"])
+                except (KeyError, IndexError, TypeError):
+                    pass
+            return self._send_json(resp.status_code, data)
+
+        def _create_cached_content(self, body):
+            text = " ".join(
+                [_parts_text(body.get("systemInstruction"))]
+                + [_parts_text(content) for content in body.get("contents", [])]
+            ).strip()
+            tokens = len(text) // 4
+            if tokens < state.options.cache_min_tokens:
+                state.count("cache_rejected")
+                return self._send_json(400, {"error": {
+                    "code": 400,
+                    "message": f"Cached content is too small. total_token_count={tokens}, min_total_token_count={state.options.cache_min_tokens}",
+                    "status": "INVALID_ARGUMENT",
+                }})
+            try:
+                ttl = float(str(body.get("ttl") or "3600s").rstrip("s"))
+            except ValueError:
+                return self._send_json(400, {"error": {"code": 400, "message": "Invalid ttl", "status": "INVALID_ARGUMENT"}})
+            with state.lock:
+                state.counters["cache_created"] += 1
+                name = f"cachedContents/stub-{state.counters['cache_created']}"
+                state.cached_contents[name] = {"text": text, "expires_at": time.time() + ttl}
+            expire_time = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl))
+            self._send_json(200, {"name": name, "model": body.get("model"), "expireTime": expire_time,
+                                  "usageMetadata": {"totalTokenCount": tokens}})
+
+        def _stream(self, prompt, text, cached_text=""):
+            state.count("streams")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            size = max(1, state.options.chunk_chars)
+            chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+            for index, chunk in enumerate(chunks):
+                event = {"candidates": [{"content": {"parts": [{"text": chunk}], "role": "model"}}]}
+                if index == len(chunks) - 1:
+                    event["candidates"][0]["finishReason"] = "STOP"
+                    event["usageMetadata"] = _usage(prompt, text, cached_text)
+                self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(state.options.chunk_ms / 1000.0)
+            self.close_connection = True
+
+    return GeminiStubHandler
+
+
+def build_parser():
+    env = os.getenv
+    parser = argparse.ArgumentParser(description="Local Gemini API stub for load tests")
+    parser.add_argument("--host", default=env("STUB_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("STUB_PORT", "8089")))
+    parser.add_argument("--latency", default=env("STUB_LATENCY", "lognormal:300,0.5"), help="latency distribution spec (ms)")
+    parser.add_argument("--error-rate", type=float, default=float(env("STUB_ERROR_RATE", "0")), help="share of 500/503 replies")
+    parser.add_argument("--rate-429", type=float, default=float(env("STUB_RATE_429", "0")), help="share of random 429 replies")
+    parser.add_argument("--burst-every", type=int, default=int(env("STUB_BURST_EVERY", "0")), help="start a 429 burst every N requests")
+    parser.add_argument("--burst-length", type=int, default=int(env("STUB_BURST_LENGTH", "0")), help="requests per 429 burst")
+    parser.add_argument("--retry-after", type=float, default=float(env("STUB_RETRY_AFTER", "1")), help="Retry-After seconds on 429")
+    parser.add_argument("--hang-rate", type=float, default=float(env("STUB_HANG_RATE", "0")), help="share of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=float(env("STUB_HANG_SECONDS", "35")), help="stall duration (exceeds client timeouts)")
+    parser.add_argument("--malformed-rate", type=float, default=float(env("STUB_MALFORMED_RATE", "0")), help="share of non-JSON answers")
+    parser.add_argument("--payload-file", default=env("STUB_PAYLOAD_FILE"), help="always answer with this file's text")
+    parser.add_argument("--chunk-chars", type=int, default=int(env("STUB_CHUNK_CHARS", "40")), help="characters per streamed chunk")
+    parser.add_argument("--chunk-ms", type=float, default=float(env("STUB_CHUNK_MS", "30")), help="delay between streamed chunks")
+    parser.add_argument("--prompt-ms-per-1k", type=float, default=float(env("STUB_PROMPT_MS_PER_1K", "0")), help="extra latency per 1k uncached prompt tokens")
+    parser.add_argument("--cache-min-tokens", type=int, default=int(env("STUB_CACHE_MIN_TOKENS", "0")), help="reject cachedContents smaller than this")
+    parser.add_argument("--model-latency", default=env("STUB_MODEL_LATENCY"), help="per-model latency: 'model=spec;model=spec'")
+    parser.add_argument("--unknown-models", default=env("STUB_UNKNOWN_MODELS"), help="comma-separated models answered with 404")
+    parser.add_argument("--replay-file", default=env("STUB_REPLAY_FILE"), help="answer recorded prompts from this file")
+    parser.add_argument("--upstream", default=env("STUB_UPSTREAM"), help="proxy generateContent to this API base URL")
+    parser.add_argument("--upstream-key", default=env("STUB_UPSTREAM_KEY"), help="API key for --upstream")
+    parser.add_argument("--record-file", default=env("STUB_RECORD_FILE"), help="record upstream answers into this file")
+    parser.add_argument("--seed", type=int, default=int(env("STUB_SEED", "42")))
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def serve(options):
+    state = StubState(options)
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state  # counters for in-process callers (screening_eval.py)
+    return server
+
+
+if __name__ == "__main__":
+    opts = build_parser().parse_args()
+    httpd = serve(opts)
+    print(f"🧪 Gemini stub listening on http://{opts.host}:{httpd.server_port} (latency {opts.latency})")
+    print(f"   export GEMINI_BASE_URL=http://{opts.host}:{httpd.server_port} GEMINI_API_KEY=stub")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Gemini stub stopped")
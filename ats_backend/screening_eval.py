@@ -0,0 +1,267 @@
+"""
+Offline screening evaluation and throughput harness.
+
+Replays the labelled candidate/requirement pairs in
+eval/screening_fixtures.json through the screening pipeline
+(services/screening_service.evaluate_candidate, or evaluate_candidates_packed
+with --pack-size > 1, and from there utils/gemini.py, the transport, model
+routing and the LLM scheduler) against an in-process gemini_stub.py, then
+reports throughput, latency percentiles, the extract_json failure rate and how
+often `recommend` agrees with the labels.
+
+    python screening_eval.py                                # stub answers: speed and parsing only
+    python screening_eval.py --replay eval/recorded.json    # recorded model answers
+    python screening_eval.py --mode fallback                # _fallback_screening only
+    python screening_eval.py --pack-size 5 --concurrency 8 --json
+
+Recordings come from gemini_stub.py --upstream ... --record-file (see its
+docstring); replay misses mean the prompt text changed since recording.
+--write-baseline FILE saves this run's decisions; --baseline FILE compares a
+later run against them instead of the fixture labels.  --min-agreement makes
+the exit code 1 below a threshold.
+
+Needs no network: the stub listens on 127.0.0.1, the screening cache, usage
+accounting and context caching are off.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval", "screening_fixtures.json")
+
+
+def pair_key(pair):
+    return f"{pair['candidate_id']}|{pair['requirement_id']}"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def load_fixtures(path):
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    requirements = {r["id"]: r for r in data["requirements"]}
+    candidates = {c["id"]: c for c in data["candidates"]}
+    pairs = [p for p in data["pairs"] if p["candidate_id"] in candidates and p["requirement_id"] in requirements]
+    return requirements, candidates, pairs
+
+
+def start_stub(options):
+    """Run gemini_stub.py in-process on a free loopback port."""
+    import gemini_stub
+
+    argv = ["--host", "127.0.0.1", "--port", "0", "--latency", options.latency, "--seed", str(options.seed)]
+    if options.replay:
+        argv += ["--replay-file", options.replay]
+    if options.malformed_rate:
+        argv += ["--malformed-rate", str(options.malformed_rate)]
+    server = gemini_stub.serve(gemini_stub.build_parser().parse_args(argv))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure_environment(options, stub_port):
+    """Must run before utils.* is imported: those modules read env at import."""
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SCREENING_CACHE_ENABLED"] = "0"
+    os.environ["LLM_USAGE_ENABLED"] = "0"
+    os.environ["LLM_CONTEXT_CACHE_ENABLED"] = "0"
+    if options.mode == "fallback":
+        os.environ["GEMINI_API_KEY"] = ""
+    else:
+        os.environ["GEMINI_BASE_URL"] = f"http://127.0.0.1:{stub_port}"
+        os.environ["GEMINI_API_KEY"] = "eval-stub"
+
+
+def run_pairs(pairs, requirements, candidates, concurrency, pack_size):
+    """Returns [(pair, output, error, source, latency_ms)] in completion order."""
+    from services.screening_service import evaluate_candidate, evaluate_candidates_packed
+
+    if pack_size <= 1:
+        def one(pair):
+            started = time.perf_counter()
+            output, error, source = evaluate_candidate(candidates[pair["candidate_id"]], requirements[pair["requirement_id"]])
+            return [(pair, output, error, source, (time.perf_counter() - started) * 1000)]
+        units = pairs
+    else:
+        by_requirement = defaultdict(list)
+        for pair in pairs:
+            by_requirement[pair["requirement_id"]].append(pair)
+        units = [group[i:i + pack_size] for group in by_requirement.values() for i in range(0, len(group), pack_size)]
+
+        def one(group):
+            requirement = requirements[group[0]["requirement_id"]]
+            started = time.perf_counter()
+            outcomes = evaluate_candidates_packed([candidates[p["candidate_id"]] for p in group], requirement, pack_size)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            rows = []
+            for pair in group:
+                output, error, source = outcomes.get(pair["candidate_id"], (None, "No result", "packed"))
+                rows.append((pair, output, error, source, elapsed_ms))
+            return rows
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        return [row for rows in pool.map(one, units) for row in rows]
+
+
+def summarize(rows, wall_seconds, expected, parse, stub_counters, options):
+    latencies = [row[4] for row in rows]
+    sources = Counter(row[3] for row in rows)
+    decisions = {pair_key(pair): (output or {}).get("recommend") for pair, output, _e, _s, _l in rows}
+    scores = {pair_key(pair): (output or {}).get("score") for pair, output, _e, _s, _l in rows}
+    errors = [{"pair": pair_key(pair), "error": error} for pair, output, error, _s, _l in rows if not output]
+
+    compared = [key for key in decisions if expected.get(key)]
+    agreed = [key for key in compared if decisions[key] == expected[key]]
+    confusion = Counter(f"{expected[key]}->{decisions[key]}" for key in compared)
+    disagreements = [
+        {"pair": key, "expected": expected[key], "got": decisions[key], "score": scores[key]}
+        for key in sorted(compared) if decisions[key] != expected[key]
+    ]
+
+    summary = {
+        "mode": options.mode,
+        "replay": options.replay,
+        "pairs": len(rows),
+        "concurrency": options.concurrency,
+        "pack_size": options.pack_size,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_pairs_per_s": round(len(rows) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 1),
+            "p95": round(percentile(latencies, 0.95), 1),
+            "p99": round(percentile(latencies, 0.99), 1),
+            "max": round(max(latencies), 1) if latencies else 0.0,
+        },
+        "sources": dict(sources),
+        "parse": parse,
+        "errors": errors,
+        "agreement": {
+            "against": "baseline" if options.baseline else "fixture labels",
+            "compared": len(compared),
+            "agreed": len(agreed),
+            "rate": round(len(agreed) / len(compared), 4) if compared else None,
+            "confusion": dict(sorted(confusion.items())),
+            "disagreements": disagreements,
+        },
+        "decisions": decisions,
+        "scores": scores,
+    }
+    if stub_counters is not None:
+        summary["stub"] = {key: stub_counters.get(key, 0) for key in ("requests", "ok", "malformed", "replay_hits", "replay_misses")}
+    return summary
+
+
+def print_report(summary, show_diffs):
+    latency = summary["latency_ms"]
+    parse = summary["parse"]
+    agreement = summary["agreement"]
+    print(f"🧪 Screening eval: mode={summary['mode']} pairs={summary['pairs']} "
+          f"concurrency={summary['concurrency']} pack_size={summary['pack_size']}")
+    if summary["replay"]:
+        stub = summary.get("stub", {})
+        print(f"   replay           {summary['replay']} (hits {stub.get('replay_hits', 0)}, "
+              f"misses {stub.get('replay_misses', 0)} = prompts changed since recording)")
+    print(f"   wall time        {summary['wall_seconds']:.2f} s")
+    print(f"   throughput       {summary['throughput_pairs_per_s']:.2f} pairs/s")
+    print(f"   latency ms       p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"   sources          " + ", ".join(f"{k}={v}" for k, v in sorted(summary["sources"].items())))
+    attempts = parse["parsed"] + parse["invalid_json"] + parse["invalid_response"]
+    print(f"   parse failures   {attempts - parse['parsed']}/{attempts} ({parse['failure_rate'] * 100:.1f}%) "
+          f"[invalid_json={parse['invalid_json']} invalid_response={parse['invalid_response']}]")
+    if summary["errors"]:
+        print(f"   errors           {len(summary['errors'])}")
+    if agreement["compared"]:
+        print(f"   agreement        {agreement['agreed']}/{agreement['compared']} "
+              f"({agreement['rate'] * 100:.1f}%) vs {agreement['against']}")
+        for cell, count in agreement["confusion"].items():
+            print(f"      {cell:<36} {count}")
+    if show_diffs:
+        for diff in agreement["disagreements"]:
+            print(f"   ✗ {diff['pair']}: expected {diff['expected']}, got {diff['got']} (score {diff['score']})")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline screening evaluation and throughput harness")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="labelled pairs (JSON)")
+    parser.add_argument("--mode", choices=("stub", "fallback"), default="stub",
+                        help="stub: answers from gemini_stub.py (fake or --replay); fallback: heuristic only")
+    parser.add_argument("--replay", help="recorded responses file for the stub (gemini_stub.py --record-file)")
+    parser.add_argument("--latency", default="fixed:0", help="stub latency spec, e.g. lognormal:400,0.5")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of non-JSON stub answers")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pack-size", type=int, default=1, help=">1 screens through evaluate_candidates_packed")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the fixture set this many times")
+    parser.add_argument("--baseline", help="compare with the decisions in this file instead of the fixture labels")
+    parser.add_argument("--write-baseline", help="save this run's decisions to this file")
+    parser.add_argument("--min-agreement", type=float, help="exit 1 when agreement is below this rate (0-1)")
+    parser.add_argument("--show-diffs", action="store_true", help="list every disagreement")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own log output")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    requirements, candidates, pairs = load_fixtures(options.fixtures)
+    pairs = pairs * max(1, options.repeat)
+
+    server = start_stub(options) if options.mode == "stub" else None
+    configure_environment(options, server.server_port if server else None)
+
+    if options.baseline:
+        with open(options.baseline, encoding="utf-8") as handle:
+            expected = json.load(handle)["decisions"]
+    else:
+        expected = {pair_key(p): p.get("expected_recommend") for p in pairs}
+
+    from utils.gemini import parse_stats, reset_parse_stats
+
+    reset_parse_stats()
+    log = None if options.verbose else io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log) if log else contextlib.nullcontext():
+        rows = run_pairs(pairs, requirements, candidates, options.concurrency, options.pack_size)
+    wall_seconds = time.perf_counter() - started
+
+    stub_counters = None
+    if server:
+        state = server.state
+        with state.lock:
+            stub_counters = dict(state.counters)
+        server.shutdown()
+
+    summary = summarize(rows, wall_seconds, expected, parse_stats(), stub_counters, options)
+
+    if options.write_baseline:
+        with open(options.write_baseline, "w", encoding="utf-8") as handle:
+            json.dump({"decisions": summary["decisions"], "scores": summary["scores"]}, handle, indent=1, sort_keys=True)
+
+    if options.json:
+        print(json.dumps(summary, indent=1))
+    else:
+        print_report(summary, options.show_diffs)
+
+    rate = summary["agreement"]["rate"]
+    if options.min_agreement is not None and (rate is None or rate < options.min_agreement):
+        print(f"❌ Agreement {rate} is below --min-agreement {options.min_agreement}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from waitress import serve
 from app import app
+from services.screening_queue import start_screening_workers
 from utils.logger import setup_logger
 
 logger = setup_logger("server")
@@ -8,6 +9,9 @@ if __name__ == "__main__":
     logger.info("Starting ATS Backend with Waitress (Production Mode)...")
     logger.info("Serving on http://0.0.0.0:5001")
     
+    # Background workers for async screening / re-screening jobs (assesment_queue)
+    start_screening_workers()
+
     # Run the server
     # threads=6 ensures we can handle multiple async screening requests efficiently
     # Note: Use 'python app.py' for development with debug mode
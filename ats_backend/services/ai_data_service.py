@@ -1,17 +1,25 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # This module provides role-aware, plain-JSON data fetchers for the AI assistant.
 
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
 import pymysql
 import pymysql.cursors
 
 from utils.db import get_db_connection
+from utils.profile_digest import compact_candidate_row
 
 # Removed local get_db_connection to use shared logic from utils.db
 
+# Concurrent context gathering for AI chat (see ContextGatherer)
+CHAT_CONTEXT_WORKERS = int(os.getenv("CHAT_CONTEXT_WORKERS", "8"))
+CHAT_CONTEXT_DEADLINE = float(os.getenv("CHAT_CONTEXT_DEADLINE", "5"))
+
 
 UserDict = Dict[str, Any]
 
@@ -80,10 +88,22 @@ def get_candidate_by_name_for_user(name: str, user: UserDict) -> Optional[Dict[s
 		return None
 	
 	q = f"%{name}%"
-	return _fetch_one(
-		"SELECT id, name, email, phone, skills, education, experience, resume_filename FROM candidates WHERE name LIKE %s OR email LIKE %s LIMIT 1",
+	return compact_candidate_row(_fetch_one(
+		"SELECT id, name, email, phone, skills, education, experience, profile_digest, resume_filename FROM candidates WHERE name LIKE %s OR email LIKE %s LIMIT 1",
 		(q, q),
-	)
+	))
+
+
+def get_candidate_by_id_for_user(candidate_id: Any, user: UserDict) -> Optional[Dict[str, Any]]:
+
+	# Same visibility as get_candidate_by_name_for_user
+	if not (_is_admin(user) or (user or {}).get("role", "").upper() == "DELIVERY_MANAGER"):
+		return None
+
+	return compact_candidate_row(_fetch_one(
+		"SELECT id, name, email, phone, skills, education, experience, profile_digest, resume_filename FROM candidates WHERE id = %s",
+		(candidate_id,),
+	))
 
 
 def get_candidate_track_for_user(candidate_id: str, user: UserDict) -> List[Dict[str, Any]]:
@@ -98,14 +118,15 @@ def list_candidates_for_user(user: UserDict) -> List[Dict[str, Any]]:
 	if not (_is_admin(user) or (user or {}).get("role", "").upper() == "DELIVERY_MANAGER"):
 		return []
 	
-	return _fetch_all(
+	rows = _fetch_all(
 		"""
-		SELECT id, name, email, phone, skills, education, experience, resume_filename
+		SELECT id, name, email, phone, skills, education, experience, profile_digest, resume_filename
 		FROM candidates
 		ORDER BY id DESC
 		""",
 		(),
 	)
+	return [compact_candidate_row(row) for row in rows]
 
 
 def get_requirement_for_user(requirement_id: str, user: UserDict) -> Optional[Dict[str, Any]]:
@@ -534,7 +555,7 @@ def list_assignments_for_user(user_id: int) -> List[Dict[str, Any]]:
 
 def list_candidates_created_by_user(user_id: int) -> List[Dict[str, Any]]:
 
-	return _fetch_all(
+	rows = _fetch_all(
 		"""
 		SELECT
 			id,
@@ -544,6 +565,7 @@ def list_candidates_created_by_user(user_id: int) -> List[Dict[str, Any]]:
 			skills,
 			education,
 			experience,
+			profile_digest,
 			resume_filename,
 			created_at
 		FROM candidates
@@ -552,6 +574,7 @@ def list_candidates_created_by_user(user_id: int) -> List[Dict[str, Any]]:
 		""",
 		(user_id,),
 	)
+	return [compact_candidate_row(row) for row in rows]
 
 
 def get_org_stats_snapshot() -> Dict[str, int]:
@@ -590,7 +613,8 @@ def get_org_stats_snapshot() -> Dict[str, int]:
 		conn.close()
 
 
-def build_user_self_context(user: UserDict) -> Dict[str, Any]:
+def self_context_fetchers(user: UserDict) -> Dict[str, Callable[[], Any]]:
+	"""The independent queries behind build_user_self_context, keyed by context key."""
 
 	if not user or not user.get("id"):
 		return {}
@@ -598,16 +622,21 @@ def build_user_self_context(user: UserDict) -> Dict[str, Any]:
 	user_id = user.get("id")
 	role = (user.get("role") or "").upper()
 
-	context = {
-		"self_profile": get_user_profile_summary(user_id),
-		"self_assignments": list_assignments_for_user(user_id),
-		"self_candidates": list_candidates_created_by_user(user_id),
+	fetchers: Dict[str, Callable[[], Any]] = {
+		"self_profile": lambda: get_user_profile_summary(user_id),
+		"self_assignments": lambda: list_assignments_for_user(user_id),
+		"self_candidates": lambda: list_candidates_created_by_user(user_id),
 	}
 
 	if role in ("ADMIN", "DELIVERY_MANAGER"):
-		context["self_org_stats"] = get_org_stats_snapshot()
+		fetchers["self_org_stats"] = get_org_stats_snapshot
 
-	return context
+	return fetchers
+
+
+def build_user_self_context(user: UserDict) -> Dict[str, Any]:
+
+	return {key: fetch() for key, fetch in self_context_fetchers(user).items()}
 
 
 def get_candidate_progress_for_requirement(requirement_id: str, user: UserDict) -> List[Dict[str, Any]]:
@@ -779,3 +808,91 @@ def get_candidate_screening_for_user(user: UserDict, limit: int = 20) -> List[Di
 def get_interaction_logs_for_admin(limit: int = 10) -> List[Dict[str, Any]]:
 	"""Fetch recent chat logs for admin review."""
 	return _fetch_all("SELECT * FROM interaction_logs ORDER BY created_at DESC LIMIT %s", (limit,))
+
+
+# ------------------------------------------------------------------
+# Concurrent context gathering for AI chat
+# ------------------------------------------------------------------
+
+# Pool threads are long-lived, so each keeps its own thread-local connection
+# from utils.db across requests (CHAT_CONTEXT_WORKERS connections at most).
+_context_pool = ThreadPoolExecutor(max_workers=max(1, CHAT_CONTEXT_WORKERS), thread_name_prefix="ai-context")
+_gather_lock = threading.Lock()
+_gather_stats = {"gathers": 0, "fetches": 0, "timed_out": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+class ContextGatherer:
+	"""
+	Runs independent fetchers for one chat request concurrently and collects
+	whatever finished before the request's deadline (CHAT_CONTEXT_DEADLINE
+	seconds after the gatherer was created).
+
+	    gather = ContextGatherer()
+	    gather.submit("requirement", get_requirement_by_id_for_user, req_id, user)
+	    gather.submit("allocations", get_allocations_for_requirement, req_id)
+	    results, missing = gather.collect()
+
+	`results` keeps submission order; `missing` maps each key that timed out or
+	raised to a short reason, so the caller can answer from partial data.
+	"""
+
+	def __init__(self, deadline: Optional[float] = None):
+		self.started = time.monotonic()
+		self.deadline = self.started + (CHAT_CONTEXT_DEADLINE if deadline is None else deadline)
+		self._futures: Dict[str, Any] = {}
+
+	def __contains__(self, key: str) -> bool:
+		return key in self._futures
+
+	def submit(self, key: str, fn: Callable[..., Any], *args: Any) -> None:
+		"""Start `fn(*args)` for `key` (ignored if `key` was already submitted)."""
+		if key not in self._futures:
+			self._futures[key] = _context_pool.submit(fn, *args)
+
+	def collect(self) -> Tuple[Dict[str, Any], Dict[str, str]]:
+		wait(list(self._futures.values()), timeout=max(0.0, self.deadline - time.monotonic()))
+
+		results: Dict[str, Any] = {}
+		missing: Dict[str, str] = {}
+		for key, future in self._futures.items():
+			if not future.done():
+				# Not started yet: dropped; already running: finishes in the background, result unused
+				future.cancel()
+				missing[key] = "timed out"
+			elif future.exception() is not None:
+				print(f"⚠️ AI context fetch '{key}' failed: {future.exception()}")
+				missing[key] = "failed to load"
+			else:
+				results[key] = future.result()
+
+		elapsed_ms = (time.monotonic() - self.started) * 1000
+		if any(reason == "timed out" for reason in missing.values()):
+			print(f"⏱️ AI context gathering hit its deadline; missing: {', '.join(missing)}")
+		with _gather_lock:
+			_gather_stats["gathers"] += 1
+			_gather_stats["fetches"] += len(self._futures)
+			_gather_stats["timed_out"] += sum(1 for reason in missing.values() if reason == "timed out")
+			_gather_stats["failed"] += sum(1 for reason in missing.values() if reason != "timed out")
+			_gather_stats["total_ms"] += elapsed_ms
+			_gather_stats["max_ms"] = max(_gather_stats["max_ms"], elapsed_ms)
+		return results, missing
+
+
+def context_gather_stats() -> Dict[str, Any]:
+	with _gather_lock:
+		stats = dict(_gather_stats)
+	gathers = stats.pop("gathers")
+	total_ms = stats.pop("total_ms")
+	return {
+		"workers": CHAT_CONTEXT_WORKERS,
+		"deadline_seconds": CHAT_CONTEXT_DEADLINE,
+		"gathers": gathers,
+		"avg_ms": round(total_ms / gathers, 1) if gathers else 0.0,
+		**{key: round(value, 1) if isinstance(value, float) else value for key, value in stats.items()},
+	}
+
+
+def reset_context_gather_stats() -> None:
+	with _gather_lock:
+		for key in _gather_stats:
+			_gather_stats[key] = 0.0 if isinstance(_gather_stats[key], float) else 0
@@ -0,0 +1,207 @@
+"""
+Archive tier for closed requirements.
+
+Pipeline rows (progress, screening, interviews, allocations) for requirements
+that were closed more than N days ago are moved into `<table>_archive` tables
+in small batches, so the hot tables only hold active work.  Read APIs opt in
+to archived data with `?include_archived=1` (see `pipeline_source`).
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from utils.data_versions import bump_table_versions
+from utils.db import get_db_connection
+
+# Child tables that are moved together with a closed requirement
+ARCHIVED_TABLES = (
+    "candidate_progress",
+    "candidate_screening",
+    "interviews",
+    "requirement_allocations",
+)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50"))
+
+# Hot-table column names, in table order (filled by ensure_archive_tables)
+_columns: Dict[str, List[str]] = {}
+
+
+def archive_table_name(table: str) -> str:
+    return f"{table}_archive"
+
+
+def wants_archived(args) -> bool:
+    """True when a request asked for archived data (?include_archived=1)."""
+    value = (args.get("include_archived") or "").strip().lower()
+    return value in ("1", "true", "yes")
+
+
+def _show_columns(cursor, table: str) -> List[tuple]:
+    """(name, type) of each column of `table`, in table order."""
+    cursor.execute(f"SHOW COLUMNS FROM {table}")
+    rows = cursor.fetchall() or []
+    return [(row["Field"], row["Type"]) if isinstance(row, dict) else (row[0], row[1]) for row in rows]
+
+
+def _column_list(table: str) -> str:
+    if table not in _columns:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            _columns[table] = [name for name, _type in _show_columns(cursor, table)]
+        finally:
+            cursor.close()
+    return ", ".join(f"`{name}`" for name in _columns[table])
+
+
+def pipeline_source(table: str, include_archived: bool = False) -> str:
+    """
+    Return the FROM-clause source for a pipeline table.
+    Hot table only by default; hot + archive as a derived table when asked.
+    The union names the hot table's columns, so archive tables may have extra ones.
+    Callers must always alias the result (e.g. `FROM {src} cp`).
+    """
+    if not include_archived or table not in ARCHIVED_TABLES:
+        return table
+    columns = _column_list(table)
+    return f"(SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {archive_table_name(table)})"
+
+
+def ensure_archive_tables(cursor) -> None:
+    """
+    Create archive tables (same columns as the hot tables, no foreign keys),
+    and add to existing ones any column the hot table gained since.
+    """
+    for table in ARCHIVED_TABLES:
+        archive = archive_table_name(table)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive} LIKE {table}")
+        hot_columns = _show_columns(cursor, table)
+        archived = {name for name, _type in _show_columns(cursor, archive)}
+        for name, column_type in hot_columns:
+            if name not in archived:
+                print(f"⚠️ Adding '{name}' column to {archive}...")
+                cursor.execute(f"ALTER TABLE {archive} ADD COLUMN `{name}` {column_type} NULL")
+        _columns[table] = [name for name, _type in hot_columns]
+
+    cursor.execute("SHOW COLUMNS FROM requirements LIKE 'closed_at'")
+    if not cursor.fetchone():
+        print("⚠️ Adding 'closed_at' column to requirements...")
+        cursor.execute("ALTER TABLE requirements ADD COLUMN closed_at TIMESTAMP NULL")
+
+    cursor.execute("SHOW COLUMNS FROM requirements LIKE 'archived_at'")
+    if not cursor.fetchone():
+        print("⚠️ Adding 'archived_at' column to requirements...")
+        cursor.execute("ALTER TABLE requirements ADD COLUMN archived_at TIMESTAMP NULL")
+
+
+def _archive_batch(cursor, req_ids: List[str]) -> Dict[str, int]:
+    placeholders = ", ".join(["%s"] * len(req_ids))
+    moved = {}
+    for table in ARCHIVED_TABLES:
+        columns = _column_list(table)
+        cursor.execute(
+            f"INSERT INTO {archive_table_name(table)} ({columns}) "
+            f"SELECT {columns} FROM {table} WHERE requirement_id IN ({placeholders})",
+            tuple(req_ids),
+        )
+        cursor.execute(
+            f"DELETE FROM {table} WHERE requirement_id IN ({placeholders})",
+            tuple(req_ids),
+        )
+        moved[table] = cursor.rowcount or 0
+
+    cursor.execute(
+        f"UPDATE requirements SET archived_at = %s WHERE id IN ({placeholders})",
+        (datetime.now(), *req_ids),
+    )
+
+    # Imported lazily: the screening queue pulls in utils.gemini, which reads env at import
+    from services.screening_queue import cancel_rescreens
+    cancel_rescreens(cursor, req_ids)
+    return moved
+
+
+def archive_closed_requirements(older_than_days: int = ARCHIVE_AFTER_DAYS,
+                                batch_size: int = ARCHIVE_BATCH_SIZE,
+                                dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Move pipeline rows of requirements closed more than `older_than_days` ago
+    into the archive tables.  Each batch of requirements is its own transaction,
+    so a failure only rolls back the current batch.
+    Requirements closed before `closed_at` existed fall back to created_at.
+    """
+    summary: Dict[str, Any] = {
+        "requirements": 0,
+        "batches": 0,
+        "rows": {table: 0 for table in ARCHIVED_TABLES},
+        "dry_run": dry_run,
+    }
+
+    conn = get_db_connection()
+    if not conn:
+        summary["error"] = "Database connection failed"
+        return summary
+
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    cursor = conn.cursor()
+    try:
+        ensure_archive_tables(cursor)
+        conn.commit()
+
+        last_id = ""
+        while True:
+            cursor.execute(
+                """
+                SELECT id FROM requirements
+                WHERE UPPER(status) = 'CLOSED'
+                  AND archived_at IS NULL
+                  AND COALESCE(closed_at, created_at) < %s
+                  AND id > %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (cutoff, last_id, batch_size),
+            )
+            req_ids = [row[0] for row in cursor.fetchall()]
+            if not req_ids:
+                break
+            last_id = req_ids[-1]
+
+            summary["requirements"] += len(req_ids)
+            summary["batches"] += 1
+            if dry_run:
+                continue
+
+            try:
+                moved = _archive_batch(cursor, req_ids)
+                conn.commit()
+                bump_table_versions("requirements", *ARCHIVED_TABLES)
+                from utils.retrieval_index import mark_stale
+                mark_stale("interview")
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Archive batch failed ({len(req_ids)} requirements): {e}")
+                summary["error"] = str(e)
+                break
+
+            for table, count in moved.items():
+                summary["rows"][table] += count
+            print(f"📦 Archived {len(req_ids)} closed requirements ({sum(moved.values())} rows)")
+
+        return summary
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.archive_service [days] [--dry-run]
+    days = ARCHIVE_AFTER_DAYS
+    for arg in sys.argv[1:]:
+        if arg.isdigit():
+            days = int(arg)
+    print(archive_closed_requirements(days, dry_run="--dry-run" in sys.argv))
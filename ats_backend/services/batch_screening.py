@@ -0,0 +1,248 @@
+"""
+Batch screening: one requirement against many candidates, or one candidate
+against every open requirement.  With "prerank" the requirement's pool is
+first ranked by the cheap heuristic (utils/preranker.py) and only the
+shortlist reaches the LLM.
+
+Candidates for the same requirement are packed SCREEN_PACK_SIZE at a time
+into one prompt (see services/screening_service.evaluate_candidates_packed);
+packs fan out on a bounded thread pool (no DB work inside the pool) and
+each pack's results are written and committed, with one batched insert per
+table, as soon as it finishes.  A pack that raises becomes per-candidate
+errors; if the stream is abandoned, packs not yet started are cancelled and
+the running ones are still saved.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from services.screening_service import (
+    SCREEN_PACK_SIZE,
+    evaluate_candidates_packed,
+    record_screening_batch,
+    resolve_requirement,
+)
+from utils.data_versions import bump_table_versions
+from utils.llm_scheduler import BATCH, llm_priority
+from utils.llm_usage import usage_context
+from utils.preranker import PRERANK_TOP_K, parse_experience, prerank_candidates
+
+SCREEN_BATCH_CONCURRENCY = int(os.getenv("SCREEN_BATCH_CONCURRENCY", "4"))
+SCREEN_BATCH_MAX_CONCURRENCY = int(os.getenv("SCREEN_BATCH_MAX_CONCURRENCY", "16"))
+SCREEN_BATCH_MAX_PAIRS = int(os.getenv("SCREEN_BATCH_MAX_PAIRS", "1000"))
+
+Pair = Tuple[Dict[str, Any], Dict[str, Any]]
+
+
+class BatchRequestError(ValueError):
+    """Invalid batch request (mapped to a 4xx by the controller)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _filter_clauses(filters, requirement_id=None):
+    clauses, params = [], []
+    if filters.get("skills"):
+        for skill in str(filters["skills"]).split(","):
+            if skill.strip():
+                clauses.append("LOWER(skills) LIKE %s")
+                params.append(f"%{skill.strip().lower()}%")
+    if filters.get("created_by"):
+        clauses.append("created_by = %s")
+        params.append(filters["created_by"])
+    if filters.get("source"):
+        clauses.append("source = %s")
+        params.append(filters["source"])
+    if filters.get("unscreened_only") and requirement_id:
+        clauses.append("id NOT IN (SELECT candidate_id FROM candidate_screening WHERE requirement_id = %s)")
+        params.append(requirement_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _apply_min_experience(rows, filters):
+    min_experience = filters.get("min_experience")
+    if min_experience is None:
+        return rows
+    return [row for row in rows if parse_experience(row.get("experience")) >= float(min_experience)]
+
+
+def _select_candidates(cursor, candidate_ids=None, filters=None, requirement_id=None) -> List[Dict[str, Any]]:
+    if candidate_ids:
+        placeholders = ", ".join(["%s"] * len(candidate_ids))
+        cursor.execute(f"SELECT * FROM candidates WHERE id IN ({placeholders}) ORDER BY id", tuple(candidate_ids))
+        return list(cursor.fetchall())
+
+    filters = filters or {}
+    where, params = _filter_clauses(filters, requirement_id)
+    cursor.execute(f"SELECT * FROM candidates {where} ORDER BY id LIMIT %s", (*params, SCREEN_BATCH_MAX_PAIRS + 1))
+    return _apply_min_experience(list(cursor.fetchall()), filters)
+
+
+def _prerank_shortlist(cursor, requirement, prerank, filters=None) -> List[Dict[str, Any]]:
+    """
+    Rank the whole (filtered) pool with the vectorized heuristic and load only
+    the shortlist, so LLM calls scale with top_k rather than the applicant pool.
+    """
+    options = prerank if isinstance(prerank, dict) else {}
+    top_k = int(options.get("top_k") or PRERANK_TOP_K)
+    min_score = options.get("min_score")
+
+    allowed = None
+    if filters:
+        where, params = _filter_clauses(filters, requirement["id"])
+        cursor.execute(f"SELECT id, experience FROM candidates {where}", tuple(params))
+        allowed = [row["id"] for row in _apply_min_experience(list(cursor.fetchall()), filters)]
+
+    ranked = prerank_candidates(requirement, top_k=top_k, min_score=min_score, candidate_ids=allowed)
+    if not ranked:
+        return []
+    candidates = {row["id"]: row for row in _select_candidates(cursor, candidate_ids=[cid for cid, _ in ranked])}
+    shortlist = []
+    for cid, score in ranked:
+        if cid in candidates:
+            candidates[cid]["prerank_score"] = score
+            shortlist.append(candidates[cid])
+    return shortlist
+
+
+def build_batch_pairs(cursor, body: Dict[str, Any]) -> List[Pair]:
+    """Resolve the request body into (candidate, requirement) pairs."""
+    requirement_ref = body.get("requirement_id")
+    candidate_id = body.get("candidate_id")
+
+    if requirement_ref:
+        requirement = resolve_requirement(cursor, requirement_ref)
+        if not requirement:
+            raise BatchRequestError("Requirement not found", 404)
+        if body.get("prerank") and not body.get("candidate_ids"):
+            candidates = _prerank_shortlist(cursor, requirement, body["prerank"], body.get("filter"))
+        else:
+            candidates = _select_candidates(
+                cursor,
+                candidate_ids=body.get("candidate_ids"),
+                filters=body.get("filter"),
+                requirement_id=requirement["id"],
+            )
+        pairs = [(candidate, requirement) for candidate in candidates]
+
+    elif candidate_id and body.get("all_open_requirements"):
+        cursor.execute("SELECT * FROM candidates WHERE id = %s", (candidate_id,))
+        candidate = cursor.fetchone()
+        if not candidate:
+            raise BatchRequestError("Candidate not found", 404)
+        cursor.execute("SELECT * FROM requirements WHERE UPPER(status) = 'OPEN' ORDER BY created_at DESC")
+        pairs = [(candidate, requirement) for requirement in cursor.fetchall()]
+
+    else:
+        raise BatchRequestError("Provide requirement_id (with candidate_ids or filter) or candidate_id with all_open_requirements")
+
+    if len(pairs) > SCREEN_BATCH_MAX_PAIRS:
+        raise BatchRequestError(f"Batch too large: max {SCREEN_BATCH_MAX_PAIRS} pairs per request")
+    return pairs
+
+
+def _pair_event(candidate, requirement, normalized_output, error) -> Dict[str, Any]:
+    return {
+        "candidate_id": candidate["id"],
+        "candidate_name": candidate.get("name"),
+        "requirement_id": requirement["id"],
+        "prerank_score": candidate.get("prerank_score"),
+        "ok": bool(normalized_output),
+        "result": normalized_output,
+        "error": error,
+    }
+
+
+def _packs(pairs: List[Pair], pack_size: int) -> List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Group pairs by requirement and chunk each group into packs."""
+    groups: Dict[Any, Tuple[List[Dict[str, Any]], Dict[str, Any]]] = {}
+    for candidate, requirement in pairs:
+        groups.setdefault(requirement["id"], ([], requirement))[0].append(candidate)
+    packs = []
+    for candidates, requirement in groups.values():
+        for start in range(0, len(candidates), pack_size):
+            packs.append((candidates[start:start + pack_size], requirement))
+    return packs
+
+
+def _screen_pack(user_id, candidates, requirement, pack_size):
+    # Pool threads don't inherit the request's usage context; batch work yields to interactive calls
+    with usage_context(user_id), llm_priority(BATCH):
+        return evaluate_candidates_packed(candidates, requirement, pack_size)
+
+
+def _pack_outcomes(future, candidates, requirement) -> List[Tuple[Any, Dict[str, Any], Any, Any, str]]:
+    """(candidate_id, requirement, normalized_output, error, source) per candidate of a finished pack."""
+    missing = "No screening result"
+    try:
+        results = future.result()
+    except Exception as e:
+        print(f"❌ Screening pack for requirement {requirement['id']} failed: {e}")
+        results, missing = {}, f"Screening failed: {e}"
+    return [
+        (candidate["id"], requirement, *results.get(candidate["id"], (None, missing, "llm")))
+        for candidate in candidates
+    ]
+
+
+def _save_outcomes(cursor, conn, outcomes) -> Optional[str]:
+    """Write and commit one pack's outcomes; returns the error message on failure."""
+    try:
+        record_screening_batch(cursor, outcomes)
+        conn.commit()
+        bump_table_versions("candidate_screening", "candidate_progress")
+        return None
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Batch screening write failed: {e}")
+        return str(e)
+
+
+def run_batch(cursor, conn, pairs: List[Pair], concurrency: int = SCREEN_BATCH_CONCURRENCY,
+              pack_size: int = SCREEN_PACK_SIZE, user_id=None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Screen all pairs and yield ("progress", event) per finished pair (after
+    its pack is committed), then ("done", summary).
+    pack_size=1 disables prompt packing (one LLM call per pair).
+    LLM calls are attributed to user_id in llm_usage.
+    """
+    concurrency = max(1, min(int(concurrency or 1), SCREEN_BATCH_MAX_CONCURRENCY))
+    pack_size = max(1, int(pack_size or 1))
+    completed = succeeded = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="screen-batch") as pool:
+        pending = {
+            pool.submit(_screen_pack, user_id, candidates, requirement, pack_size): (candidates, requirement)
+            for candidates, requirement in _packs(pairs, pack_size)
+        }
+        try:
+            for future in as_completed(list(pending)):
+                candidates, requirement = pending.pop(future)
+                outcomes = _pack_outcomes(future, candidates, requirement)
+                write_error = _save_outcomes(cursor, conn, outcomes)
+                if write_error:
+                    yield "error", {"error": f"Could not save batch results: {write_error}"}
+                    return
+                for candidate, (_, _, normalized_output, error, source) in zip(candidates, outcomes):
+                    completed += 1
+                    succeeded += 1 if normalized_output else 0
+                    event = _pair_event(candidate, requirement, normalized_output, error)
+                    event.update({"source": source, "completed": completed, "total": len(pairs)})
+                    yield "progress", event
+        finally:
+            # Stopped early (client gone or a failed write): skip packs that haven't
+            # started and keep what the running ones already paid for
+            leftovers = []
+            for future in pending:
+                future.cancel()
+            for future, (candidates, requirement) in pending.items():
+                if not future.cancelled():
+                    leftovers.extend(_pack_outcomes(future, candidates, requirement))
+            if leftovers:
+                _save_outcomes(cursor, conn, leftovers)
+
+    yield "done", {"total": len(pairs), "succeeded": succeeded, "failed": len(pairs) - succeeded}
@@ -0,0 +1,78 @@
+"""
+Incremental re-screening when a requirement changes.
+
+`requirement_fingerprint` hashes only the requirement fields that reach the
+single-candidate screening prompt RESCREEN jobs run (title, skills,
+experience; see utils/prompt_builder.build_screening_input), normalised so
+cosmetic edits (case, whitespace, skill order) don't count as changes.  When the
+fingerprint of an updated requirement differs, every candidate already
+screened for it gets a RESCREEN job, prioritised by their latest score so the
+strongest matches are refreshed first (see services/screening_queue.py for
+the rate limiting).  Nothing is queued when this process runs no screening
+workers, since the jobs would never be picked up.
+"""
+
+import hashlib
+import re
+from typing import Any, Dict
+
+import pymysql.cursors
+
+from services.screening_queue import enqueue_rescreens, screening_workers_running
+from utils.preranker import skills_set
+
+SCREENING_FIELDS = ("title", "skills_required", "experience_required")
+
+
+def _normalize_text(value) -> str:
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def _normalize_experience(value) -> str:
+    # The column is numeric, so "3" from the form and 3.0 from the DB must match
+    try:
+        return f"{float(value):g}"
+    except (TypeError, ValueError):
+        return _normalize_text(value)
+
+
+def requirement_fingerprint(requirement: Dict[str, Any]) -> str:
+    parts = [
+        _normalize_text(requirement.get("title")),
+        ",".join(sorted(skills_set(requirement.get("skills_required")))),
+        _normalize_experience(requirement.get("experience_required")),
+    ]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def screening_fields_changed(old: Dict[str, Any], new: Dict[str, Any]) -> bool:
+    return requirement_fingerprint(old) != requirement_fingerprint(new)
+
+
+def schedule_rescreen(conn, requirement_id) -> int:
+    """Queue RESCREEN jobs for every candidate screened for the requirement (caller commits)."""
+    if not screening_workers_running():
+        print(f"⚠️ Requirement {requirement_id} changed but no screening workers run here; re-screening skipped")
+        return 0
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        # Latest screening per candidate gives the priority
+        cursor.execute("""
+            SELECT cs.candidate_id, cs.ai_score
+            FROM candidate_screening cs
+            JOIN (
+                SELECT candidate_id, MAX(id) AS last_id
+                FROM candidate_screening
+                WHERE requirement_id = %s
+                GROUP BY candidate_id
+            ) latest ON latest.last_id = cs.id
+            ORDER BY cs.ai_score DESC
+        """, (requirement_id,))
+        affected = [(row["candidate_id"], round(float(row["ai_score"] or 0))) for row in cursor.fetchall()]
+        queued = enqueue_rescreens(cursor, requirement_id, affected)
+    finally:
+        cursor.close()
+
+    if affected:
+        print(f"🔁 Requirement {requirement_id} changed: {queued}/{len(affected)} candidates queued for re-screening")
+    return queued
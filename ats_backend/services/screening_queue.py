@@ -0,0 +1,350 @@
+"""
+Asynchronous AI screening on top of the existing `assesment_queue` table.
+
+`POST /api/screen-candidate` with `"async": true` enqueues a SCREENING job and
+returns 202 immediately.  A small pool of background workers claims jobs with
+`SELECT ... FOR UPDATE SKIP LOCKED`, runs the same screening core as the
+synchronous path and stores the result on the job row.  Completion is
+published via n8n (`screening_completed`), an optional per-job callback URL,
+and the SSE endpoint in controllers/ai_screening.py.
+
+Rows written after a successful screening (candidates awaiting assessment)
+keep job_type='ASSESSMENT' and are never picked up by these workers.
+
+RESCREEN jobs (services/rescreen_service.py, queued when a requirement's
+screening fields change) share the workers but only run when no interactive
+SCREENING job is waiting, highest previous score first, and are throttled by
+a token bucket (RESCREEN_RATE_PER_MIN, RESCREEN_BURST).  They add a new score
+row without moving the candidate's pipeline stage.  Pending ones are
+cancelled when their requirement is closed or archived (cancel_rescreens).
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import pymysql.cursors
+import requests
+
+from services.screening_service import notify_screen_complete, resolve_requirement, screen_and_record, screen_and_record_once
+from utils.data_versions import bump_table_versions
+from utils.db import get_db_connection
+from utils.event_notifier import notify_event
+from utils.llm_scheduler import BATCH, llm_priority
+
+JOB_TYPE_SCREENING = "SCREENING"
+JOB_TYPE_ASSESSMENT = "ASSESSMENT"
+JOB_TYPE_RESCREEN = "RESCREEN"
+
+SCREENING_WORKERS = int(os.getenv("SCREENING_WORKERS", "2"))
+SCREENING_POLL_INTERVAL = float(os.getenv("SCREENING_POLL_INTERVAL", "2"))
+# RUNNING jobs older than this are assumed orphaned by a crashed worker
+SCREENING_JOB_STALE_MINUTES = int(os.getenv("SCREENING_JOB_STALE_MINUTES", "10"))
+# Background re-screens started per minute (and how many may start back to back)
+RESCREEN_RATE_PER_MIN = float(os.getenv("RESCREEN_RATE_PER_MIN", "20"))
+RESCREEN_BURST = int(os.getenv("RESCREEN_BURST", "5"))
+
+_wakeup = threading.Event()
+_workers = []
+_stop = threading.Event()
+
+
+class TokenBucket:
+    """Allows `rate_per_min` acquisitions per minute with bursts of up to `burst`."""
+
+    def __init__(self, rate_per_min, burst):
+        self.rate = max(0.0, rate_per_min) / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def refund(self) -> None:
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+_rescreen_bucket = TokenBucket(RESCREEN_RATE_PER_MIN, RESCREEN_BURST)
+
+
+def ensure_screening_queue_schema(cursor) -> None:
+    """Add the job columns the async pipeline needs to assesment_queue."""
+    columns = [
+        ("job_type", f"VARCHAR(32) DEFAULT '{JOB_TYPE_ASSESSMENT}'"),
+        ("attempts", "INT DEFAULT 0"),
+        ("result", "TEXT"),
+        ("error", "TEXT"),
+        ("callback_url", "VARCHAR(500)"),
+        ("started_at", "TIMESTAMP NULL"),
+        ("finished_at", "TIMESTAMP NULL"),
+        ("priority", "INT DEFAULT 0"),
+    ]
+    for name, definition in columns:
+        cursor.execute(f"SHOW COLUMNS FROM assesment_queue LIKE '{name}'")
+        if not cursor.fetchone():
+            print(f"⚠️ Adding '{name}' column to assesment_queue...")
+            cursor.execute(f"ALTER TABLE assesment_queue ADD COLUMN {name} {definition}")
+
+
+def enqueue_screening(cursor, candidate_id, requirement_id, callback_url=None) -> int:
+    """Insert a PENDING screening job (caller commits) and wake a worker."""
+    cursor.execute("""
+        INSERT INTO assesment_queue (candidate_id, requirement_id, status, job_type, callback_url)
+        VALUES (%s, %s, 'PENDING', %s, %s)
+    """, (candidate_id, requirement_id, JOB_TYPE_SCREENING, callback_url))
+    job_id = cursor.lastrowid
+    _wakeup.set()
+    return job_id
+
+
+def enqueue_rescreens(cursor, requirement_id, candidates) -> int:
+    """
+    Insert PENDING re-screen jobs (caller commits).  `candidates` is a list of
+    (candidate_id, priority); pairs that already have an active job are skipped.
+    """
+    queued = 0
+    for candidate_id, priority in candidates:
+        if find_active_screening_job(cursor, candidate_id, requirement_id) is not None:
+            continue
+        cursor.execute("""
+            INSERT INTO assesment_queue (candidate_id, requirement_id, status, job_type, priority)
+            VALUES (%s, %s, 'PENDING', %s, %s)
+        """, (candidate_id, requirement_id, JOB_TYPE_RESCREEN, int(priority or 0)))
+        queued += 1
+    if queued:
+        _wakeup.set()
+    return queued
+
+
+def cancel_rescreens(cursor, requirement_ids) -> int:
+    """Mark PENDING re-screen jobs of `requirement_ids` CANCELLED (caller commits)."""
+    requirement_ids = list(requirement_ids)
+    if not requirement_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(requirement_ids))
+    cursor.execute(f"""
+        UPDATE assesment_queue SET status = 'CANCELLED', finished_at = %s
+        WHERE job_type = %s AND status = 'PENDING' AND requirement_id IN ({placeholders})
+    """, (datetime.now(), JOB_TYPE_RESCREEN, *requirement_ids))
+    return cursor.rowcount or 0
+
+
+def screening_workers_running() -> bool:
+    """True when this process has live workers to run queued jobs."""
+    return not _stop.is_set() and any(thread.is_alive() for thread in _workers)
+
+
+def find_active_screening_job(cursor, candidate_id, requirement_id) -> Optional[int]:
+    """Id of a PENDING/RUNNING screening or re-screen job for the pair, if one exists."""
+    cursor.execute("""
+        SELECT id FROM assesment_queue
+        WHERE job_type IN (%s, %s) AND status IN ('PENDING', 'RUNNING')
+          AND candidate_id = %s AND requirement_id = %s
+        ORDER BY id
+        LIMIT 1
+    """, (JOB_TYPE_SCREENING, JOB_TYPE_RESCREEN, candidate_id, requirement_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row["id"] if isinstance(row, dict) else row[0]
+
+
+def get_screening_job(job_id: int) -> Optional[Dict[str, Any]]:
+    conn = get_db_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("""
+            SELECT id, candidate_id, requirement_id, job_type, status, attempts, result, error,
+                   created_at, started_at, finished_at
+            FROM assesment_queue
+            WHERE id = %s AND job_type IN (%s, %s)
+        """, (job_id, JOB_TYPE_SCREENING, JOB_TYPE_RESCREEN))
+        job = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if job and job.get("result"):
+        try:
+            job["result"] = json.loads(job["result"])
+        except (TypeError, ValueError):
+            pass
+    return job
+
+
+def _claim_next_job(conn) -> Optional[Dict[str, Any]]:
+    """Interactive screenings first; re-screens only when the rate limit allows."""
+    job = _claim_job(conn, JOB_TYPE_SCREENING, "id")
+    if job or not _rescreen_bucket.try_acquire():
+        return job
+    job = _claim_job(conn, JOB_TYPE_RESCREEN, "priority DESC, id")
+    if not job:
+        _rescreen_bucket.refund()
+    return job
+
+
+def _claim_job(conn, job_type, order_by) -> Optional[Dict[str, Any]]:
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(f"""
+            SELECT id, candidate_id, requirement_id, job_type, callback_url
+            FROM assesment_queue
+            WHERE job_type = %s AND status = 'PENDING'
+            ORDER BY {order_by}
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (job_type,))
+        job = cursor.fetchone()
+        if job:
+            cursor.execute("""
+                UPDATE assesment_queue
+                SET status = 'RUNNING', attempts = attempts + 1, started_at = %s
+                WHERE id = %s
+            """, (datetime.now(), job["id"]))
+        conn.commit()
+        return job
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def _finish_job(cursor, job_id, status, result=None, error=None) -> None:
+    cursor.execute("""
+        UPDATE assesment_queue
+        SET status = %s, result = %s, error = %s, finished_at = %s
+        WHERE id = %s
+    """, (status, json.dumps(result) if result is not None else None, error, datetime.now(), job_id))
+
+
+def _publish_completion(job, status, result, error) -> None:
+    payload = {
+        "job_id": job["id"],
+        "job_type": job.get("job_type", JOB_TYPE_SCREENING),
+        "candidate_id": job["candidate_id"],
+        "requirement_id": job["requirement_id"],
+        "status": status,
+        "result": result,
+        "error": error,
+    }
+    notify_event("screening_completed", payload)
+
+    if job.get("callback_url"):
+        try:
+            requests.post(job["callback_url"], json=payload, timeout=3)
+        except requests.RequestException as e:
+            print(f"⚠️ Screening callback failed for job {job['id']}: {e}")
+
+
+def process_screening_job(conn, job) -> None:
+    """Run one claimed job to completion (DONE or ERROR)."""
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    status, result, error, shared = "ERROR", None, None, False
+    try:
+        cursor.execute("SELECT * FROM candidates WHERE id = %s", (job["candidate_id"],))
+        candidate = cursor.fetchone()
+        requirement = resolve_requirement(cursor, job["requirement_id"])
+
+        if not candidate or not requirement:
+            error = "Candidate not found" if not candidate else "Requirement not found"
+        elif job.get("job_type") == JOB_TYPE_RESCREEN:
+            # Not a pipeline event: no stage change and no screen_complete webhook
+            with llm_priority(BATCH):
+                result, error, _source = screen_and_record(cursor, candidate, requirement, update_pipeline=False)
+            status = "DONE" if result else "ERROR"
+        else:
+            result, error, _source, shared = screen_and_record_once(conn, cursor, candidate, requirement)
+            status = "DONE" if result else "ERROR"
+
+        _finish_job(cursor, job["id"], status, result, error)
+        conn.commit()
+        bump_table_versions("candidate_screening", "candidate_progress")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Screening job {job['id']} failed: {e}")
+        status, error = "ERROR", str(e)
+        try:
+            _finish_job(cursor, job["id"], status, None, error)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+    finally:
+        cursor.close()
+
+    if status == "DONE" and not shared and job.get("job_type") != JOB_TYPE_RESCREEN:
+        notify_screen_complete(job["candidate_id"], job["requirement_id"], result)
+    _publish_completion(job, status, result, error)
+
+
+def _worker_loop(worker_no: int) -> None:
+    print(f"🧵 Screening worker {worker_no} started")
+    while not _stop.is_set():
+        try:
+            conn = get_db_connection()
+            job = _claim_next_job(conn) if conn else None
+        except Exception as e:
+            print(f"⚠️ Screening worker {worker_no} could not claim a job: {e}")
+            job = None
+
+        if not job:
+            _wakeup.wait(SCREENING_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        process_screening_job(conn, job)
+
+
+def requeue_stale_jobs() -> int:
+    """Put RUNNING jobs orphaned by a crash/restart back to PENDING."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    cursor = conn.cursor()
+    try:
+        cutoff = datetime.now() - timedelta(minutes=SCREENING_JOB_STALE_MINUTES)
+        cursor.execute("""
+            UPDATE assesment_queue SET status = 'PENDING'
+            WHERE job_type IN (%s, %s) AND status = 'RUNNING' AND started_at < %s
+        """, (JOB_TYPE_SCREENING, JOB_TYPE_RESCREEN, cutoff))
+        conn.commit()
+        return cursor.rowcount or 0
+    except Exception as e:
+        print(f"⚠️ Could not requeue stale screening jobs: {e}")
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def start_screening_workers(count: int = SCREENING_WORKERS) -> None:
+    """Start the background worker pool once per process."""
+    if _workers or count <= 0:
+        return
+    requeued = requeue_stale_jobs()
+    if requeued:
+        print(f"🔄 Requeued {requeued} stale screening jobs")
+    for worker_no in range(1, count + 1):
+        thread = threading.Thread(target=_worker_loop, args=(worker_no,), daemon=True, name=f"screening-worker-{worker_no}")
+        thread.start()
+        _workers.append(thread)
+
+
+def stop_screening_workers() -> None:
+    _stop.set()
+    _wakeup.set()
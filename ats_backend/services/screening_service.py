@@ -0,0 +1,365 @@
+"""
+Screening core shared by the synchronous endpoint, the background queue
+workers and batch screening: resolve the pair, run the AI, normalize the
+output and write the screening / progress / assessment rows.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from utils.gemini import run_gemini_packed_screening, run_gemini_screening
+from utils.prompt_builder import PROMPT_VERSION
+from utils.screening_cache import get_cached_screening, screening_cache_key, store_cached_screening
+from utils.singleflight import SingleFlight
+
+SCREEN_COMPLETE_WEBHOOK = "http://localhost:5678/webhook/screen_complete"
+MODEL_VERSION = "gemini-2.5"
+# Candidates per packed prompt (one requirement + K compact profiles)
+SCREEN_PACK_SIZE = int(os.getenv("SCREEN_PACK_SIZE", "8"))
+
+# Concurrent screenings of the same pair share one LLM call and one set of rows
+_inflight_screenings = SingleFlight()
+
+
+def touch_candidate_progress(cursor, candidate_id, requirement_id, category, stage, status="PENDING", decision="NONE"):
+    # Using stage_name instead of current_stage to match app.py schema
+    cursor.execute("""
+        INSERT INTO candidate_progress (candidate_id, requirement_id, category, stage_name, status, manual_decision)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            category=VALUES(category),
+            stage_name=VALUES(stage_name),
+            status=VALUES(status),
+            manual_decision=VALUES(manual_decision)
+    """, (candidate_id, requirement_id, category or "IT", stage, status, decision or "NONE"))
+
+
+def resolve_requirement(cursor, identifier):
+    if not identifier:
+        return None
+
+    cursor.execute("SELECT * FROM requirements WHERE id = %s", (str(identifier),))
+    row = cursor.fetchone()
+    if row:
+        return row
+
+    cursor.execute(
+        """
+        SELECT * FROM requirements
+        WHERE LOWER(title) = LOWER(%s)
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        (identifier,)
+    )
+    row = cursor.fetchone()
+    if row:
+        return row
+
+    cursor.execute(
+        """
+        SELECT * FROM requirements
+        WHERE LOWER(CONCAT(title, ' ', COALESCE(location, ''))) LIKE %s
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        (f"%{identifier.lower()}%",)
+    )
+    return cursor.fetchone()
+
+
+def normalize_ai_output(ai_output):
+    if not isinstance(ai_output, dict):
+        return None, "AI returned non-JSON output"
+
+    if ai_output.get("error"):
+        return None, ai_output.get("error")
+
+    try:
+        score = float(ai_output.get("score", 0))
+    except (TypeError, ValueError):
+        return None, "AI response missing numeric score"
+
+    rationale = ai_output.get("rationale") or []
+    if isinstance(rationale, str):
+        rationale = [rationale]
+    if not isinstance(rationale, list):
+        rationale = [str(rationale)]
+
+    red_flags = ai_output.get("red_flags") or []
+    if isinstance(red_flags, str):
+        red_flags = [red_flags]
+    if not isinstance(red_flags, list):
+        red_flags = [str(red_flags)]
+
+    recommend = (ai_output.get("recommend") or "NEEDS_INTERVIEW").upper()
+    if recommend not in {"SHORTLISTED", "REJECTED", "NEEDS_INTERVIEW"}:
+        recommend = "NEEDS_INTERVIEW"
+
+    return {
+        "score": round(score, 2),
+        "rationale": rationale,
+        "red_flags": red_flags,
+        "recommend": recommend
+    }, None
+
+
+def evaluate_candidate(candidate: Dict[str, Any], requirement: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str], str]:
+    """
+    Run the AI for one pair, serving repeats from the screening cache.
+    Returns (normalized_output, error_message, source) where source is
+    'memory' / 'db' (cache hit), 'llm' or 'fallback'.
+    """
+    try:
+        cache_key = screening_cache_key(candidate, requirement)
+    except Exception as e:
+        print(f"⚠️ Could not build screening cache key: {e}")
+        cache_key = None
+
+    if cache_key:
+        cached, cache_source = get_cached_screening(cache_key)
+        if cached:
+            return cached, None, cache_source
+
+    try:
+        ai_output = run_gemini_screening(candidate, requirement)
+    except Exception as ai_e:
+        print(f"⚠️ Gemini screening failed: {ai_e}")
+        return None, str(ai_e), "llm"
+
+    source = "fallback" if isinstance(ai_output, dict) and ai_output.get("fallback") else "llm"
+    normalized_output, error = normalize_ai_output(ai_output)
+    if normalized_output and source == "llm" and cache_key:
+        _cache_result(candidate, requirement, normalized_output, ai_output.get("model"))
+    return normalized_output, error, source
+
+
+def _cache_result(candidate, requirement, normalized_output, model) -> None:
+    """Store an LLM result under the model that answered (see utils/screening_cache.py)."""
+    if not model:
+        return
+    try:
+        cache_key = screening_cache_key(candidate, requirement, model)
+        store_cached_screening(cache_key, candidate.get("id"), requirement.get("id"), normalized_output, model)
+    except Exception as e:
+        print(f"⚠️ Could not cache screening result: {e}")
+
+
+def _screen_packed_group(candidates, requirement, results) -> None:
+    """Call the LLM for one packed group; split in halves and retry when the answer is malformed."""
+    if len(candidates) == 1:
+        results[candidates[0]["id"]] = evaluate_candidate(candidates[0], requirement)
+        return
+
+    try:
+        raw_outputs = run_gemini_packed_screening(candidates, requirement)
+    except Exception as e:
+        print(f"⚠️ Packed screening of {len(candidates)} candidates failed ({e}); splitting batch")
+        middle = len(candidates) // 2
+        _screen_packed_group(candidates[:middle], requirement, results)
+        _screen_packed_group(candidates[middle:], requirement, results)
+        return
+
+    retry = []
+    for candidate in candidates:
+        ai_output = raw_outputs.get(candidate["id"])
+        normalized_output, error = normalize_ai_output(ai_output)
+        if not normalized_output:
+            retry.append(candidate)
+            continue
+        source = "fallback" if ai_output.get("fallback") else "packed"
+        if source == "packed":
+            _cache_result(candidate, requirement, normalized_output, ai_output.get("model"))
+        results[candidate["id"]] = (normalized_output, None, source)
+
+    if retry:
+        # Missing / invalid elements: retry just those, as a smaller pack
+        if len(retry) == len(candidates):
+            middle = len(retry) // 2
+            _screen_packed_group(retry[:middle], requirement, results)
+            _screen_packed_group(retry[middle:], requirement, results)
+        else:
+            _screen_packed_group(retry, requirement, results)
+
+
+def evaluate_candidates_packed(candidates: List[Dict[str, Any]], requirement: Dict[str, Any], pack_size: int = SCREEN_PACK_SIZE) -> Dict[Any, Tuple[Optional[Dict[str, Any]], Optional[str], str]]:
+    """
+    Packed variant of evaluate_candidate for many candidates vs one requirement:
+    the requirement is sent once per group of `pack_size` candidates instead of
+    once per candidate.  Returns {candidate_id: (normalized_output, error, source)};
+    source is 'packed' for results that came from a packed prompt.
+    """
+    results = {}
+    pending = []
+    for candidate in candidates:
+        try:
+            cached, cache_source = get_cached_screening(screening_cache_key(candidate, requirement))
+        except Exception as e:
+            print(f"⚠️ Could not build screening cache key: {e}")
+            cached, cache_source = None, None
+        if cached:
+            results[candidate["id"]] = (cached, None, cache_source)
+        else:
+            pending.append(candidate)
+
+    pack_size = max(1, int(pack_size or 1))
+    for start in range(0, len(pending), pack_size):
+        _screen_packed_group(pending[start:start + pack_size], requirement, results)
+    return results
+
+
+def record_screening_result(cursor, candidate_id, requirement, normalized_output, ai_error_msg=None, source="llm",
+                            update_pipeline=True):
+    """
+    Persist the outcome of one screening.  The tracker is ALWAYS updated
+    (even when the AI failed) so the candidate never hangs in the pipeline.
+    update_pipeline=False (re-screening) only adds the new score row and
+    leaves the candidate's stage and assessment queue alone.
+    """
+    if normalized_output:
+        cursor.execute("""
+            INSERT INTO candidate_screening
+            (candidate_id, requirement_id, ai_score, ai_rationale, recommend, red_flags, model_version, result_source)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            candidate_id,
+            requirement["id"],
+            normalized_output["score"],
+            json.dumps(normalized_output["rationale"]),
+            normalized_output["recommend"],
+            json.dumps(normalized_output["red_flags"]),
+            MODEL_VERSION,
+            source
+        ))
+        if not update_pipeline:
+            return
+
+        touch_candidate_progress(
+            cursor,
+            candidate_id,
+            requirement["id"],
+            requirement.get("category", "IT"),
+            stage="Manual Review",
+            status="PENDING",  # Was REVIEW_REQUIRED (invalid enum)
+            decision="NONE"
+        )
+
+        # Queue for assessment
+        cursor.execute("SHOW TABLES LIKE 'assesment_queue'")
+        if cursor.fetchone():
+            cursor.execute("""
+                INSERT INTO assesment_queue (candidate_id, requirement_id, status)
+                VALUES (%s, %s, 'PENDING')
+            """, (candidate_id, requirement["id"]))
+    elif not update_pipeline:
+        # Re-screen failed: the previous score stays the latest one
+        print(f"⚠️ Re-screening failed, keeping previous score: {ai_error_msg}")
+    else:
+        # AI Failed Case - Update tracker to indicate failure/manual need
+        print(f"⚠️ Updating tracker for failed screening: {ai_error_msg}")
+        touch_candidate_progress(
+            cursor,
+            candidate_id,
+            requirement["id"],
+            requirement.get("category", "IT"),
+            stage="Screening Failed",
+            status="PENDING",  # Was REVIEW_REQUIRED (invalid enum)
+            decision="HOLD"    # Valid ENUM (instead of RETRY_NEEDED)
+        )
+
+
+def record_screening_batch(cursor, outcomes) -> None:
+    """
+    Batched variant of record_screening_result for bulk screening.
+    `outcomes` is a list of (candidate_id, requirement, normalized_output, error, source).
+    Each table gets a single executemany (multi-row INSERT under PyMySQL).
+    """
+    screening_rows, progress_rows, queue_rows = [], [], []
+    for candidate_id, requirement, normalized_output, _error, source in outcomes:
+        category = requirement.get("category") or "IT"
+        if normalized_output:
+            screening_rows.append((
+                candidate_id,
+                requirement["id"],
+                normalized_output["score"],
+                json.dumps(normalized_output["rationale"]),
+                normalized_output["recommend"],
+                json.dumps(normalized_output["red_flags"]),
+                MODEL_VERSION,
+                source
+            ))
+            progress_rows.append((candidate_id, requirement["id"], category, "Manual Review", "PENDING", "NONE"))
+            queue_rows.append((candidate_id, requirement["id"]))
+        else:
+            progress_rows.append((candidate_id, requirement["id"], category, "Screening Failed", "PENDING", "HOLD"))
+
+    if screening_rows:
+        cursor.executemany("""
+            INSERT INTO candidate_screening
+            (candidate_id, requirement_id, ai_score, ai_rationale, recommend, red_flags, model_version, result_source)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, screening_rows)
+
+    if progress_rows:
+        cursor.executemany("""
+            INSERT INTO candidate_progress (candidate_id, requirement_id, category, stage_name, status, manual_decision)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                category=VALUES(category),
+                stage_name=VALUES(stage_name),
+                status=VALUES(status),
+                manual_decision=VALUES(manual_decision)
+        """, progress_rows)
+
+    if queue_rows:
+        cursor.executemany("""
+            INSERT INTO assesment_queue (candidate_id, requirement_id, status)
+            VALUES (%s, %s, 'PENDING')
+        """, queue_rows)
+
+
+def notify_screen_complete(candidate_id, requirement_id, normalized_output) -> None:
+    """Webhook Notification (Best Effort)."""
+    try:
+        requests.post(
+            SCREEN_COMPLETE_WEBHOOK,
+            json={
+                "candidate_id": candidate_id,
+                "requirement_id": requirement_id,
+                "ai_score": normalized_output.get("score"),
+                "recommend": normalized_output.get("recommend")
+            },
+            timeout=3
+        )
+    except requests.RequestException:
+        print("⚠️ Could not send event to n8n (server offline).")
+
+
+def screen_and_record(cursor, candidate, requirement, update_pipeline=True) -> Tuple[Optional[Dict[str, Any]], Optional[str], str]:
+    """Evaluate one pair and write its rows (caller commits). Returns (output, error, source)."""
+    normalized_output, ai_error_msg, source = evaluate_candidate(candidate, requirement)
+    record_screening_result(cursor, candidate["id"], requirement, normalized_output, ai_error_msg, source,
+                            update_pipeline=update_pipeline)
+    return normalized_output, ai_error_msg, source
+
+
+def screen_and_record_once(conn, cursor, candidate, requirement) -> Tuple[Optional[Dict[str, Any]], Optional[str], str, bool]:
+    """
+    screen_and_record + commit, coalesced per (candidate, requirement, prompt
+    version): concurrent duplicates (double-clicks, client retries, a queued
+    job racing a sync request) wait for the in-flight screening instead of
+    calling the LLM and inserting rows again.  Returns (output, error, source,
+    shared) where shared=True means another request did the work.
+    """
+    key = (str(candidate["id"]), str(requirement["id"]), PROMPT_VERSION)
+
+    def run():
+        outcome = screen_and_record(cursor, candidate, requirement)
+        conn.commit()
+        return outcome
+
+    (normalized_output, ai_error_msg, source), shared = _inflight_screenings.do(key, run)
+    return normalized_output, ai_error_msg, source, shared
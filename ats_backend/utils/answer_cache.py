@@ -0,0 +1,114 @@
+"""
+Cache of AI chat answers for repeated questions.
+
+"how many open requirements" or "show my allocations" asked again by the same
+user gets the stored answer instead of another context gather + LLM call:
+
+    result, hit = cached_answer("chat", message, user_scope(user), tables, compute, cacheable)
+
+- Entries are keyed by (feature, scope, normalized question).  Normalizing
+  lower-cases the question and keeps only its words, so "How many open
+  requirements?" and "how many open requirements" share an entry.
+- An entry is served while it is younger than ANSWER_CACHE_TTL seconds AND
+  none of `tables` changed since it was stored (utils/data_versions); the TTL
+  bounds staleness from writes made by other processes.
+- Identical questions asked concurrently share one computation (SingleFlight).
+- Results for which `cacheable(result)` is false (errors, partial context,
+  LLM failure replies) are returned but not stored.
+- At most ANSWER_CACHE_SIZE entries are kept (LRU).
+
+Cached results are shared between requests and must not be mutated.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from utils.data_versions import table_versions
+from utils.entity_index import tokenize
+from utils.singleflight import SingleFlight
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") not in ("0", "false", "False")
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+
+_entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_flight = SingleFlight()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "invalidated": 0, "evicted": 0, "uncacheable": 0}
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(tokenize(question))
+
+
+def cached_answer(
+    feature: str,
+    question: str,
+    scope: tuple,
+    tables: Iterable[str],
+    compute: Callable[[], Any],
+    cacheable: Callable[[Any], bool],
+) -> Tuple[Any, bool]:
+    """(result, hit): the stored result for this question and scope, or compute()'s."""
+    if not ANSWER_CACHE_ENABLED:
+        return compute(), False
+
+    key = (feature, scope, normalize_question(question))
+    versions = table_versions(tuple(tables))
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if entry["versions"] == versions and time.time() < entry["expires_at"]:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return entry["value"], True
+            _stats["expired" if entry["versions"] == versions else "invalidated"] += 1
+            del _entries[key]
+        _stats["misses"] += 1
+
+    def load():
+        # Versions were read before computing: a write landing mid-call leaves
+        # the entry one version behind, so the next ask recomputes
+        value = compute()
+        with _lock:
+            if not cacheable(value):
+                _stats["uncacheable"] += 1
+                return value
+            _entries[key] = {"value": value, "versions": versions, "expires_at": time.time() + ANSWER_CACHE_TTL}
+            _entries.move_to_end(key)
+            while len(_entries) > ANSWER_CACHE_SIZE:
+                _entries.popitem(last=False)
+                _stats["evicted"] += 1
+        return value
+
+    value, shared = _flight.do(key + versions, load)
+    if shared:
+        with _lock:
+            _stats["coalesced"] += 1
+    return value, False
+
+
+def clear_answer_cache() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def answer_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "ttl_seconds": ANSWER_CACHE_TTL,
+            "entries": len(_entries),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+            **_stats,
+        }
+
+
+def reset_answer_cache_stats() -> None:
+    with _lock:
+        for counter in _stats:
+            _stats[counter] = 0
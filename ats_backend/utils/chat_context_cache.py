@@ -0,0 +1,111 @@
+"""
+Short-lived cache for the ATS data gathered into AI chat context.
+
+Every chat / avatar-chat message used to rebuild the logged-in user's self
+context (profile, assignments, own candidates, and five COUNT(*) queries for
+admins), and general admin questions reloaded six full tables.  Follow-up
+messages in a conversation now reuse what was gathered:
+
+    rows = cached_context("requirements:admin", ("requirements", "clients"),
+                          list_requirements_for_admin, scope=role_scope(user))
+
+- Entries are keyed by (scope, name); the scope is the user (user_scope: id,
+  role and client) for user-filtered data, or just the role (role_scope) for
+  org-wide lists every admin sees the same way.
+- An entry is used while it is younger than CHAT_CONTEXT_CACHE_TTL seconds
+  AND none of the tables it was built from changed since (utils/data_versions).
+- Concurrent misses for the same key share one load (SingleFlight).
+- At most CHAT_CONTEXT_CACHE_SIZE entries are kept (LRU).
+
+Cached values are shared between requests: callers put them into the context
+dict as they are and must not mutate them.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from utils.data_versions import table_versions
+from utils.singleflight import SingleFlight
+
+CHAT_CONTEXT_CACHE_ENABLED = os.getenv("CHAT_CONTEXT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+CHAT_CONTEXT_CACHE_TTL = float(os.getenv("CHAT_CONTEXT_CACHE_TTL", "60"))
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "512"))
+
+_entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_flight = SingleFlight()
+_stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0, "evicted": 0}
+
+
+def user_scope(user: Optional[Dict[str, Any]]) -> tuple:
+    user = user or {}
+    return ("user", user.get("id"), (user.get("role") or "").upper(), user.get("client_id"))
+
+
+def role_scope(user: Optional[Dict[str, Any]]) -> tuple:
+    return ("role", ((user or {}).get("role") or "").upper())
+
+
+def cached_context(name: str, tables: Iterable[str], loader: Callable[[], Any], scope: tuple) -> Any:
+    """
+    `loader()`'s result for (scope, name), reloaded when older than the TTL or
+    when one of `tables` changed since it was loaded.
+    """
+    if not CHAT_CONTEXT_CACHE_ENABLED:
+        return loader()
+
+    tables = tuple(tables)
+    key = scope + (name,)
+    now = time.time()
+    versions = table_versions(tables)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if entry["versions"] == versions and now < entry["expires_at"]:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return entry["value"]
+            _stats["expired" if entry["versions"] == versions else "invalidated"] += 1
+            del _entries[key]
+        _stats["misses"] += 1
+
+    def load():
+        # Versions are read before loading: a write landing mid-load leaves
+        # the entry one version behind, so the next lookup reloads it
+        value = loader()
+        with _lock:
+            _entries[key] = {"value": value, "versions": versions, "expires_at": time.time() + CHAT_CONTEXT_CACHE_TTL}
+            _entries.move_to_end(key)
+            while len(_entries) > CHAT_CONTEXT_CACHE_SIZE:
+                _entries.popitem(last=False)
+                _stats["evicted"] += 1
+        return value
+
+    value, _shared = _flight.do(key + versions, load)
+    return value
+
+
+def clear_chat_context_cache() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def chat_context_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "enabled": CHAT_CONTEXT_CACHE_ENABLED,
+            "ttl_seconds": CHAT_CONTEXT_CACHE_TTL,
+            "entries": len(_entries),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+            **_stats,
+        }
+
+
+def reset_chat_context_cache_stats() -> None:
+    with _lock:
+        for counter in _stats:
+            _stats[counter] = 0
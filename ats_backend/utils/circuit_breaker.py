@@ -0,0 +1,129 @@
+"""
+Circuit breaker for LLM provider calls (used by utils/llm_transport.py).
+
+CLOSED    → calls flow; outcomes go into a sliding window.
+OPEN      → after LLM_CB_FAILURES consecutive failures, or when at least
+            LLM_CB_SLOW_RATIO of the window were slow calls; every call is
+            rejected immediately with CircuitOpenError for LLM_CB_COOLDOWN s.
+HALF_OPEN → one probe call is let through; success closes, failure re-opens.
+
+CircuitOpenError subclasses requests.RequestException, so the existing
+`except requests.RequestException` paths (e.g. _fallback_screening) take
+over in milliseconds instead of waiting out a timeout.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+import requests
+
+LLM_CB_FAILURES = int(os.getenv("LLM_CB_FAILURES", "5"))
+LLM_CB_SLOW_MS = float(os.getenv("LLM_CB_SLOW_MS", "10000"))
+LLM_CB_SLOW_RATIO = float(os.getenv("LLM_CB_SLOW_RATIO", "0.5"))
+LLM_CB_WINDOW = int(os.getenv("LLM_CB_WINDOW", "20"))
+LLM_CB_MIN_CALLS = int(os.getenv("LLM_CB_MIN_CALLS", "10"))
+LLM_CB_COOLDOWN = float(os.getenv("LLM_CB_COOLDOWN", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=LLM_CB_FAILURES, slow_call_ms=LLM_CB_SLOW_MS,
+                 slow_ratio=LLM_CB_SLOW_RATIO, window=LLM_CB_WINDOW, min_calls=LLM_CB_MIN_CALLS,
+                 cooldown=LLM_CB_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_ratio = slow_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._window = deque(maxlen=window)  # True = slow call
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError when the call must be short-circuited."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            if self.state != CLOSED:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is {self.state.lower()}")
+
+    def record(self, success: bool, elapsed_ms: float) -> None:
+        with self._lock:
+            slow = elapsed_ms >= self.slow_call_ms
+            if self.state == HALF_OPEN:
+                if success and not slow:
+                    print(f"✅ {self.name} circuit closed after successful probe")
+                    self._reset()
+                else:
+                    self._open()
+                return
+
+            self._window.append(slow)
+            self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+            slow_calls = sum(self._window)
+            if self.consecutive_failures >= self.failure_threshold or (
+                len(self._window) >= self.min_calls and slow_calls / len(self._window) >= self.slow_ratio
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        if self.state != OPEN:
+            print(f"🚫 {self.name} circuit opened (failures={self.consecutive_failures}, "
+                  f"slow={sum(self._window)}/{len(self._window)}); cooling off {self.cooldown:.0f}s")
+            self.times_opened += 1
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def _reset(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._window.clear()
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "slow_calls": sum(self._window),
+                "window": len(self._window),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,169 @@
+"""
+Token-budgeted assembly of AI chat context.
+
+_gather_chat_context can put whole tables into the context (general admin
+questions load clients, users, usersdata, requirements, candidates and
+allocations).  assemble_context() keeps the prompt bounded:
+
+- single records, stats and scalars (user, self_profile, requirement,
+  tracking_stats, ...) are always kept;
+- rows of list sections are scored against the question (shared words with
+  the row's values, weighted by how rare they are in that list, and a bonus
+  when the row's name/title is in the question) and added best-first while
+  the estimated token cost stays within CHAT_CONTEXT_TOKEN_BUDGET; rows that
+  don't score fill what is left, newest first, round-robin across sections;
+- each trimmed section is summarised under context["omitted"] with its total
+  row count and a count per status/role, so "how many ..." questions are
+  still answered from complete numbers.
+
+Token cost is estimated as compact-JSON characters / 4.
+"""
+
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from utils.entity_index import STOPWORDS, tokenize
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+
+CHARS_PER_TOKEN = 4
+
+# Columns worth counting in the summary of a trimmed section (first one present wins)
+SUMMARY_FIELDS = ("status", "allocation_status", "requirement_status", "role", "recommend")
+
+# Columns naming a row; the question mentioning one is a strong signal
+NAME_FIELDS = ("name", "title", "candidate_name", "client_name", "recruiter_name")
+
+_lock = threading.Lock()
+_stats = {"assembled": 0, "trimmed": 0, "tokens_in": 0, "tokens_out": 0, "rows_omitted": 0}
+
+QUESTION_STOPWORDS = STOPWORDS | {
+    "many", "much", "are", "is", "was", "were", "has", "have", "there", "which", "where", "when",
+    "this", "that", "these", "those", "from", "into", "our", "my", "me", "of", "in", "on", "to", "a",
+}
+
+
+def estimate_tokens(value: Any) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, default=str, separators=(",", ":"))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _row_words(row: Any) -> set:
+    words = set()
+    if isinstance(row, dict):
+        for value in row.values():
+            if isinstance(value, (str, int, float)):
+                words.update(tokenize(str(value)))
+    return words
+
+
+def _section_scores(rows: List[Any], question_words: set, question_text: str) -> List[float]:
+    """
+    Per row: shared question words weighted by how rare they are in the
+    section (a word every row has, like a common skill, counts for ~0), plus
+    5 when the row's name/title appears in the question.
+    """
+    row_words = [_row_words(row) & question_words for row in rows]
+    frequency = Counter(word for words in row_words for word in words)
+    weight = {word: math.log((len(rows) - df + 0.5) / (df + 0.5) + 1) for word, df in frequency.items()}
+
+    scores = []
+    for row, words in zip(rows, row_words):
+        score = sum(weight[word] for word in words)
+        if isinstance(row, dict):
+            for field in NAME_FIELDS:
+                name = row.get(field)
+                if isinstance(name, str) and len(name) > 2 and name.lower() in question_text:
+                    score += 5
+        scores.append(score)
+    return scores
+
+
+def _summary(rows: List[Any], kept: int) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"total": len(rows), "included": kept, "omitted": len(rows) - kept}
+    dict_rows = [row for row in rows if isinstance(row, dict)]
+    for field in SUMMARY_FIELDS:
+        if any(field in row for row in dict_rows):
+            summary[f"by_{field}"] = dict(Counter(str(row.get(field)) for row in dict_rows).most_common())
+            break
+    return summary
+
+
+def assemble_context(context: Dict[str, Any], question: str, budget_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    A copy of `context` that fits `budget_tokens` (CHAT_CONTEXT_TOKEN_BUDGET by
+    default): list sections keep their most relevant rows, the rest becomes
+    counts under "omitted".  Input lists are not modified.
+    """
+    budget = CHAT_CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    tokens_in = estimate_tokens(context)
+    if budget <= 0 or tokens_in <= budget:
+        _count(tokens_in, tokens_in, 0)
+        return context
+
+    sections = {key: value for key, value in context.items() if isinstance(value, list) and value}
+    assembled = {key: value for key, value in context.items() if key not in sections}
+    remaining = budget - estimate_tokens(assembled) - estimate_tokens({"omitted": {key: _summary(rows, 0) for key, rows in sections.items()}})
+
+    question_text = (question or "").lower()
+    question_words = {word for word in tokenize(question_text) if word not in QUESTION_STOPWORDS}
+
+    # Relevant rows first (by score); then, per section, newest first (lists arrive
+    # newest first), with equal ranks across sections so each gets its share
+    ranked = []
+    for key, rows in sections.items():
+        scores = _section_scores(rows, question_words, question_text)
+        order = sorted(range(len(rows)), key=lambda i: (-scores[i], i))
+        for rank, i in enumerate(order):
+            ranked.append((scores[i] if scores[i] >= 1 else 0.0, -rank, key, i))
+    ranked.sort(key=lambda item: (-item[0], -item[1]))
+
+    chosen: Dict[str, List[int]] = {key: [] for key in sections}
+    for _score, _rank, key, i in ranked:
+        cost = estimate_tokens(sections[key][i]) + 1
+        if cost <= remaining:
+            chosen[key].append(i)
+            remaining -= cost
+
+    omitted = {}
+    for key, rows in sections.items():
+        keep = sorted(chosen[key])
+        assembled[key] = [rows[i] for i in keep]
+        if len(keep) < len(rows):
+            omitted[key] = _summary(rows, len(keep))
+    if omitted:
+        assembled["omitted"] = omitted
+    _count(tokens_in, estimate_tokens(assembled), sum(summary["omitted"] for summary in omitted.values()))
+    return assembled
+
+
+def _count(tokens_in: int, tokens_out: int, rows_omitted: int) -> None:
+    with _lock:
+        _stats["assembled"] += 1
+        _stats["trimmed"] += 1 if rows_omitted else 0
+        _stats["tokens_in"] += tokens_in
+        _stats["tokens_out"] += tokens_out
+        _stats["rows_omitted"] += rows_omitted
+
+
+def context_assembly_stats() -> Dict[str, Any]:
+    with _lock:
+        assembled = _stats["assembled"]
+        return {
+            "budget_tokens": CHAT_CONTEXT_TOKEN_BUDGET,
+            "assembled": assembled,
+            "trimmed": _stats["trimmed"],
+            "rows_omitted": _stats["rows_omitted"],
+            "avg_tokens_in": round(_stats["tokens_in"] / assembled) if assembled else 0,
+            "avg_tokens_out": round(_stats["tokens_out"] / assembled) if assembled else 0,
+        }
+
+
+def reset_context_assembly_stats() -> None:
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,136 @@
+"""
+Gemini context caching for static prompt prefixes.
+
+The chat system prompts (schema description + role rules) and the screening
+instruction blocks are identical on every call.  With
+LLM_CONTEXT_CACHE_ENABLED=1 each distinct prefix is uploaded once as a
+`cachedContents` resource; generateContent calls then reference it by name
+and send only the per-call part, so the provider does not re-process the
+prefix every time.
+
+- Handles are renewed LLM_CONTEXT_CACHE_REFRESH seconds before their TTL ends.
+- Concurrent first uses of a prefix share one create call (SingleFlight).
+- When creating fails (e.g. the provider's minimum cacheable size is not met,
+  or the endpoint is unavailable) the prefix is sent inline and creation is
+  not retried for LLM_CONTEXT_CACHE_RETRY seconds.
+- Callers that get a 400/403/404 for a cached call drop the handle with
+  invalidate_cached_prefix() and resend inline.
+
+Works against gemini_stub.py, which implements the cachedContents endpoint.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+from utils.llm_transport import post_json
+from utils.singleflight import SingleFlight
+
+LLM_CONTEXT_CACHE_ENABLED = os.getenv("LLM_CONTEXT_CACHE_ENABLED", "0") in ("1", "true", "True")
+LLM_CONTEXT_CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+LLM_CONTEXT_CACHE_REFRESH = int(os.getenv("LLM_CONTEXT_CACHE_REFRESH", "300"))
+LLM_CONTEXT_CACHE_RETRY = int(os.getenv("LLM_CONTEXT_CACHE_RETRY", "600"))
+
+# Status codes meaning "this cached content can't be used" on a generate call
+STALE_HANDLE_STATUSES = {400, 403, 404}
+
+_handles: Dict[str, Dict[str, Any]] = {}
+_handles_lock = threading.Lock()
+_flight = SingleFlight()
+_stats = {"hits": 0, "created": 0, "refreshed": 0, "create_failures": 0, "invalidated": 0, "inline": 0}
+
+
+def _bump(counter: str) -> None:
+    with _handles_lock:
+        _stats[counter] += 1
+
+
+def _prefix_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _create(base_url: str, api_key: str, model: str, text: str) -> Optional[str]:
+    payload = {
+        "model": f"models/{model}",
+        "systemInstruction": {"parts": [{"text": text}]},
+        "ttl": f"{LLM_CONTEXT_CACHE_TTL}s",
+    }
+    try:
+        resp = post_json(f"{base_url}/v1beta/cachedContents", payload, params={"key": api_key},
+                         timeout=15, retries=1, name="context_cache", breaker=None)
+    except requests.RequestException as e:
+        print(f"⚠️ Context cache create failed: {e}")
+        return None
+    if resp.status_code != 200:
+        print(f"⚠️ Context cache create failed ({resp.status_code}): {resp.text[:200]}")
+        return None
+    try:
+        return resp.json()["name"]
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ Context cache create returned no name: {e}")
+        return None
+
+
+def cached_prefix(base_url: str, api_key: Optional[str], model: str, text: str) -> Optional[str]:
+    """
+    Name of a live cachedContents resource holding `text` as the system
+    instruction for `model`, or None when the caller should send it inline.
+    """
+    if not LLM_CONTEXT_CACHE_ENABLED or not api_key or not text:
+        return None
+
+    key = _prefix_key(model, text)
+    now = time.time()
+    with _handles_lock:
+        entry = _handles.get(key)
+        if entry and entry["name"] and now < entry["refresh_at"]:
+            _stats["hits"] += 1
+            return entry["name"]
+        if entry and not entry["name"] and now < entry["retry_at"]:
+            _stats["inline"] += 1
+            return None
+
+    def create():
+        name = _create(base_url, api_key, model, text)
+        created_at = time.time()
+        with _handles_lock:
+            if name:
+                _stats["refreshed" if entry and entry["name"] else "created"] += 1
+                _handles[key] = {
+                    "name": name,
+                    "refresh_at": created_at + max(0, LLM_CONTEXT_CACHE_TTL - LLM_CONTEXT_CACHE_REFRESH),
+                    "retry_at": 0,
+                }
+            else:
+                _stats["create_failures"] += 1
+                _handles[key] = {"name": None, "refresh_at": 0, "retry_at": created_at + LLM_CONTEXT_CACHE_RETRY}
+        return name
+
+    name, _shared = _flight.do(key, create)
+    if not name:
+        _bump("inline")
+    return name
+
+
+def invalidate_cached_prefix(name: str) -> None:
+    """Forget a handle the provider no longer accepts; the next call recreates it."""
+    with _handles_lock:
+        for key, entry in list(_handles.items()):
+            if entry["name"] == name:
+                del _handles[key]
+                _stats["invalidated"] += 1
+
+
+def context_cache_stats() -> Dict[str, Any]:
+    with _handles_lock:
+        return {"enabled": LLM_CONTEXT_CACHE_ENABLED, "handles": sum(1 for e in _handles.values() if e["name"]), **_stats}
+
+
+def reset_context_cache_stats() -> None:
+    with _handles_lock:
+        for counter in _stats:
+            _stats[counter] = 0
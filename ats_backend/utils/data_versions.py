@@ -0,0 +1,114 @@
+"""
+In-process version counters for the ATS tables.
+
+Every write that changes what the AI chat can see bumps the version of the
+tables it touched; caches built from those tables remember the versions they
+were built at and treat a mismatch as a miss.
+
+Writes are picked up in two places:
+
+- app.py's after_request hook calls bump_for_endpoint() for every successful
+  POST/PUT/PATCH/DELETE, using ENDPOINT_TABLES (view function name -> tables).
+  An endpoint missing from the map bumps every table, so a new write route is
+  never served stale data, only invalidates more than it needs to.
+- Writers outside a request (screening queue workers, batch and re-screening)
+  call bump_table_versions() themselves.
+
+Counters are per process: with several workers, a write handled by another
+process is only seen once the cached entry's TTL runs out.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+TABLES = (
+    "candidates", "requirements", "requirement_stages", "requirement_allocations",
+    "candidate_progress", "candidate_screening", "interviews", "clients", "users",
+    "usersdata", "interaction_logs",
+)
+
+_PIPELINE = ("candidate_progress", "candidate_screening", "interviews")
+
+# View function name -> tables its successful writes may change
+ENDPOINT_TABLES: Dict[str, tuple] = {
+    # Candidates
+    "submit_candidate": ("candidates",),
+    "update_candidate": ("candidates",),
+    "delete_candidate": ("candidates",) + _PIPELINE,
+    # Users
+    "create_user": ("users", "usersdata"),
+    "add_user": ("users", "usersdata"),
+    "signup": ("users", "usersdata"),
+    "update_user": ("users", "usersdata"),
+    "update_user_status": ("users", "usersdata"),
+    "delete_user": ("users", "usersdata", "requirement_allocations"),
+    # Requirements
+    "create_requirement": ("requirements", "requirement_stages"),
+    "update_requirement": ("requirements", "requirement_stages"),
+    "delete_requirement": ("requirements", "requirement_stages", "requirement_allocations") + _PIPELINE,
+    "archive_requirements": ("requirements", "requirement_stages", "requirement_allocations") + _PIPELINE,
+    "assign_requirement": ("requirement_allocations", "requirements"),
+    "create_screening_process": ("requirement_stages",),
+    # Clients
+    "create_client": ("clients",),
+    "update_client": ("clients",),
+    "delete_client": ("clients", "requirements", "requirement_stages", "requirement_allocations") + _PIPELINE,
+    # Pipeline
+    "update_stage_status": _PIPELINE,
+    "update_stage": _PIPELINE,
+    "recruiter_decision": _PIPELINE,
+    "assign_candidate": _PIPELINE,
+    "create_interview": _PIPELINE,
+    "screen_candidate": ("candidate_screening", "candidate_progress"),
+    "screen_batch": ("candidate_screening", "candidate_progress"),
+    # AI chat logs its own exchanges
+    "chat": ("interaction_logs",),
+    "avatar_chat": ("interaction_logs",),
+    "chat_stream": ("interaction_logs",),
+    "avatar_chat_stream": ("interaction_logs",),
+    # Writes that don't change ATS data
+    "login": (),
+    "logout": (),
+    "verify_session": (),
+    "jd_to_requirement": (),
+    "invalidate_screening_cache_route": (),
+    "reset_ai_metrics": (),
+    "put_ai_budget": (),
+}
+
+_lock = threading.Lock()
+_versions: Dict[str, int] = defaultdict(int)
+_bumps = {"requests": 0, "direct": 0, "unmapped": 0}
+
+
+def bump_table_versions(*tables: str) -> None:
+    """Mark `tables` as changed (no arguments = every table)."""
+    with _lock:
+        for table in tables or TABLES:
+            _versions[table] += 1
+        _bumps["direct"] += 1
+
+
+def bump_for_endpoint(endpoint: Optional[str]) -> None:
+    """Called after a successful write request; `endpoint` is Flask's request.endpoint."""
+    name = (endpoint or "").rsplit(".", 1)[-1]
+    tables = ENDPOINT_TABLES.get(name)
+    with _lock:
+        if tables is None:
+            tables = TABLES
+            _bumps["unmapped"] += 1
+        for table in tables:
+            _versions[table] += 1
+        _bumps["requests"] += 1
+
+
+def table_versions(tables: Iterable[str]) -> tuple:
+    """Current version of each table, in order; compare with ==."""
+    with _lock:
+        return tuple(_versions[table] for table in tables)
+
+
+def data_versions_stats() -> Dict[str, object]:
+    with _lock:
+        return {"versions": dict(_versions), **_bumps}
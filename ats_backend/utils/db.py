@@ -143,12 +143,50 @@ class RobustConnection:
 import threading
 _thread_locals = threading.local()
 
+# -------------------------------------
+# Storage backend selection
+# -------------------------------------
+# DB_BACKEND=mysql (default) uses PyMySQL via RobustConnection.
+# DB_BACKEND=sqlite runs against SQLite for fast local tests/benchmarks;
+# SQLITE_PATH is a file path or ":memory:" (default).
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", ":memory:")
+
+_sqlite_shared = None
+_sqlite_lock = threading.Lock()
+
+
+def get_sqlite_connection():
+    """
+    In-memory databases live inside one connection, so all threads share it
+    (statements are serialized by its lock). File databases get one
+    connection per thread, like the MySQL path.
+    """
+    global _sqlite_shared
+    from utils.sqlite_backend import SQLiteConnection
+
+    database_name = os.getenv("DB_NAME", "ats_system")
+    if SQLITE_PATH == ":memory:":
+        with _sqlite_lock:
+            if _sqlite_shared is None:
+                print("🔌 Using in-memory SQLite database")
+                _sqlite_shared = SQLiteConnection(":memory:", database_name)
+        return _sqlite_shared
+
+    if not hasattr(_thread_locals, 'sqlite_connection'):
+        _thread_locals.sqlite_connection = SQLiteConnection(SQLITE_PATH, database_name)
+    return _thread_locals.sqlite_connection
+
+
 def get_db_connection():
     """
     Returns a thread-local RobustConnection instance.
     This ensures each thread has its own persistent connection, preventing race conditions
     while maintaining the "persistent" and "auto-reconnect" behavior.
     """
+    if DB_BACKEND == "sqlite":
+        return get_sqlite_connection()
+
     if not hasattr(_thread_locals, 'connection'):
         _thread_locals.connection = RobustConnection(get_db_config())
     
@@ -161,5 +199,32 @@ def get_db_connection():
 
     return _thread_locals.connection
 
+def get_dedicated_connection(purpose):
+    """
+    A thread-local connection separate from get_db_connection()'s, for I/O
+    that must commit (or roll back) on its own without touching the caller's
+    open transaction.  One per `purpose` and thread; MySQL ones autocommit.
+    The shared in-memory SQLite database has only one connection, so that
+    backend returns it.
+    """
+    attr = f"{purpose}_connection"
+    if DB_BACKEND == "sqlite":
+        if SQLITE_PATH == ":memory:":
+            return get_sqlite_connection()
+        if not hasattr(_thread_locals, attr):
+            from utils.sqlite_backend import SQLiteConnection
+            setattr(_thread_locals, attr, SQLiteConnection(SQLITE_PATH, os.getenv("DB_NAME", "ats_system")))
+        return getattr(_thread_locals, attr)
+
+    if not hasattr(_thread_locals, attr):
+        setattr(_thread_locals, attr, RobustConnection({**get_db_config(), "autocommit": True}))
+    connection = getattr(_thread_locals, attr)
+    try:
+        connection.ping(reconnect=True)
+    except Exception:
+        connection = RobustConnection({**get_db_config(), "autocommit": True})
+        setattr(_thread_locals, attr, connection)
+    return connection
+
 # Backwards-compatible export for existing imports in app.py
 db_config = get_db_config()
@@ -0,0 +1,302 @@
+"""
+In-memory index of the entity names people mention in AI chat messages.
+
+Candidate names, requirement titles, client names and recruiter names are
+kept in token tries (one per kind), so find_entities() finds every mentioned
+entity in a single pass over the message's tokens instead of running a
+LIKE '%word%' query per word or loading whole tables to substring-match.
+
+    find_entities("status of the python developer role for acme")
+    -> {"requirement": [{"id": "...", "name": "Python Developer", "exact": True, ...}],
+        "client": [{"id": 3, "name": "Acme", "exact": True, ...}]}
+
+- Requirements are also found by their id, people by their email.
+- Matching is on whole tokens (lower-cased words, emails and ids like R-12
+  stay one token), so "Al" no longer matches inside "sales".
+- Multi-word candidate and recruiter names are also indexed per word
+  (first name, surname); such partial matches come back with exact=False,
+  after exact ones.
+- Writes update the tries per row: app.py's after_request hook passes every
+  successful write to note_write(), which uses the retrieval index's routing
+  (utils/retrieval_index.write_actions) to queue "re-read these rows" work
+  that the next lookup applies.  A kind is only rebuilt from its whole table
+  on first use, for routes the routing can't map, and after
+  ENTITY_INDEX_MAX_AGE seconds to pick up writes made by other processes.
+- Rows are read from the DB without holding the lookup lock (queued work and
+  rebuilds run one thread at a time), so lookups never wait on DB I/O unless
+  their own kind has work queued or is being rebuilt.
+
+The index only returns ids and names.  Callers load the records through the
+role-checked fetchers in services/ai_data_service.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pymysql.cursors
+
+from utils.db import get_db_connection
+from utils.singleflight import SingleFlight
+
+ENTITY_INDEX_MAX_AGE = float(os.getenv("ENTITY_INDEX_MAX_AGE", "300"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[@._'+-][a-z0-9]+)*")
+
+# Words too common in questions to identify someone on their own
+STOPWORDS = {
+    "the", "and", "for", "with", "all", "any", "who", "what", "how", "show", "list", "get", "give",
+    "details", "about", "status", "candidate", "candidates", "requirement", "requirements",
+    "client", "clients", "recruiter", "recruiters", "user", "users", "role", "open", "closed",
+}
+
+# kind -> query over the table aliased `t` returning id, name[, extra columns]
+SOURCES = {
+    "candidate": "SELECT t.id, t.name, t.email FROM candidates t",
+    "requirement": "SELECT t.id, t.title AS name, t.client_id FROM requirements t",
+    "client": "SELECT t.id, t.name FROM clients t",
+    "recruiter": "SELECT t.id, t.name, t.email FROM users t WHERE t.role = 'RECRUITER'",
+}
+
+# Kinds indexed per name word as well as by full name
+PERSON_KINDS = {"candidate", "recruiter"}
+
+_END = None  # trie key holding the refs of the entries ending at a node
+
+_lock = threading.Lock()  # guards the tries while they are scanned or changed
+_update_lock = threading.Lock()  # held while reading rows for queued work
+_kinds: Dict[str, "_KindTrie"] = {}
+_pending: List[Tuple[str, str, Any]] = []  # (kind, action, value) from note_write
+_flight = SingleFlight()
+_stats = {"lookups": 0, "rebuilds": 0, "row_updates": 0, "total_lookup_ms": 0.0}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class _KindTrie:
+    """Token trie and entities of one kind; rows can be added and removed in place."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.trie: Dict = {}
+        self.entities: Dict[Any, Dict[str, Any]] = {}
+        self.paths: Dict[Any, List[Tuple[List[str], tuple]]] = {}  # id -> inserted (tokens, ref)
+        self.next_rank = 0  # rows added after the build are the newest: ranks below 0
+        self.max_id = None
+        self.built_at = time.time()
+
+    def _insert(self, tokens: List[str], ref: tuple) -> None:
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(_END, []).append(ref)
+        self.paths[ref[0]].append((tokens, ref))
+
+    def add(self, row: Dict[str, Any], rank: int) -> None:
+        tokens = tokenize(row.get("name"))
+        if not tokens:
+            return
+        entity_id = row["id"]
+        self.entities[entity_id] = {key: value for key, value in row.items() if key != "email"}
+        self.entities[entity_id]["rank"] = rank
+        self.paths[entity_id] = []
+        self._insert(tokens, (entity_id, True))
+        if self.kind == "requirement" and tokenize(str(entity_id)):
+            self._insert(tokenize(str(entity_id)), (entity_id, True))
+        if self.kind in PERSON_KINDS:
+            if tokenize(row.get("email")):
+                self._insert(tokenize(row.get("email")), (entity_id, True))
+            if len(tokens) > 1:
+                for token in set(tokens):
+                    if len(token) > 2 and token not in STOPWORDS:
+                        self._insert([token], (entity_id, False))
+        if isinstance(entity_id, int) and (self.max_id is None or entity_id > self.max_id):
+            self.max_id = entity_id
+
+    def remove(self, entity_id) -> Optional[int]:
+        """Drop an entity; returns its rank (None when it wasn't indexed)."""
+        entity = self.entities.pop(entity_id, None)
+        for tokens, ref in self.paths.pop(entity_id, ()):
+            node = self.trie
+            for token in tokens:
+                node = node.get(token)
+                if node is None:
+                    break
+            else:
+                refs = node.get(_END, [])
+                if ref in refs:
+                    refs.remove(ref)
+        return entity["rank"] if entity else None
+
+    def refresh(self, rows: List[Dict[str, Any]], gone: Iterable[Any]) -> None:
+        """Replace the entities in `gone` by `rows` (their current state); updated rows keep their rank."""
+        ranks = {entity_id: self.remove(entity_id) for entity_id in list(gone)}
+        for row in rows:
+            previous = ranks.get(row["id"])
+            if previous is None:
+                previous = self.remove(row["id"])
+            if previous is None:
+                self.next_rank -= 1
+                previous = self.next_rank
+            self.add(row, previous)
+
+
+def _load_rows(kind: str, condition: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+    query = SOURCES[kind]
+    if condition:
+        query += (" AND " if " WHERE " in query else " WHERE ") + condition
+    else:
+        query += " ORDER BY t.created_at DESC"
+    conn = get_db_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall() or []]
+    finally:
+        cursor.close()
+
+
+def _build(kind: str) -> _KindTrie:
+    started = time.perf_counter()
+    index = _KindTrie(kind)
+    for rank, row in enumerate(_load_rows(kind)):
+        index.add(row, rank)
+    print(f"🗂️ Entity index: {kind} rebuilt ({len(index.entities)} entries, {(time.perf_counter() - started) * 1000:.0f} ms)")
+    return index
+
+
+def _apply(index: _KindTrie, action: str, value) -> None:
+    """Apply one queued action (with _update_lock held): rows are read first, _lock only covers the change."""
+    if action == "new":
+        gone = []
+        rows = _load_rows(index.kind, "t.id > %s", (index.max_id,)) if index.max_id is not None else _load_rows(index.kind)
+    else:
+        column, row_value = value
+        if column == "id":
+            keys = {row_value, str(row_value)} | ({int(row_value)} if str(row_value).isdigit() else set())
+            gone = [key for key in keys if key in index.entities]
+        else:
+            gone = [entity_id for entity_id, entity in index.entities.items() if str(entity.get(column)) == str(row_value)]
+        rows = _load_rows(index.kind, f"t.{column} = %s", (row_value,))
+    with _lock:
+        index.refresh(rows, gone)
+        _stats["row_updates"] += 1
+
+
+def _current(kind: str) -> _KindTrie:
+    with _lock:
+        index = _kinds.get(kind)
+        stale = any(k == kind and action == "stale" for k, action, _value in _pending)
+        has_work = any(k == kind for k, _action, _value in _pending)
+    if index is not None and not stale and time.time() - index.built_at < ENTITY_INDEX_MAX_AGE:
+        if not has_work:
+            return index
+        with _update_lock:
+            with _lock:
+                index = _kinds[kind]  # a rebuild may have replaced it
+                work = [(action, value) for k, action, value in _pending if k == kind]
+                stale = any(action == "stale" for action, _value in work)
+                if not stale:
+                    _pending[:] = [item for item in _pending if item[0] != kind]
+            if not stale:
+                for action, value in work:
+                    _apply(index, action, value)
+                return index
+        return _current(kind)  # marked stale meanwhile: rebuild below
+
+    def rebuild():
+        # Queued row work up to now is covered by the full read (writes are
+        # committed before they are noted); later work is applied on top
+        with _update_lock:
+            with _lock:
+                _pending[:] = [item for item in _pending if item[0] != kind]
+            fresh = _build(kind)
+            with _lock:
+                _kinds[kind] = fresh
+                _stats["rebuilds"] += 1
+        return fresh
+
+    fresh, _shared = _flight.do(kind, rebuild)
+    return fresh
+
+
+def note_write(endpoint: Optional[str], view_args: Optional[Dict[str, Any]], response_json: Optional[Dict[str, Any]]) -> None:
+    """Queue per-row updates for a successful write request (called from app.py's after_request)."""
+    from utils.retrieval_index import write_actions  # it imports this module
+
+    actions = write_actions(endpoint, view_args, response_json)
+    if actions is None:
+        actions = [(kind, "stale", None) for kind in SOURCES]
+    queued = [action for action in actions if action[0] in SOURCES]
+    if queued:
+        with _lock:
+            _pending.extend(queued)
+
+
+def find_entities(text: str, kinds: Iterable[str] = tuple(SOURCES)) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Every entity of `kinds` named in `text`, per kind: exact matches first,
+    then in order of appearance.  Each hit is the indexed row (id, name, ...)
+    plus "exact" and "position" (token offset in the message).
+    """
+    started = time.perf_counter()
+    indexes = {kind: _current(kind) for kind in kinds}
+    tokens = tokenize(text)
+
+    found: Dict[str, Dict[Any, Dict[str, Any]]] = {kind: {} for kind in indexes}
+    with _lock:  # tries are updated in place by _current
+        for start in range(len(tokens)):
+            for kind, index in indexes.items():
+                node = index.trie
+                for token in tokens[start:]:
+                    node = node.get(token)
+                    if node is None:
+                        break
+                    for entity_id, exact in node.get(_END, ()):
+                        previous = found[kind].get(entity_id)
+                        if previous is None or (exact and not previous["exact"]):
+                            found[kind][entity_id] = {**index.entities[entity_id], "exact": exact, "position": start}
+
+        _stats["lookups"] += 1
+        _stats["total_lookup_ms"] += (time.perf_counter() - started) * 1000
+    return {
+        kind: sorted(hits.values(), key=lambda hit: (not hit["exact"], hit["position"], hit["rank"]))
+        for kind, hits in found.items()
+    }
+
+
+def requirements_of_clients(client_ids: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Indexed requirements (id, name, client_id, rank) belonging to any of `client_ids`."""
+    wanted = {str(client_id) for client_id in client_ids}
+    if not wanted:
+        return []
+    index = _current("requirement")
+    with _lock:
+        return [entity for entity in index.entities.values() if str(entity.get("client_id")) in wanted]
+
+
+def entity_index_stats() -> Dict[str, Any]:
+    with _lock:
+        lookups = _stats["lookups"]
+        return {
+            "entries": {kind: len(index.entities) for kind, index in _kinds.items()},
+            "pending_updates": len(_pending),
+            "lookups": lookups,
+            "rebuilds": _stats["rebuilds"],
+            "row_updates": _stats["row_updates"],
+            "avg_lookup_ms": round(_stats["total_lookup_ms"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+def reset_entity_index_stats() -> None:
+    with _lock:
+        _stats["lookups"] = 0
+        _stats["rebuilds"] = 0
+        _stats["row_updates"] = 0
+        _stats["total_lookup_ms"] = 0.0
@@ -2,14 +2,56 @@ import requests
 import json
 import os
 import re
-from utils.prompt_builder import build_prompt
+import threading
+import time
+from utils.context_cache import STALE_HANDLE_STATUSES, cached_prefix, invalidate_cached_prefix
+from utils.llm_transport import post_json
+from utils.llm_scheduler import SchedulerTimeoutError, llm_slot
+from utils.llm_usage import (
+    BudgetExceededError,
+    check_llm_budget,
+    current_usage_user,
+    failure_outcome,
+    record_llm_call,
+    usage_from_response,
+)
+from utils.model_router import model_breaker, record_fallback, record_model_result, route_models, should_fall_back
+from utils.preranker import heuristic_score, parse_experience, skills_set
+from utils.prompt_builder import (
+    PACKED_SCREENING_INSTRUCTIONS,
+    SCREENING_INSTRUCTIONS,
+    build_packed_input,
+    build_screening_input,
+)
 
-# Load API key & model
+# Load API key & default model (per-call model choice: utils/model_router.py)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
 
-# Correct Gemini 2.5 endpoint
-GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{MODEL}:generateContent"
+# Correct Gemini 2.5 endpoint (GEMINI_BASE_URL points at gemini_stub.py for load tests)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+
+# How screening answers parsed (reported by /api/ai/metrics and screening_eval.py)
+_parse_stats = {"parsed": 0, "invalid_json": 0, "invalid_response": 0}
+_parse_lock = threading.Lock()
+
+
+def _count_parse(outcome):
+    with _parse_lock:
+        _parse_stats[outcome] += 1
+
+
+def parse_stats():
+    with _parse_lock:
+        attempts = sum(_parse_stats.values())
+        failures = attempts - _parse_stats["parsed"]
+        return {**_parse_stats, "failure_rate": round(failures / attempts, 4) if attempts else 0.0}
+
+
+def reset_parse_stats():
+    with _parse_lock:
+        for outcome in _parse_stats:
+            _parse_stats[outcome] = 0
 
 
 def extract_json(text: str):
@@ -20,30 +62,108 @@ def extract_json(text: str):
     return json.loads(match.group(0))
 
 
-def _skills_set(value):
-    if not value:
-        return set()
-    if isinstance(value, (list, tuple)):
-        items = value
-    else:
-        items = re.split(r"[,/|]", str(value))
-    return {item.strip().lower() for item in items if item.strip()}
+def extract_json_array(text: str):
+    """Extract a JSON array from Gemini output (removes extra text)."""
+    match = re.search(r"\[[\s\S]*\]", text)
+    if not match:
+        raise ValueError("AI returned no JSON array")
+    parsed = json.loads(match.group(0))
+    if not isinstance(parsed, list):
+        raise ValueError("AI returned no JSON array")
+    return parsed
+
+
+def _generate_url(model):
+    return f"{GEMINI_BASE_URL}/v1beta/models/{model}:generateContent"
+
+
+def _generate(instructions, body, timeout, name):
+    """
+    POST generateContent for instructions + body on the model(s) picked by
+    utils/model_router.py for feature `name`, falling back to the next model
+    when one fails.  The call waits for a utils/llm_scheduler.py slot first.
+    Every attempt is recorded in llm_usage; the returned response's
+    `routed_model` is the model that answered.  Raises BudgetExceededError /
+    SchedulerTimeoutError (both RequestExceptions) when the requesting user's
+    daily token budget is spent or the call could not be admitted in time.
+    """
+    started = time.perf_counter()
+    try:
+        check_llm_budget()
+        with llm_slot(name, current_usage_user()):
+            return _generate_routed(instructions, body, timeout, name)
+    except (BudgetExceededError, SchedulerTimeoutError) as exc:
+        record_llm_call(name, MODEL, (time.perf_counter() - started) * 1000, failure_outcome(exc))
+        raise
+
+
+def _generate_routed(instructions, body, timeout, name):
+    models = route_models(name, len(instructions) + len(body))
+    for index, model in enumerate(models):
+        is_last = index == len(models) - 1
+        started = time.perf_counter()
+        try:
+            response = _post_generate(model, instructions, body, timeout, name)
+        except requests.RequestException as exc:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            record_model_result(name, model, elapsed_ms, ok=False)
+            record_llm_call(name, model, elapsed_ms, failure_outcome(exc))
+            if is_last:
+                raise
+            record_fallback(name, model, models[index + 1], type(exc).__name__)
+            continue
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        data = None
+        if response.status_code == 200:
+            try:
+                data = response.json()
+            except ValueError:
+                pass
+        outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+        record_model_result(name, model, elapsed_ms, ok=response.status_code == 200)
+        record_llm_call(name, model, elapsed_ms, outcome, usage_from_response(data))
+        if is_last or not should_fall_back(response.status_code):
+            response.routed_model = model
+            return response
+        record_fallback(name, model, models[index + 1], f"HTTP {response.status_code}")
+
+
+def _post_generate(model, instructions, body, timeout, name):
+    """
+    The static instructions go through a cached-content handle when context
+    caching is on; a rejected handle is dropped and the full prompt is resent
+    inline.
+    """
+    url = f"{_generate_url(model)}?key={GEMINI_API_KEY}"
+    breaker = model_breaker(model)
+    handle = cached_prefix(GEMINI_BASE_URL, GEMINI_API_KEY, model, instructions)
+    if handle:
+        payload = {"cachedContent": handle, "contents": [{"role": "user", "parts": [{"text": body}]}]}
+        response = post_json(url, payload, timeout=timeout, name=name, breaker=breaker)
+        if response.status_code not in STALE_HANDLE_STATUSES:
+            return response
+        print(f"⚠️ Cached context {handle} rejected ({response.status_code}); resending inline")
+        invalidate_cached_prefix(handle)
+
+    payload = {
+        "contents": [
+            {"parts": [{"text": f"{instructions}\n\n{body}"}]}
+        ]
+    }
+    return post_json(url, payload, timeout=timeout, name=name, breaker=breaker)
 
 
 def _fallback_screening(candidate, req, cause="Missing Gemini API"):
     """Return a deterministic screening payload when Gemini is unavailable."""
-    cand_skills = _skills_set(candidate.get("skills"))
-    req_skills = _skills_set(req.get("skills_required"))
+    cand_skills = skills_set(candidate.get("skills"))
+    req_skills = skills_set(req.get("skills_required"))
     overlap = len(cand_skills & req_skills)
     required = len(req_skills) or 1
-
-    try:
-        experience = float(candidate.get("experience") or 0)
-    except (TypeError, ValueError):
-        experience = 0.0
+    experience = parse_experience(candidate.get("experience"))
 
     overlap_ratio = overlap / required
-    score = min(100, max(20, 40 + overlap_ratio * 40 + experience * 4))
+    score = heuristic_score(overlap, required, experience)
 
     rationale = [
         f"Matched {overlap} out of {required} required skills",
@@ -70,33 +190,24 @@ def _fallback_screening(candidate, req, cause="Missing Gemini API"):
         "rationale": rationale,
         "red_flags": red_flags,
         "recommend": recommend,
+        "fallback": True,  # never cached as an AI result
+        "fallback_cause": cause,
     }
 
 
 def run_gemini_screening(candidate, req):
-    """Call Gemini for candidate screening and return parsed JSON. Falls back to heuristic scoring if Gemini is unavailable."""
+    """
+    Call Gemini for candidate screening and return parsed JSON (with "model":
+    the model that answered). Falls back to heuristic scoring if Gemini is unavailable.
+    """
 
     # If API key is missing we fall back immediately
     if not GEMINI_API_KEY:
         print("⚠️ GEMINI_API_KEY not set. Using fallback screening logic.")
         return _fallback_screening(candidate, req, cause="No API key")
 
-    # Build prompt safely
-    prompt = build_prompt(candidate, req)
-
-    payload = {
-        "contents": [
-            {"parts": [{"text": prompt}]}
-        ]
-    }
-
     try:
-        response = requests.post(
-            f"{GEMINI_URL}?key={GEMINI_API_KEY}",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=20,
-        )
+        response = _generate(SCREENING_INSTRUCTIONS, build_screening_input(candidate, req), timeout=20, name="screening")
     except requests.RequestException as exc:
         print("⚠️ Gemini request failed:", exc)
         return _fallback_screening(candidate, req, cause=str(exc))
@@ -113,12 +224,65 @@ def run_gemini_screening(candidate, req):
         text_output = data["candidates"][0]["content"]["parts"][0]["text"]
     except Exception as e:
         print("⚠️ Gemini output parsing failed:", e)
+        _count_parse("invalid_response")
         return _fallback_screening(candidate, req, cause="Invalid response")
 
     # Extract JSON inside the output
     try:
         parsed = extract_json(text_output)
+        _count_parse("parsed")
+        parsed["model"] = response.routed_model
         return parsed
     except Exception as e:
         print("⚠️ Gemini returned invalid JSON:", e)
+        _count_parse("invalid_json")
         return _fallback_screening(candidate, req, cause="Invalid JSON")
+
+
+def run_gemini_packed_screening(candidates, req):
+    """
+    Screen several candidates for one requirement with a single Gemini call.
+    Returns {candidate_id: raw_output} (each with "model": the model that
+    answered); candidates missing from the model's answer are simply absent.  Raises ValueError when the answer is not a
+    usable JSON array so the caller can split the batch and retry.
+    Transport failures fall back to heuristic scoring for every candidate.
+    """
+    if not GEMINI_API_KEY:
+        print("⚠️ GEMINI_API_KEY not set. Using fallback screening logic.")
+        return {c["id"]: _fallback_screening(c, req, cause="No API key") for c in candidates}
+
+    try:
+        response = _generate(
+            PACKED_SCREENING_INSTRUCTIONS,
+            build_packed_input(candidates, req),
+            timeout=20 + 5 * len(candidates),
+            name="screening_packed",
+        )
+    except requests.RequestException as exc:
+        print("⚠️ Gemini request failed:", exc)
+        return {c["id"]: _fallback_screening(c, req, cause=str(exc)) for c in candidates}
+
+    if response.status_code != 200:
+        print("⚠️ Gemini API error:", response.status_code, response.text[:250])
+        return {c["id"]: _fallback_screening(c, req, cause=f"HTTP {response.status_code}") for c in candidates}
+
+    try:
+        text_output = response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    except Exception as e:
+        _count_parse("invalid_response")
+        raise ValueError(f"Invalid packed response: {e}")
+
+    try:
+        items = extract_json_array(text_output)
+    except ValueError:
+        _count_parse("invalid_json")
+        raise
+    _count_parse("parsed")
+
+    results = {}
+    by_id = {str(c["id"]): c["id"] for c in candidates}
+    for item in items:
+        if isinstance(item, dict) and str(item.get("candidate_id")) in by_id:
+            item["model"] = response.routed_model
+            results[by_id[str(item["candidate_id"])]] = item
+    return results
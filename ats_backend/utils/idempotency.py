@@ -0,0 +1,109 @@
+"""
+`Idempotency-Key` support for POST endpoints.
+
+The first response for a (scope, user, key) is kept for IDEMPOTENCY_TTL seconds and
+replayed to retries with an `Idempotent-Replayed: true` header.  Concurrent
+requests with the same key are coalesced onto one execution.  Keys are
+per user, so another user sending the same key never gets this user's response.  Reusing a key
+with a different request body is rejected with 422.  Responses with a 5xx
+status are not stored, so a retry can succeed later.
+
+The store is in-process (one entry per key, expired lazily), which matches the
+single-process waitress deployment in server.py.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, jsonify, request
+
+from utils.auth import get_current_user
+from utils.singleflight import SingleFlight
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "600"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+_store = {}
+_store_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def _body_fingerprint() -> str:
+    return hashlib.sha256(request.get_data() or b"").hexdigest()
+
+
+def _get(store_key):
+    now = time.time()
+    with _store_lock:
+        entry = _store.get(store_key)
+        if entry and entry["expires_at"] <= now:
+            del _store[store_key]
+            entry = None
+        return entry
+
+
+def _put(store_key, entry):
+    with _store_lock:
+        if len(_store) >= IDEMPOTENCY_MAX_KEYS:
+            now = time.time()
+            for key in [k for k, v in _store.items() if v["expires_at"] <= now]:
+                del _store[key]
+            while len(_store) >= IDEMPOTENCY_MAX_KEYS:
+                del _store[next(iter(_store))]  # oldest first (insertion order)
+        _store[store_key] = entry
+
+
+def _replay(entry, replayed=True) -> Response:
+    response = Response(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(scope: str):
+    """Decorator for Flask views that honours the Idempotency-Key request header."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.headers.get("Idempotency-Key") or "").strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > 255:
+                return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+
+            user = get_current_user() or {}
+            store_key = (scope, user.get("id"), key)
+            fingerprint = _body_fingerprint()
+            entry = _get(store_key)
+            if entry:
+                if entry["fingerprint"] != fingerprint:
+                    return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+                return _replay(entry)
+
+            def execute():
+                response = view(*args, **kwargs)
+                status = None
+                if isinstance(response, tuple):
+                    response, status = response[0], response[1]
+                if not isinstance(response, Response):
+                    response = jsonify(response)
+                entry = {
+                    "fingerprint": fingerprint,
+                    "status": status or response.status_code,
+                    "body": response.get_data(),
+                    "mimetype": response.mimetype,
+                    "expires_at": time.time() + IDEMPOTENCY_TTL,
+                }
+                if entry["status"] < 500:
+                    _put(store_key, entry)
+                return entry
+
+            entry, shared = _flight.do(store_key, execute)
+            if shared and entry["fingerprint"] != fingerprint:
+                return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+            return _replay(entry, replayed=shared)
+        return wrapper
+    return decorator
@@ -1,69 +1,186 @@
 import os
 import json
-from typing import Any, Dict
+import time
+from typing import Any, Dict, Iterator, Optional
 
 # Google Gemini API client wrapper. Requires GEMINI_API_KEY environment variable.
 # Falls back to a safe mock response if API key is not configured.
 # Get your API key from: https://aistudio.google.com/app/apikey
 
 
-def call_llm(system: str, context: Dict[str, Any], user_message: str) -> str:
+def _gemini_base_url() -> str:
+	# GEMINI_BASE_URL can point at the local stub (gemini_stub.py) for load tests
+	return os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+
+
+def _model_url(model: str, method: str, cached_content: Optional[str] = None) -> str:
+	# cachedContent is only accepted by the v1beta API
+	version = "v1beta" if cached_content else "v1"
+	return f"{_gemini_base_url()}/{version}/models/{model}:{method}"
+
+
+def _build_payload(system: str, context: Dict[str, Any], user_message: str, cached_content: Optional[str] = None) -> Dict[str, Any]:
+	# Build the full prompt with system instructions, user message, and context
+	# (compact JSON: indentation only costs prompt tokens)
+	request_part = f"User Question: {user_message}\n\nContext Data (JSON):\n{json.dumps(context, default=str, separators=(',', ':'))}"
+
+	# With a cached-content handle the static system prompt is already on the provider side
+	if cached_content:
+		return {
+			"cachedContent": cached_content,
+			"contents": [{"role": "user", "parts": [{"text": request_part}]}],
+			"generationConfig": {
+				"temperature": 0.2,
+				"maxOutputTokens": 2000,
+			}
+		}
+
+	full_prompt = f"{system}\n\n{request_part}"
+
+	# Gemini API payload format
+	return {
+		"contents": [
+			{
+				"parts": [
+					{
+						"text": full_prompt
+					}
+				]
+			}
+		],
+		"generationConfig": {
+			"temperature": 0.2,
+			"maxOutputTokens": 2000,
+		}
+	}
+
+
+def _post_generate(model: str, system: str, context: Dict[str, Any], user_message: str, api_key: str):
+	from utils.context_cache import STALE_HANDLE_STATUSES, cached_prefix, invalidate_cached_prefix
+	from utils.llm_transport import post_json
+	from utils.model_router import model_breaker
+
+	# Gemini API requires Content-Type header and API key as query parameter
+	headers = {
+		"Content-Type": "application/json",
+	}
+	params = {"key": api_key}
+
+	# Static system prompt via a Gemini cached-content handle when enabled
+	cached_content = cached_prefix(_gemini_base_url(), api_key, model, system)
+	payload = _build_payload(system, context, user_message, cached_content)
+	resp = post_json(_model_url(model, "generateContent", cached_content), payload, headers=headers, params=params, timeout=30, name="chat", breaker=model_breaker(model))
+	if cached_content and resp.status_code in STALE_HANDLE_STATUSES:
+		print(f"⚠️ Cached context {cached_content} rejected ({resp.status_code}); resending inline")
+		invalidate_cached_prefix(cached_content)
+		resp = post_json(_model_url(model, "generateContent"), _build_payload(system, context, user_message), headers=headers, params=params, timeout=30, name="chat", breaker=model_breaker(model))
+	return resp
+
+
+def _open_stream(model: str, system: str, context: Dict[str, Any], user_message: str, api_key: str):
+	from utils.context_cache import STALE_HANDLE_STATUSES, cached_prefix, invalidate_cached_prefix
+	from utils.llm_transport import stream_post
+	from utils.model_router import model_breaker
+
+	params = {"key": api_key, "alt": "sse"}
+	cached_content = cached_prefix(_gemini_base_url(), api_key, model, system)
+	resp = stream_post(_model_url(model, "streamGenerateContent", cached_content), _build_payload(system, context, user_message, cached_content), params=params, name="chat_stream", breaker=model_breaker(model))
+	if cached_content and resp.status_code in STALE_HANDLE_STATUSES:
+		print(f"⚠️ Cached context {cached_content} rejected ({resp.status_code}); resending inline")
+		resp.close()
+		invalidate_cached_prefix(cached_content)
+		resp = stream_post(_model_url(model, "streamGenerateContent"), _build_payload(system, context, user_message), params=params, name="chat_stream", breaker=model_breaker(model))
+	return resp
+
+
+def _prompt_chars(system: str, context: Dict[str, Any], user_message: str) -> int:
+	return len(system) + len(user_message) + len(json.dumps(context, default=str, separators=(',', ':')))
+
+
+def _mock_reply(context: Dict[str, Any]) -> str:
+	# Safe deterministic mock: do not hallucinate; summarize only from context
+	preview = json.dumps(context, default=str)
+	preview = (preview[:800] + "...") if len(preview) > 800 else preview
+	return (
+		"[Mocked AI Reply] Based only on provided ATS context and your question, "
+		"here is a concise summary. If the requested data is missing, it may not "
+		"exist or you are not authorized. Context preview: " + preview
+	)
+
+
+BUDGET_EXCEEDED_REPLY = "You have reached today's AI usage limit. Please try again tomorrow or ask an admin to raise your budget."
+SCHEDULER_BUSY_REPLY = "The AI service is busy right now. Please try again in a moment."
+
+# Leading text of the replies call_llm returns instead of an answer
+FAILURE_REPLY_PREFIXES = ("AI service", "The AI did not return", BUDGET_EXCEEDED_REPLY, SCHEDULER_BUSY_REPLY)
+
+
+def is_failure_reply(text: str) -> bool:
+	return not text or str(text).startswith(FAILURE_REPLY_PREFIXES)
+
+
+def call_llm(system: str, context: Dict[str, Any], user_message: str, feature: str = "chat", user_id=None) -> str:
+	# feature / user_id label the call in llm_usage (user_id defaults to the ambient usage_context)
 
 	# Get Gemini API key (required)
 	api_key = os.getenv("GEMINI_API_KEY")
 	
 	# Gemini API configuration
 	# Available Gemini models: gemini-2.5-flash (fast, free), gemini-1.5-pro (more capable), gemini-pro
+	# LLM_MODEL is the default; utils/model_router.py picks the model(s) per call
 	model = os.getenv("LLM_MODEL", "gemini-2.5-flash")
 	
 	# Gemini API endpoint format: https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}
-	api_url = f"https://generativelanguage.googleapis.com/v1/models/{model}:generateContent"
 
 
 	if not api_key:
-		# Safe deterministic mock: do not hallucinate; summarize only from context
-		preview = json.dumps(context, default=str)
-		preview = (preview[:800] + "...") if len(preview) > 800 else preview
 		print("⚠️ LLM: No GEMINI_API_KEY configured, using mock response")
-		return (
-			"[Mocked AI Reply] Based only on provided ATS context and your question, "
-			"here is a concise summary. If the requested data is missing, it may not "
-			"exist or you are not authorized. Context preview: " + preview
-		)
+		return _mock_reply(context)
+
+	import requests  # type: ignore
+	from utils.circuit_breaker import CircuitOpenError
+	from utils.llm_scheduler import SchedulerTimeoutError, llm_slot
+	from utils.llm_usage import BudgetExceededError, check_llm_budget, current_usage_user, failure_outcome, record_llm_call, usage_from_response
+	from utils.model_router import record_fallback, record_model_result, route_models, should_fall_back
 
 	# Gemini API call
+	started = time.perf_counter()
 	try:
-		import requests  # type: ignore
-		
-		# Build the full prompt with system instructions, user message, and context
-		full_prompt = f"{system}\n\nUser Question: {user_message}\n\nContext Data (JSON):\n{json.dumps(context, default=str, indent=2)}"
+		check_llm_budget(user_id)
 		
-		# Gemini API payload format
-		payload = {
-			"contents": [
-				{
-					"parts": [
-						{
-							"text": full_prompt
-						}
-					]
-				}
-			],
-			"generationConfig": {
-				"temperature": 0.2,
-				"maxOutputTokens": 2000,
-			}
-		}
-		
-		# Gemini API requires Content-Type header and API key as query parameter
-		headers = {
-			"Content-Type": "application/json",
-		}
-		params = {"key": api_key}
-		
-		print(f"🤖 LLM: Calling Gemini API with model {model}")
 		print(f"🔑 API Key: {api_key[:10]}...{api_key[-5:] if len(api_key) > 15 else '***'}")
-		resp = requests.post(api_url, json=payload, headers=headers, params=params, timeout=30)
+		# Wait for a scheduler slot (global concurrency / RPM caps, priority, per-user fairness)
+		with llm_slot(feature, user_id if user_id is not None else current_usage_user()):
+			models = route_models(feature, _prompt_chars(system, context, user_message))
+			for index, model in enumerate(models):
+				is_last = index == len(models) - 1
+				started = time.perf_counter()
+				print(f"🤖 LLM: Calling Gemini API with model {model}")
+				try:
+					resp = _post_generate(model, system, context, user_message, api_key)
+				except requests.exceptions.RequestException as e:
+					elapsed_ms = (time.perf_counter() - started) * 1000
+					record_model_result(feature, model, elapsed_ms, ok=False)
+					record_llm_call(feature, model, elapsed_ms, failure_outcome(e), user_id=user_id)
+					if is_last:
+						raise
+					record_fallback(feature, model, models[index + 1], type(e).__name__)
+					continue
+			
+				# Token / latency accounting (usageMetadata is only present on success)
+				elapsed_ms = (time.perf_counter() - started) * 1000
+				usage_data = None
+				if resp.status_code == 200:
+					try:
+						usage_data = resp.json()
+					except ValueError:
+						pass
+				outcome = "ok" if resp.status_code == 200 else f"http_{resp.status_code}"
+				record_model_result(feature, model, elapsed_ms, ok=resp.status_code == 200)
+				record_llm_call(feature, model, elapsed_ms, outcome, usage_from_response(usage_data), user_id=user_id)
+				if is_last or not should_fall_back(resp.status_code):
+					break
+				record_fallback(feature, model, models[index + 1], f"HTTP {resp.status_code}")
 		
 		# Error handling
 		if resp.status_code != 200:
@@ -119,6 +236,18 @@ def call_llm(system: str, context: Dict[str, Any], user_message: str) -> str:
 		
 		return "The AI did not return a response. Please try again."
 		
+	except BudgetExceededError as e:
+		print(f"💸 Gemini API skipped: {e}")
+		record_llm_call(feature, model, (time.perf_counter() - started) * 1000, failure_outcome(e), user_id=user_id)
+		return BUDGET_EXCEEDED_REPLY
+	except SchedulerTimeoutError as e:
+		print(f"⏳ Gemini API skipped: {e}")
+		record_llm_call(feature, model, (time.perf_counter() - started) * 1000, failure_outcome(e), user_id=user_id)
+		return SCHEDULER_BUSY_REPLY
+	except CircuitOpenError as e:
+		# Already recorded per model attempt
+		print(f"🚫 Gemini API skipped: {e}")
+		return "AI service is temporarily unavailable (too many recent failures). Please try again in a minute."
 	except requests.exceptions.RequestException as e:
 		error_msg = str(e)
 		print(f"❌ Gemini API Request Error: {error_msg}")
@@ -129,3 +258,116 @@ def call_llm(system: str, context: Dict[str, Any], user_message: str) -> str:
 		return f"AI service error: {error_msg}. Please contact support if this persists."
 
 
+def stream_llm(system: str, context: Dict[str, Any], user_message: str, feature: str = "chat", user_id=None) -> Iterator[str]:
+	"""
+	Streaming variant of call_llm: yields text chunks as Gemini produces them
+	(streamGenerateContent with alt=sse).  Failures are yielded as a single
+	error message, like call_llm returns them.  The llm_usage record is
+	written when the stream ends (outcome "cancelled" if the client left).
+	"""
+	api_key = os.getenv("GEMINI_API_KEY")
+	model = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+
+	if not api_key:
+		print("⚠️ LLM: No GEMINI_API_KEY configured, using mock response")
+		reply = _mock_reply(context)
+		for start in range(0, len(reply), 80):
+			yield reply[start:start + 80]
+		return
+
+	import requests  # type: ignore
+	from utils.circuit_breaker import CircuitOpenError
+	from utils.llm_scheduler import SchedulerTimeoutError, scheduler
+	from utils.llm_usage import BudgetExceededError, check_llm_budget, current_usage_user, failure_outcome, record_llm_call, usage_from_response
+	from utils.model_router import record_fallback, record_model_result, route_models, should_fall_back
+
+	started = time.perf_counter()
+	holds_slot = False
+	try:
+		check_llm_budget(user_id)
+		# The scheduler slot is held until the stream ends
+		scheduler.acquire(feature, user_id if user_id is not None else current_usage_user())
+		holds_slot = True
+		# Models can only be switched before anything has been relayed
+		models = route_models(feature, _prompt_chars(system, context, user_message))
+		for index, model in enumerate(models):
+			is_last = index == len(models) - 1
+			started = time.perf_counter()
+			try:
+				resp = _open_stream(model, system, context, user_message, api_key)
+			except requests.exceptions.RequestException as e:
+				record_model_result(feature, model, (time.perf_counter() - started) * 1000, ok=False)
+				if is_last:
+					raise
+				record_llm_call(feature, model, (time.perf_counter() - started) * 1000, failure_outcome(e), user_id=user_id)
+				record_fallback(feature, model, models[index + 1], type(e).__name__)
+				continue
+			# Time to first byte is the latency that matters for a stream
+			record_model_result(feature, model, (time.perf_counter() - started) * 1000, ok=resp.status_code == 200)
+			if is_last or not should_fall_back(resp.status_code):
+				break
+			record_llm_call(feature, model, (time.perf_counter() - started) * 1000, f"http_{resp.status_code}", user_id=user_id)
+			record_fallback(feature, model, models[index + 1], f"HTTP {resp.status_code}")
+			resp.close()
+	except requests.exceptions.RequestException as e:
+		if holds_slot:
+			scheduler.release()
+		record_llm_call(feature, model, (time.perf_counter() - started) * 1000, failure_outcome(e), user_id=user_id)
+		if isinstance(e, BudgetExceededError):
+			print(f"💸 Gemini API skipped: {e}")
+			yield BUDGET_EXCEEDED_REPLY
+		elif isinstance(e, SchedulerTimeoutError):
+			print(f"⏳ Gemini API skipped: {e}")
+			yield SCHEDULER_BUSY_REPLY
+		elif isinstance(e, CircuitOpenError):
+			print(f"🚫 Gemini API skipped: {e}")
+			yield "AI service is temporarily unavailable (too many recent failures). Please try again in a minute."
+		else:
+			print(f"❌ Gemini API Request Error: {e}")
+			yield f"AI service connection error: {e}. Please check your internet connection and Gemini API endpoint."
+		return
+	except BaseException:
+		# Anything else (a routing or bookkeeping bug, the generator being closed) must not leak the slot
+		if holds_slot:
+			scheduler.release()
+		raise
+
+	outcome, usage_event = "cancelled", None
+	try:
+		if resp.status_code != 200:
+			outcome = f"http_{resp.status_code}"
+			print(f"❌ Gemini API Error ({resp.status_code}): {resp.text[:250]}")
+			try:
+				error_msg = resp.json().get("error", {}).get("message", resp.text[:200])
+			except ValueError:
+				error_msg = resp.text[:200]
+			yield f"AI service error: {error_msg} (HTTP {resp.status_code})."
+			return
+
+		resp.encoding = "utf-8"  # text/event-stream has no charset; requests would assume latin-1
+		produced = False
+		for line in resp.iter_lines(decode_unicode=True):
+			if not line or not line.startswith("data:"):
+				continue
+			try:
+				event = json.loads(line[5:].strip())
+			except ValueError:
+				continue
+			if event.get("usageMetadata"):
+				usage_event = event
+			for candidate in event.get("candidates", [])[:1]:
+				for part in candidate.get("content", {}).get("parts", []):
+					if part.get("text"):
+						produced = True
+						yield part["text"]
+		outcome = "ok"
+		if not produced:
+			yield "The AI did not return a response. Please try again."
+	except requests.exceptions.RequestException as e:
+		outcome = failure_outcome(e)
+		print(f"❌ Gemini stream interrupted: {e}")
+		yield f"\n\n[AI stream interrupted: {e}]"
+	finally:
+		resp.close()
+		scheduler.release()
+		record_llm_call(feature, model, (time.perf_counter() - started) * 1000, outcome, usage_from_response(usage_event), user_id=user_id)
@@ -0,0 +1,234 @@
+"""
+Central admission control for Gemini calls.
+
+Every generateContent / streamGenerateContent call made by utils/gemini.py
+and utils/llm_client.py runs inside `llm_slot(feature, user_id)`, which
+blocks until the scheduler grants it:
+
+- at most LLM_MAX_CONCURRENCY calls in flight, of which LLM_INTERACTIVE_RESERVE
+  slots are kept for interactive work;
+- at most LLM_MAX_RPM calls started per minute (token bucket, bursts of
+  LLM_RPM_BURST; 0 = no limit);
+- priority classes: interactive (chat, avatar chat, JD extraction) ahead of
+  screening (single /api/screen-candidate) ahead of batch (packed batch
+  screening, background re-screens);
+- within a class, waiting users are served round-robin, so one user's burst
+  doesn't starve everybody else.
+
+A call that waits longer than LLM_SCHEDULER_MAX_WAIT seconds gets
+SchedulerTimeoutError (a requests.RequestException, so the existing fallbacks
+apply).  Queue depth and wait times are reported under "scheduler" in
+/api/ai/metrics.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import requests
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INTERACTIVE_RESERVE = int(os.getenv("LLM_INTERACTIVE_RESERVE", "2"))
+LLM_MAX_RPM = float(os.getenv("LLM_MAX_RPM", "0"))
+LLM_RPM_BURST = int(os.getenv("LLM_RPM_BURST", "10"))
+LLM_SCHEDULER_MAX_WAIT = float(os.getenv("LLM_SCHEDULER_MAX_WAIT", "120"))
+
+INTERACTIVE, SCREENING, BATCH = "interactive", "screening", "batch"
+PRIORITY_ORDER = (INTERACTIVE, SCREENING, BATCH)
+
+FEATURE_PRIORITY = {
+    "chat": INTERACTIVE,
+    "avatar": INTERACTIVE,
+    "jd": INTERACTIVE,
+    "screening": SCREENING,
+    "screening_packed": BATCH,
+}
+
+# Recent waits kept per class for the p95
+WAIT_SAMPLES = 500
+
+_priority_override = contextvars.ContextVar("llm_priority", default=None)
+
+
+class SchedulerTimeoutError(requests.RequestException):
+    """Raised when a call could not be admitted within LLM_SCHEDULER_MAX_WAIT."""
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run LLM calls made inside the block in `priority` (e.g. BATCH for background work)."""
+    token = _priority_override.set(priority)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def priority_for(feature: str) -> str:
+    return _priority_override.get() or FEATURE_PRIORITY.get(feature, SCREENING)
+
+
+class _Waiter:
+    __slots__ = ("priority", "user", "feature", "enqueued_at")
+
+    def __init__(self, priority, user, feature):
+        self.priority = priority
+        self.user = user
+        self.feature = feature
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, interactive_reserve=LLM_INTERACTIVE_RESERVE,
+                 rpm=LLM_MAX_RPM, rpm_burst=LLM_RPM_BURST, max_wait=LLM_SCHEDULER_MAX_WAIT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.interactive_reserve = max(0, min(interactive_reserve, self.max_concurrency - 1))
+        self.rate = max(0.0, rpm) / 60.0
+        self.capacity = max(1, rpm_burst)
+        self.tokens = float(self.capacity)
+        self.refilled_at = time.monotonic()
+        self.max_wait = max_wait
+        self.active = 0
+        self._cond = threading.Condition()
+        # priority -> OrderedDict(user -> deque of waiters); users rotate to the back once served
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_ORDER}
+        self._stats = {priority: self._new_stats() for priority in PRIORITY_ORDER}
+
+    @staticmethod
+    def _new_stats():
+        return {"granted": 0, "timeouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0,
+                "waits": deque(maxlen=WAIT_SAMPLES)}
+
+    # ---------- internals (called with _cond held) ----------
+
+    def _head(self) -> Optional[_Waiter]:
+        for priority in PRIORITY_ORDER:
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        users = self._queues[waiter.priority]
+        pending = users.get(waiter.user)
+        if not pending:
+            return
+        try:
+            pending.remove(waiter)
+        except ValueError:
+            return
+        if pending:
+            users.move_to_end(waiter.user)
+        else:
+            del users[waiter.user]
+
+    def _slot_free(self, priority: str) -> bool:
+        limit = self.max_concurrency if priority == INTERACTIVE else self.max_concurrency - self.interactive_reserve
+        return self.active < limit
+
+    def _seconds_until_token(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    # ---------- public ----------
+
+    def acquire(self, feature: str, user_id=None, priority: Optional[str] = None) -> float:
+        """Block until admitted; returns the wait in milliseconds."""
+        waiter = _Waiter(priority or priority_for(feature), user_id, feature)
+        deadline = waiter.enqueued_at + self.max_wait
+        with self._cond:
+            self._queues[waiter.priority].setdefault(waiter.user, deque()).append(waiter)
+            while True:
+                timeout = deadline - time.monotonic()
+                if self._head() is waiter and self._slot_free(waiter.priority):
+                    until_token = self._seconds_until_token()
+                    if until_token <= 0:
+                        if self.rate > 0:
+                            self.tokens -= 1
+                        self._remove(waiter)
+                        self.active += 1
+                        waited_ms = (time.monotonic() - waiter.enqueued_at) * 1000
+                        stats = self._stats[waiter.priority]
+                        stats["granted"] += 1
+                        stats["total_wait_ms"] += waited_ms
+                        stats["max_wait_ms"] = max(stats["max_wait_ms"], waited_ms)
+                        stats["waits"].append(waited_ms)
+                        # The next head may be admissible too
+                        self._cond.notify_all()
+                        return waited_ms
+                    timeout = min(timeout, until_token)
+                if deadline - time.monotonic() <= 0:
+                    self._remove(waiter)
+                    self._stats[waiter.priority]["timeouts"] += 1
+                    self._cond.notify_all()
+                    raise SchedulerTimeoutError(
+                        f"LLM {waiter.feature} call not admitted within {self.max_wait:g}s "
+                        f"({self.active} in flight, {self._depth()} queued)"
+                    )
+                self._cond.wait(timeout)
+
+    def release(self) -> None:
+        with self._cond:
+            self.active = max(0, self.active - 1)
+            self._cond.notify_all()
+
+    def _depth(self, priority: Optional[str] = None) -> int:
+        priorities = [priority] if priority else PRIORITY_ORDER
+        return sum(len(pending) for p in priorities for pending in self._queues[p].values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for priority in PRIORITY_ORDER:
+                stats = self._stats[priority]
+                waits = sorted(stats["waits"])
+                classes[priority] = {
+                    "queued": self._depth(priority),
+                    "queued_users": len(self._queues[priority]),
+                    "granted": stats["granted"],
+                    "timeouts": stats["timeouts"],
+                    "avg_wait_ms": round(stats["total_wait_ms"] / stats["granted"], 1) if stats["granted"] else 0,
+                    "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else 0,
+                    "max_wait_ms": round(stats["max_wait_ms"], 1),
+                }
+            return {
+                "active": self.active,
+                "max_concurrency": self.max_concurrency,
+                "interactive_reserve": self.interactive_reserve,
+                "rpm_limit": self.rate * 60 or None,
+                "queued": self._depth(),
+                "classes": classes,
+            }
+
+    def reset_stats(self) -> None:
+        with self._cond:
+            self._stats = {priority: self._new_stats() for priority in PRIORITY_ORDER}
+
+
+scheduler = LLMScheduler()
+
+
+@contextmanager
+def llm_slot(feature: str, user_id=None, priority: Optional[str] = None):
+    """Hold one scheduler slot for the duration of an LLM call."""
+    scheduler.acquire(feature, user_id, priority)
+    try:
+        yield
+    finally:
+        scheduler.release()
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    return scheduler.stats()
+
+
+def reset_scheduler_stats() -> None:
+    scheduler.reset_stats()
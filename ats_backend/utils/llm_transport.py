@@ -0,0 +1,340 @@
+"""
+Shared HTTP transport for Gemini calls.
+
+One keep-alive `requests.Session` (connection pool sized by LLM_POOL_SIZE) is
+used by utils/gemini.py and utils/llm_client.py, so repeated calls reuse
+TCP/TLS connections.  Transient failures (429/5xx, connection errors,
+timeouts) are retried with exponential backoff + full jitter, honouring
+`Retry-After`; every call is bounded by a deadline across all attempts.
+Per-call latencies feed the histograms served by GET /api/ai/metrics.
+
+Each provider has a circuit breaker (utils/circuit_breaker.py) so a degraded
+Gemini is short-circuited instead of timed out, and with LLM_HEDGE_ENABLED a
+duplicate request is fired when an attempt outlives the observed p95.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.circuit_breaker import CircuitOpenError, breaker_states, get_breaker
+
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Total time budget per call, retries and backoff included (seconds)
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") in ("1", "true", "True")
+# Never hedge earlier than this, and only once enough samples exist for a p95
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "1000"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_session = None
+_session_lock = threading.Lock()
+_hedge_pool = None
+_metrics: Dict[str, Dict[str, Any]] = {}
+_recent: Dict[str, deque] = {}  # last single-attempt latencies (ms) per call site
+_metrics_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE, max_retries=0, pool_block=False)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _session_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm-hedge")
+    return _hedge_pool
+
+
+# -------------------------------------
+# Metrics
+# -------------------------------------
+def _new_series():
+    return {
+        "calls": 0,
+        "attempts": 0,
+        "retries": 0,
+        "errors": 0,
+        "short_circuited": 0,
+        "hedged": 0,
+        "hedge_wins": 0,
+        "status": {},
+        "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+    }
+
+
+def record_latency(name: str, elapsed_ms: float, status=None, attempts: int = 1, error: bool = False) -> None:
+    with _metrics_lock:
+        series = _metrics.setdefault(name, _new_series())
+        series["calls"] += 1
+        series["attempts"] += attempts
+        series["retries"] += max(attempts - 1, 0)
+        series["errors"] += 1 if error else 0
+        key = str(status) if status is not None else "exception"
+        series["status"][key] = series["status"].get(key, 0) + 1
+        slot = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound), len(LATENCY_BUCKETS_MS))
+        series["buckets"][slot] += 1
+        series["total_ms"] += elapsed_ms
+        series["max_ms"] = max(series["max_ms"], elapsed_ms)
+
+
+def _bump(name: str, counter: str) -> None:
+    with _metrics_lock:
+        _metrics.setdefault(name, _new_series())[counter] += 1
+
+
+def _observe_attempt(name: str, elapsed_ms: float) -> None:
+    with _metrics_lock:
+        _recent.setdefault(name, deque(maxlen=200)).append(elapsed_ms)
+
+
+def _percentile(buckets, total, fraction):
+    """Upper bucket bound containing the given fraction of samples (None = over the top bucket)."""
+    if not total:
+        return 0
+    target = total * fraction
+    running = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        running += count
+        if running >= target:
+            return bound
+    return None
+
+
+def transport_metrics() -> Dict[str, Any]:
+    with _metrics_lock:
+        snapshot = {}
+        for name, series in _metrics.items():
+            calls = series["calls"]
+            labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["gt_30000ms"]
+            snapshot[name] = {
+                "calls": calls,
+                "attempts": series["attempts"],
+                "retries": series["retries"],
+                "errors": series["errors"],
+                "short_circuited": series["short_circuited"],
+                "hedged": series["hedged"],
+                "hedge_wins": series["hedge_wins"],
+                "status": dict(series["status"]),
+                "avg_ms": round(series["total_ms"] / calls, 1) if calls else 0,
+                "max_ms": round(series["max_ms"], 1),
+                "p50_ms": _percentile(series["buckets"], calls, 0.50),
+                "p95_ms": _percentile(series["buckets"], calls, 0.95),
+                "p99_ms": _percentile(series["buckets"], calls, 0.99),
+                "histogram": dict(zip(labels, series["buckets"])),
+            }
+    return {
+        "pool_size": LLM_POOL_SIZE,
+        "hedging": LLM_HEDGE_ENABLED,
+        "endpoints": snapshot,
+        "breakers": breaker_states(),
+    }
+
+
+def reset_transport_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+        _recent.clear()
+
+
+# -------------------------------------
+# Retry / hedging helpers
+# -------------------------------------
+def _retry_after_seconds(response) -> Optional[float]:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int) -> float:
+    # Full jitter: uniform(0, min(cap, base * 2^attempt))
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _hedge_delay(name: str) -> Optional[float]:
+    """Seconds to wait before hedging (observed p95), or None when hedging is off / unknown."""
+    if not LLM_HEDGE_ENABLED:
+        return None
+    with _metrics_lock:
+        samples = sorted(_recent.get(name, ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return max(p95, LLM_HEDGE_MIN_MS) / 1000.0
+
+
+def _send(name: str, send):
+    """Run one attempt, firing a hedged duplicate if it outlives the observed p95."""
+    delay = _hedge_delay(name)
+    if delay is None:
+        return send()
+
+    pool = _get_hedge_pool()
+    primary = pool.submit(send)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _bump(name, "hedged")
+    backup = pool.submit(send)
+    pending = {primary, backup}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            # First success wins; an error only counts once both have finished
+            if future.exception() is None or not pending:
+                if future is backup:
+                    _bump(name, "hedge_wins")
+                return future.result()
+
+
+def post_json(url: str, payload: Dict[str, Any], *, params=None, headers=None, timeout: float = 20,
+              deadline: Optional[float] = None, retries: int = LLM_MAX_RETRIES, name: str = "gemini",
+              breaker: Optional[str] = "gemini") -> requests.Response:
+    """
+    POST JSON through the pooled session.
+
+    Retries 429/5xx and connection errors/timeouts up to `retries` times while
+    the `deadline` (seconds, default LLM_DEADLINE) allows.  Returns the last
+    response (callers keep their own status-code handling) or re-raises the
+    last requests.RequestException.  While the `breaker` circuit is open it
+    raises CircuitOpenError (a RequestException) without any I/O.
+    """
+    circuit = get_breaker(breaker) if breaker else None
+    if circuit:
+        try:
+            circuit.before_call()
+        except CircuitOpenError:
+            _bump(name, "short_circuited")
+            raise
+
+    session = get_session()
+    headers = headers or {"Content-Type": "application/json"}
+    budget_ends = time.monotonic() + (deadline if deadline is not None else LLM_DEADLINE)
+    started = time.perf_counter()
+    attempt = 0
+
+    while True:
+        attempt_timeout = max(0.5, min(timeout, budget_ends - time.monotonic()))
+        attempt_started = time.perf_counter()
+        response, error = None, None
+        try:
+            response = _send(name, lambda: session.post(url, json=payload, params=params, headers=headers, timeout=attempt_timeout))
+            _observe_attempt(name, (time.perf_counter() - attempt_started) * 1000)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error = exc
+        except requests.RequestException:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            record_latency(name, elapsed_ms, None, attempt + 1, error=True)
+            if circuit:
+                circuit.record(False, elapsed_ms)
+            raise
+
+        retryable = error is not None or response.status_code in RETRY_STATUSES
+        if retryable and attempt < retries:
+            pause = _retry_after_seconds(response)
+            pause = _backoff_seconds(attempt) if pause is None else pause
+            if time.monotonic() + pause < budget_ends:
+                what = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+                print(f"🔁 LLM {name}: {what}, retrying in {pause:.2f}s (attempt {attempt + 2}/{retries + 1})")
+                time.sleep(pause)
+                attempt += 1
+                continue
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if circuit:
+            # Client errors (bad key, unknown model) are not provider degradation
+            circuit.record(not retryable, elapsed_ms)
+        if error is not None:
+            record_latency(name, elapsed_ms, None, attempt + 1, error=True)
+            raise error
+        record_latency(name, elapsed_ms, response.status_code, attempt + 1, error=response.status_code >= 400)
+        return response
+
+
+def stream_post(url: str, payload: Dict[str, Any], *, params=None, headers=None, timeout: float = 30,
+                name: str = "gemini_stream", breaker: Optional[str] = "gemini") -> requests.Response:
+    """
+    Open a streaming POST (e.g. streamGenerateContent?alt=sse) on the pooled session.
+
+    Retries/backoff apply only until response headers arrive (nothing has been
+    relayed yet); the recorded latency is time-to-first-byte.  The caller
+    iterates the body and must close the response.
+    """
+    circuit = get_breaker(breaker) if breaker else None
+    if circuit:
+        try:
+            circuit.before_call()
+        except CircuitOpenError:
+            _bump(name, "short_circuited")
+            raise
+
+    session = get_session()
+    headers = headers or {"Content-Type": "application/json"}
+    budget_ends = time.monotonic() + LLM_DEADLINE
+    started = time.perf_counter()
+    attempt = 0
+
+    while True:
+        response, error = None, None
+        try:
+            response = session.post(url, json=payload, params=params, headers=headers, stream=True,
+                                    timeout=(min(10, timeout), timeout))
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            error = exc
+
+        retryable = error is not None or response.status_code in RETRY_STATUSES
+        if retryable and attempt < LLM_MAX_RETRIES:
+            pause = _retry_after_seconds(response)
+            pause = _backoff_seconds(attempt) if pause is None else pause
+            if time.monotonic() + pause < budget_ends:
+                if response is not None:
+                    response.close()
+                time.sleep(pause)
+                attempt += 1
+                continue
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if circuit:
+            circuit.record(not retryable, elapsed_ms)
+        if error is not None:
+            record_latency(name, elapsed_ms, None, attempt + 1, error=True)
+            raise error
+        record_latency(name, elapsed_ms, response.status_code, attempt + 1, error=response.status_code >= 400)
+        return response
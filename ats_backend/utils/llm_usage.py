@@ -0,0 +1,358 @@
+"""
+Per-call LLM accounting: model, feature, user, tokens, latency and outcome.
+
+Call sites (utils/gemini.py, utils/llm_client.py) call record_llm_call()
+after every provider call.  Records are buffered in memory and written to the
+`llm_usage` table in batches by a background thread (every
+LLM_USAGE_FLUSH_SECONDS or LLM_USAGE_BATCH_SIZE records), so accounting never
+adds a DB round trip to the request path.  Writes and budget reads go through
+their own connection (get_dedicated_connection), never the request's.
+
+The user is ambient: controllers wrap their work in `usage_context(user_id)`
+(a ContextVar, so it follows the request into generators; thread pools must
+copy the context explicitly).
+
+Budgets: LLM_DAILY_TOKEN_BUDGET (0 = unlimited) per user per day, overridable
+per user in `llm_budgets`.  check_llm_budget() raises BudgetExceededError (a
+requests.RequestException, so existing fallbacks apply) before a call is made.
+"""
+
+import atexit
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import pymysql.cursors
+import requests
+
+from utils.db import get_db_connection, get_dedicated_connection
+
+LLM_USAGE_ENABLED = os.getenv("LLM_USAGE_ENABLED", "1") not in ("0", "false", "False")
+LLM_USAGE_FLUSH_SECONDS = float(os.getenv("LLM_USAGE_FLUSH_SECONDS", "5"))
+LLM_USAGE_BATCH_SIZE = int(os.getenv("LLM_USAGE_BATCH_SIZE", "200"))
+LLM_USAGE_BUFFER_MAX = int(os.getenv("LLM_USAGE_BUFFER_MAX", "10000"))
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "0"))
+# Per-user budget overrides are re-read from the DB at most this often (seconds)
+LLM_BUDGET_CACHE_SECONDS = 60
+
+GROUP_COLUMNS = {"feature": "feature", "model": "model", "user": "user_id", "outcome": "outcome", "day": "DATE(created_at)"}
+
+_current_user = contextvars.ContextVar("llm_usage_user", default=None)
+
+_buffer = deque()
+_buffer_cond = threading.Condition()
+_flushing: List[tuple] = []  # rows taken from the buffer by a flush still in progress
+_writer = None
+_dropped = 0
+
+_spent: Dict[Any, int] = {}  # (user_id, date) -> tokens spent today
+_overrides: Dict[Any, Any] = {}  # user_id -> (daily_tokens or None, loaded_at)
+_budget_lock = threading.Lock()
+
+
+class BudgetExceededError(requests.RequestException):
+    """Raised instead of calling the LLM once a user's daily token budget is spent."""
+
+
+@contextmanager
+def usage_context(user_id=None):
+    """Attribute LLM calls made inside the block to `user_id`."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def current_usage_user():
+    return _current_user.get()
+
+
+def ensure_llm_usage_schema(cursor) -> None:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            feature VARCHAR(32),
+            model VARCHAR(64),
+            user_id INT NULL,
+            prompt_tokens INT DEFAULT 0,
+            output_tokens INT DEFAULT 0,
+            cached_tokens INT DEFAULT 0,
+            total_tokens INT DEFAULT 0,
+            latency_ms INT,
+            outcome VARCHAR(32)
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_budgets (
+            user_id INT PRIMARY KEY,
+            daily_tokens INT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    for name, columns in (("idx_llm_usage_created", "created_at"), ("idx_llm_usage_user", "user_id, created_at")):
+        try:
+            cursor.execute(f"CREATE INDEX {name} ON llm_usage ({columns})")
+        except Exception:
+            pass  # Index already exists
+
+
+def usage_from_response(data) -> Dict[str, int]:
+    """Token counts from a Gemini response (or final stream event) usageMetadata."""
+    usage = (data.get("usageMetadata") if isinstance(data, dict) else None) or {}
+    prompt_tokens = int(usage.get("promptTokenCount") or 0)
+    output_tokens = int(usage.get("candidatesTokenCount") or 0) + int(usage.get("thoughtsTokenCount") or 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": int(usage.get("cachedContentTokenCount") or 0),
+        "total_tokens": int(usage.get("totalTokenCount") or prompt_tokens + output_tokens),
+    }
+
+
+def failure_outcome(exc: Exception) -> str:
+    """Outcome label for a call that raised instead of returning a response."""
+    from utils.circuit_breaker import CircuitOpenError
+    from utils.llm_scheduler import SchedulerTimeoutError
+
+    if isinstance(exc, BudgetExceededError):
+        return "budget_exceeded"
+    if isinstance(exc, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(exc, SchedulerTimeoutError):
+        return "queue_timeout"
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    return "error"
+
+
+def record_llm_call(feature: str, model: str, latency_ms: float, outcome: str = "ok",
+                    usage: Optional[Dict[str, int]] = None, user_id=None) -> None:
+    """Queue one accounting record (never blocks on the DB)."""
+    global _dropped
+    if not LLM_USAGE_ENABLED:
+        return
+    usage = usage or {}
+    user_id = user_id if user_id is not None else _current_user.get()
+    row = (
+        datetime.now(), feature, model, user_id,
+        usage.get("prompt_tokens", 0), usage.get("output_tokens", 0),
+        usage.get("cached_tokens", 0), usage.get("total_tokens", 0),
+        int(round(latency_ms)), outcome,
+    )
+    if user_id is not None and usage.get("total_tokens"):
+        with _budget_lock:
+            key = (user_id, date.today())
+            if key in _spent:
+                _spent[key] += usage["total_tokens"]
+
+    _start_writer()
+    with _buffer_cond:
+        if len(_buffer) >= LLM_USAGE_BUFFER_MAX:
+            _buffer.popleft()
+            _dropped += 1
+        _buffer.append(row)
+        if len(_buffer) >= LLM_USAGE_BATCH_SIZE:
+            _buffer_cond.notify()
+
+
+def flush_llm_usage() -> int:
+    """Write everything buffered so far; returns the number of rows written."""
+    with _buffer_cond:
+        rows = list(_buffer)
+        _buffer.clear()
+        _flushing.extend(rows)
+    if not rows:
+        return 0
+
+    conn = get_dedicated_connection("llm_usage")
+    cursor = conn.cursor() if conn else None
+    try:
+        if cursor is None:
+            raise RuntimeError("no database connection")
+        cursor.executemany("""
+            INSERT INTO llm_usage
+            (created_at, feature, model, user_id, prompt_tokens, output_tokens, cached_tokens, total_tokens, latency_ms, outcome)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        return len(rows)
+    except Exception as e:
+        print(f"⚠️ Could not write {len(rows)} LLM usage records: {e}")
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        with _buffer_cond:
+            # Keep them for the next flush (oldest are dropped if the buffer is full)
+            room = LLM_USAGE_BUFFER_MAX - len(_buffer)
+            if room > 0:
+                _buffer.extendleft(reversed(rows[-room:]))
+        return 0
+    finally:
+        if cursor is not None:
+            cursor.close()
+        with _buffer_cond:
+            del _flushing[:len(rows)]
+
+
+def _writer_loop() -> None:
+    while True:
+        with _buffer_cond:
+            _buffer_cond.wait(LLM_USAGE_FLUSH_SECONDS)
+        flush_llm_usage()
+
+
+def _start_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _budget_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, daemon=True, name="llm-usage-writer")
+            _writer.start()
+            atexit.register(flush_llm_usage)
+
+
+def usage_buffer_stats() -> Dict[str, int]:
+    with _buffer_cond:
+        return {"buffered": len(_buffer), "dropped": _dropped}
+
+
+# ---------------- Budgets ----------------
+
+def _query_one(sql, params) -> Optional[Dict[str, Any]]:
+    conn = get_dedicated_connection("llm_usage")
+    if not conn:
+        return None
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def daily_budget(user_id) -> int:
+    """Tokens per day allowed for the user (0 = unlimited)."""
+    now = time.time()
+    with _budget_lock:
+        cached = _overrides.get(user_id)
+    if cached is None or now - cached[1] > LLM_BUDGET_CACHE_SECONDS:
+        try:
+            row = _query_one("SELECT daily_tokens FROM llm_budgets WHERE user_id = %s", (user_id,))
+        except Exception as e:
+            print(f"⚠️ Could not read LLM budget for user {user_id}: {e}")
+            row = None
+        cached = (row["daily_tokens"] if row else None, now)
+        with _budget_lock:
+            _overrides[user_id] = cached
+    return LLM_DAILY_TOKEN_BUDGET if cached[0] is None else int(cached[0])
+
+
+def tokens_spent_today(user_id) -> int:
+    key = (user_id, date.today())
+    with _budget_lock:
+        if key in _spent:
+            return _spent[key]
+    since = datetime.combine(key[1], datetime.min.time())
+    # Records not written yet are added from the buffer rather than flushed here
+    with _buffer_cond:
+        unwritten = sum(row[7] for row in (*_flushing, *_buffer) if row[3] == user_id and row[0] >= since)
+    row = _query_one(
+        "SELECT COALESCE(SUM(total_tokens), 0) AS spent FROM llm_usage WHERE user_id = %s AND created_at >= %s",
+        (user_id, since),
+    ) or {}
+    spent = int(row.get("spent") or 0) + unwritten
+    with _budget_lock:
+        # Drop yesterday's counters as days roll over
+        for stale in [k for k in _spent if k[1] != key[1]]:
+            del _spent[stale]
+        _spent.setdefault(key, spent)
+        return _spent[key]
+
+
+def check_llm_budget(user_id=None) -> None:
+    """Raise BudgetExceededError when the (ambient) user has spent today's budget."""
+    user_id = user_id if user_id is not None else _current_user.get()
+    if user_id is None or not LLM_USAGE_ENABLED:
+        return
+    budget = daily_budget(user_id)
+    if budget > 0 and tokens_spent_today(user_id) >= budget:
+        raise BudgetExceededError(f"Daily AI token budget of {budget} reached for user {user_id}")
+
+
+def set_daily_budget(user_id, daily_tokens: Optional[int]) -> None:
+    """Set (or with None, remove) a user's budget override."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM llm_budgets WHERE user_id = %s", (user_id,))
+        if daily_tokens is not None:
+            cursor.execute("INSERT INTO llm_budgets (user_id, daily_tokens) VALUES (%s, %s)", (user_id, int(daily_tokens)))
+        conn.commit()
+    finally:
+        cursor.close()
+    with _budget_lock:
+        _overrides.pop(user_id, None)
+
+
+# ---------------- Aggregates ----------------
+
+def usage_summary(group_by: str = "feature", since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, user_id=None) -> List[Dict[str, Any]]:
+    """Calls, tokens, latency and errors per `group_by` (feature/model/user/outcome/day)."""
+    column = GROUP_COLUMNS.get(group_by)
+    if column is None:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_COLUMNS)}")
+    flush_llm_usage()
+
+    clauses, params = [], []
+    if since:
+        clauses.append("created_at >= %s")
+        params.append(since)
+    if until:
+        clauses.append("created_at < %s")
+        params.append(until)
+    if user_id is not None:
+        clauses.append("user_id = %s")
+        params.append(user_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = get_dedicated_connection("llm_usage")
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(f"""
+            SELECT {column} AS bucket,
+                   COUNT(*) AS calls,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(output_tokens) AS output_tokens,
+                   SUM(cached_tokens) AS cached_tokens,
+                   SUM(total_tokens) AS total_tokens,
+                   AVG(latency_ms) AS avg_latency_ms,
+                   MAX(latency_ms) AS max_latency_ms,
+                   SUM(CASE WHEN outcome = 'ok' THEN 0 ELSE 1 END) AS failed
+            FROM llm_usage
+            {where}
+            GROUP BY {column}
+            ORDER BY total_tokens DESC
+        """, tuple(params))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    summary = []
+    for row in rows:
+        item = {group_by: row["bucket"]}
+        for key in ("calls", "prompt_tokens", "output_tokens", "cached_tokens", "total_tokens", "max_latency_ms", "failed"):
+            item[key] = int(row[key] or 0)
+        item["avg_latency_ms"] = round(float(row["avg_latency_ms"] or 0), 1)
+        summary.append(item)
+    return summary
@@ -0,0 +1,200 @@
+"""
+Per-call Gemini model selection.
+
+Instead of one global LLM_MODEL for every feature, route_models(feature,
+prompt_chars) returns the models to try for a call, best first; callers
+(utils/gemini.py, utils/llm_client.py) move on to the next one when a model
+fails (connection error, circuit open, 404/429/5xx).
+
+Policy per feature (LLM_ROUTING_POLICY, JSON, merged over DEFAULT_POLICY):
+
+    {"avatar": {"models": ["fast", "default"], "latency_target_ms": 3000},
+     "chat":   {"models": ["default", "fast"], "small_prompt_chars": 6000,
+                "small_models": ["fast", "default"]}}
+
+Entries are tier names (fast = LLM_FAST_MODEL, default = LLM_MODEL,
+strong = LLM_STRONG_MODEL) or literal model ids.  Both extra tiers default to
+LLM_MODEL, so nothing changes until LLM_FAST_MODEL / LLM_STRONG_MODEL are set.
+
+Ordering uses what we observe per (feature, model): an EWMA of successful
+call latency and consecutive failures.  A model whose EWMA is over the
+feature's latency target drops behind ones that meet it (until its last
+sample is LLM_ROUTING_REPROBE seconds old, then it gets another try); a model
+with LLM_ROUTING_FAILURES consecutive failures sits out LLM_ROUTING_COOLDOWN
+seconds (kept only as a last resort).  Decisions and fallbacks are counted
+for /api/ai/metrics.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL") or LLM_MODEL
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL") or LLM_MODEL
+LLM_ROUTING_FAILURES = int(os.getenv("LLM_ROUTING_FAILURES", "3"))
+LLM_ROUTING_COOLDOWN = float(os.getenv("LLM_ROUTING_COOLDOWN", "60"))
+LLM_ROUTING_EWMA_ALPHA = float(os.getenv("LLM_ROUTING_EWMA_ALPHA", "0.2"))
+LLM_ROUTING_REPROBE = float(os.getenv("LLM_ROUTING_REPROBE", "120"))
+
+TIERS = {"fast": LLM_FAST_MODEL, "default": LLM_MODEL, "strong": LLM_STRONG_MODEL}
+
+DEFAULT_POLICY: Dict[str, Dict[str, Any]] = {
+    "avatar": {"models": ["fast", "default"], "latency_target_ms": 3000},
+    "chat": {"models": ["default", "fast"], "latency_target_ms": 8000,
+             "small_prompt_chars": 6000, "small_models": ["fast", "default"]},
+    "jd": {"models": ["default", "fast"], "latency_target_ms": 10000},
+    "screening": {"models": ["strong", "default"], "latency_target_ms": 20000},
+    "screening_packed": {"models": ["strong", "default"], "latency_target_ms": 30000},
+}
+FALLBACK_POLICY = {"models": ["default"], "latency_target_ms": 10000}
+
+# Statuses worth retrying on another model (unknown model, rate limit, provider errors)
+FALLBACK_STATUSES = {404, 429, 500, 502, 503, 504}
+
+
+def _load_policy() -> Dict[str, Dict[str, Any]]:
+    policy = {feature: dict(rules) for feature, rules in DEFAULT_POLICY.items()}
+    raw = os.getenv("LLM_ROUTING_POLICY")
+    if not raw:
+        return policy
+    try:
+        overrides = json.loads(raw)
+    except ValueError as e:
+        print(f"⚠️ Ignoring LLM_ROUTING_POLICY (invalid JSON): {e}")
+        return policy
+    for feature, rules in (overrides or {}).items():
+        if isinstance(rules, dict):
+            policy.setdefault(feature, dict(FALLBACK_POLICY)).update(rules)
+    return policy
+
+
+POLICY = _load_policy()
+
+_lock = threading.Lock()
+_observed: Dict[Any, Dict[str, Any]] = {}  # (feature, model) -> ewma_ms, calls, failures, ...
+_decisions = defaultdict(int)  # (feature, model, reason) -> count
+_fallbacks = defaultdict(int)  # (feature, from_model, to_model) -> count
+
+
+def _resolve(names) -> List[str]:
+    models = []
+    for name in names or []:
+        model = TIERS.get(name, name)
+        if model and model not in models:
+            models.append(model)
+    return models or [LLM_MODEL]
+
+
+def primary_model(feature: str) -> str:
+    """The policy's first choice for `feature`, ignoring observed latency."""
+    return _resolve(POLICY.get(feature, FALLBACK_POLICY).get("models"))[0]
+
+
+def model_breaker(model: str) -> str:
+    """Circuit-breaker name per model, so one failing model doesn't block the others."""
+    return "gemini" if model == LLM_MODEL else f"gemini:{model}"
+
+
+def route_models(feature: str, prompt_chars: int = 0) -> List[str]:
+    """Models to try for this call, in order."""
+    rules = POLICY.get(feature, FALLBACK_POLICY)
+    small = prompt_chars and rules.get("small_models") and prompt_chars <= rules.get("small_prompt_chars", 0)
+    preferred = _resolve(rules["small_models"] if small else rules.get("models"))
+    target = rules.get("latency_target_ms")
+    now = time.time()
+
+    within, over, cooling = [], [], []
+    with _lock:
+        for model in preferred:
+            seen = _observed.get((feature, model))
+            if seen and seen["cooldown_until"] > now:
+                cooling.append(model)
+            elif (seen and target and seen["ewma_ms"] is not None and seen["ewma_ms"] > target
+                  and now - seen["sampled_at"] < LLM_ROUTING_REPROBE):
+                over.append((seen["ewma_ms"], model))
+            else:
+                within.append(model)
+        ordered = within + [model for _, model in sorted(over)] + cooling
+
+        chosen = ordered[0]
+        if chosen == preferred[0]:
+            reason = "small_prompt" if small else "preferred"
+        elif preferred[0] in cooling:
+            reason = "cooling_down"
+        else:
+            reason = "over_latency_target"
+        _decisions[(feature, chosen, reason)] += 1
+    return ordered
+
+
+def record_model_result(feature: str, model: str, latency_ms: float, ok: bool) -> None:
+    """Feed one call's outcome back into routing (latency only counts on success)."""
+    with _lock:
+        seen = _observed.setdefault((feature, model), {
+            "ewma_ms": None, "calls": 0, "failures": 0, "consecutive_failures": 0,
+            "cooldown_until": 0.0, "sampled_at": 0.0,
+        })
+        seen["calls"] += 1
+        if ok:
+            seen["sampled_at"] = time.time()
+            seen["consecutive_failures"] = 0
+            previous = seen["ewma_ms"]
+            seen["ewma_ms"] = latency_ms if previous is None else (
+                LLM_ROUTING_EWMA_ALPHA * latency_ms + (1 - LLM_ROUTING_EWMA_ALPHA) * previous
+            )
+            return
+        seen["failures"] += 1
+        seen["consecutive_failures"] += 1
+        if seen["consecutive_failures"] >= LLM_ROUTING_FAILURES:
+            seen["cooldown_until"] = time.time() + LLM_ROUTING_COOLDOWN
+
+
+def record_fallback(feature: str, from_model: str, to_model: str, cause) -> None:
+    print(f"🔀 LLM {feature}: {from_model} failed ({cause}); falling back to {to_model}")
+    with _lock:
+        _fallbacks[(feature, from_model, to_model)] += 1
+
+
+def should_fall_back(status_code: Optional[int]) -> bool:
+    return status_code in FALLBACK_STATUSES
+
+
+def routing_stats() -> Dict[str, Any]:
+    now = time.time()
+    with _lock:
+        features: Dict[str, Dict[str, Any]] = {}
+        for (feature, model), seen in _observed.items():
+            features.setdefault(feature, {"models": {}, "decisions": {}, "fallbacks": {}})["models"][model] = {
+                "ewma_ms": round(seen["ewma_ms"], 1) if seen["ewma_ms"] is not None else None,
+                "calls": seen["calls"],
+                "failures": seen["failures"],
+                "cooling_down": seen["cooldown_until"] > now,
+            }
+        for (feature, model, reason), count in _decisions.items():
+            decisions = features.setdefault(feature, {"models": {}, "decisions": {}, "fallbacks": {}})["decisions"]
+            decisions.setdefault(model, {})[reason] = count
+        for (feature, from_model, to_model), count in _fallbacks.items():
+            fallbacks = features.setdefault(feature, {"models": {}, "decisions": {}, "fallbacks": {}})["fallbacks"]
+            fallbacks[f"{from_model}->{to_model}"] = count
+
+    policy = {
+        feature: {
+            "models": _resolve(rules.get("models")),
+            "small_models": _resolve(rules["small_models"]) if rules.get("small_models") else None,
+            "small_prompt_chars": rules.get("small_prompt_chars"),
+            "latency_target_ms": rules.get("latency_target_ms"),
+        }
+        for feature, rules in POLICY.items()
+    }
+    return {"policy": policy, "features": features}
+
+
+def reset_routing_stats() -> None:
+    """Clear decision/fallback counters (observed latencies keep steering routing)."""
+    with _lock:
+        _decisions.clear()
+        _fallbacks.clear()
@@ -0,0 +1,182 @@
+"""
+Cheap skill-overlap / experience pre-ranking ahead of the LLM.
+
+The heuristic is the one `utils/gemini._fallback_screening` uses; here it
+is applied to the whole candidate pool at once.  Candidate skills are kept
+as a CSR-style sparse matrix (indptr / indices over a skill vocabulary), so
+scoring one requirement is a single boolean gather + cumulative sum over
+all non-zeros.  Batch screening sends only the top-K / above-threshold
+shortlist to the LLM.
+
+NumPy is optional: without it the same scores are computed in pure Python.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pymysql.cursors
+
+from utils.db import get_db_connection
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; scoring falls back to pure Python
+    np = None
+
+PRERANK_TOP_K = int(os.getenv("PRERANK_TOP_K", "50"))
+# Rebuild the cached index at least this often (seconds), even if no rows were added
+PRERANK_INDEX_TTL = float(os.getenv("PRERANK_INDEX_TTL", "60"))
+
+_index = None
+_index_signature = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def skills_set(value):
+    if not value:
+        return set()
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = re.split(r"[,/|]", str(value))
+    return {item.strip().lower() for item in items if item.strip()}
+
+
+def parse_experience(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def heuristic_score(overlap, required, experience):
+    """Skill overlap + experience score in [20, 100]; works on scalars and arrays."""
+    required = required or 1
+    raw = 40 + (overlap / required) * 40 + experience * 4
+    if np is not None and isinstance(raw, np.ndarray):
+        return np.clip(raw, 20, 100)
+    return min(100, max(20, raw))
+
+
+class SkillIndex:
+    """Sparse candidate x skill matrix built from `candidates` rows."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.vocab: Dict[str, int] = {}
+        ids, experience, indptr, indices = [], [], [0], []
+        for row in rows:
+            for skill in skills_set(row.get("skills")):
+                indices.append(self.vocab.setdefault(skill, len(self.vocab)))
+            indptr.append(len(indices))
+            ids.append(row["id"])
+            experience.append(parse_experience(row.get("experience")))
+
+        if np is not None:
+            self.ids = np.asarray(ids, dtype=np.int64)
+            self.experience = np.asarray(experience, dtype=np.float64)
+            self.indptr = np.asarray(indptr, dtype=np.int64)
+            self.indices = np.asarray(indices, dtype=np.int32)
+        else:
+            self.ids, self.experience, self.indptr, self.indices = ids, experience, indptr, indices
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, requirement: Dict[str, Any]):
+        """Heuristic score of every indexed candidate (same order as self.ids)."""
+        req_skills = skills_set(requirement.get("skills_required") or requirement.get("skills"))
+        required = len(req_skills) or 1
+        wanted = [self.vocab[s] for s in req_skills if s in self.vocab]
+
+        if np is not None:
+            mask = np.zeros(len(self.vocab) + 1, dtype=np.int32)
+            mask[wanted] = 1
+            hits = np.concatenate(([0], np.cumsum(mask[self.indices])))
+            overlap = hits[self.indptr[1:]] - hits[self.indptr[:-1]]
+            return heuristic_score(overlap, required, self.experience)
+
+        wanted = set(wanted)
+        scores = []
+        for row_no, experience in enumerate(self.experience):
+            row = self.indices[self.indptr[row_no]:self.indptr[row_no + 1]]
+            overlap = sum(1 for skill in row if skill in wanted)
+            scores.append(heuristic_score(overlap, required, experience))
+        return scores
+
+    def rank(self, requirement: Dict[str, Any], top_k: Optional[int] = None,
+             min_score: Optional[float] = None, candidate_ids=None) -> List[Tuple[int, float]]:
+        """
+        Shortlist as [(candidate_id, score)] best first (ties: lower id first).
+        candidate_ids restricts ranking to a subset of the pool.
+        """
+        scores = self.score(requirement)
+
+        if np is not None:
+            keep = np.ones(len(self.ids), dtype=bool)
+            if candidate_ids is not None:
+                keep &= np.isin(self.ids, np.fromiter((int(i) for i in candidate_ids), dtype=np.int64))
+            if min_score is not None:
+                keep &= scores >= float(min_score)
+            rows = np.flatnonzero(keep)
+            if top_k is not None and 0 < top_k < len(rows):
+                # Partial selection first, then order only the shortlist;
+                # ties at the cut-off go to the lowest ids
+                subset = scores[rows]
+                cutoff = -np.partition(-subset, top_k - 1)[top_k - 1]
+                above = rows[subset > cutoff]
+                tied = rows[subset == cutoff]
+                tied = tied[np.argsort(self.ids[tied], kind="stable")][:top_k - len(above)]
+                rows = np.concatenate((above, tied))
+            order = np.lexsort((self.ids[rows], -scores[rows]))
+            rows = rows[order]
+            return [(int(self.ids[r]), round(float(scores[r]), 2)) for r in rows]
+
+        allowed = {int(i) for i in candidate_ids} if candidate_ids is not None else None
+        ranked = [
+            (cid, score) for cid, score in zip(self.ids, scores)
+            if (allowed is None or cid in allowed) and (min_score is None or score >= float(min_score))
+        ]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        if top_k is not None and top_k > 0:
+            ranked = ranked[:top_k]
+        return [(int(cid), round(float(score), 2)) for cid, score in ranked]
+
+
+def get_skill_index() -> SkillIndex:
+    """Process-wide index over `candidates`, rebuilt when rows are added or after PRERANK_INDEX_TTL."""
+    global _index, _index_signature, _index_built_at
+
+    conn = get_db_connection()
+    if not conn:
+        return SkillIndex([])
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SELECT COUNT(*) AS total, MAX(id) AS max_id FROM candidates")
+        row = cursor.fetchone() or {}
+        signature = (row.get("total"), row.get("max_id"))
+
+        with _index_lock:
+            fresh = time.time() - _index_built_at < PRERANK_INDEX_TTL
+            if _index is not None and signature == _index_signature and fresh:
+                return _index
+
+            started = time.perf_counter()
+            cursor.execute("SELECT id, skills, experience FROM candidates")
+            _index = SkillIndex(cursor.fetchall())
+            _index_signature = signature
+            _index_built_at = time.time()
+            print(f"📇 Pre-rank index built: {len(_index)} candidates, {len(_index.vocab)} skills "
+                  f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+            return _index
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def prerank_candidates(requirement, top_k: Optional[int] = PRERANK_TOP_K,
+                       min_score: Optional[float] = None, candidate_ids=None) -> List[Tuple[int, float]]:
+    return get_skill_index().rank(requirement, top_k=top_k, min_score=min_score, candidate_ids=candidate_ids)
@@ -0,0 +1,149 @@
+"""
+Compact, normalised candidate profile digests for LLM prompts.
+
+One short line per candidate — deduplicated skills, numeric years of
+experience and the key education entry — computed when /submit-candidate or
+/update-candidate writes the row and stored in `candidates.profile_digest`.
+Screening prompts (utils/prompt_builder.py) and chat context
+(services/ai_data_service.py) send the digest instead of the raw TEXT fields.
+
+    skills: python, sql, react | exp: 4.5y | edu: B.Tech Computer Science, IIT Madras
+
+Rows written before the column existed (or by other paths) get their digest
+computed on the fly and are backfilled at startup.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import pymysql.cursors
+
+PROFILE_DIGEST_MAX_SKILLS = 25
+PROFILE_DIGEST_EDU_CHARS = 80
+PROFILE_DIGEST_TEXT_CHARS = 80
+
+_YEARS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*\+?\s*(?:years?|yrs?|y)\b", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*\+?\s*$")
+_DEGREE_RE = re.compile(
+    r"\b(ph\.?d|doctorate|m\.?tech|m\.e\b|m\.?sc|mba|mca|m\.com|master\w*|"
+    r"b\.?tech|b\.e\b|b\.?sc|b\.com|bca|bba|bachelor\w*|diploma)",
+    re.IGNORECASE,
+)
+
+# Fields the digest is derived from; chat context drops them in favour of "profile"
+DIGEST_SOURCE_FIELDS = ("skills", "experience", "education")
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def digest_skills(value) -> List[str]:
+    """Lower-cased skills in first-seen order, duplicates removed."""
+    if not value:
+        return []
+    items = value if isinstance(value, (list, tuple)) else re.split(r"[,/|;\n]", str(value))
+    seen, skills = set(), []
+    for item in items:
+        skill = " ".join(str(item).split()).lower()
+        if skill and skill not in seen:
+            seen.add(skill)
+            skills.append(skill)
+    return skills
+
+
+def digest_years(value) -> Optional[float]:
+    """Years of experience from '4', '4.5 years', '3+ yrs' ...; None when not numeric."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value)
+    match = _NUMBER_RE.match(text) or _YEARS_RE.search(text)
+    return float(match.group(1)) if match else None
+
+
+def digest_education(value) -> str:
+    """The entry naming the highest-looking degree, else the first entry, clipped."""
+    if not value:
+        return ""
+    entries = [entry.strip() for entry in re.split(r"[\n;]", str(value)) if entry.strip()]
+    if not entries:
+        return ""
+    key = next((entry for entry in entries if _DEGREE_RE.search(entry)), entries[0])
+    return _clip(key, PROFILE_DIGEST_EDU_CHARS)
+
+
+def build_profile_digest(skills=None, experience=None, education=None) -> str:
+    skill_list = digest_skills(skills)
+    shown = skill_list[:PROFILE_DIGEST_MAX_SKILLS]
+    skills_text = ", ".join(shown) if shown else "n/a"
+    if len(skill_list) > len(shown):
+        skills_text += f" (+{len(skill_list) - len(shown)} more)"
+
+    years = digest_years(experience)
+    if years is not None:
+        experience_text = f"{years:g}y"
+    elif experience:
+        experience_text = _clip(experience, PROFILE_DIGEST_TEXT_CHARS)
+    else:
+        experience_text = "n/a"
+
+    return f"skills: {skills_text} | exp: {experience_text} | edu: {digest_education(education) or 'n/a'}"
+
+
+def candidate_digest(candidate: Dict[str, Any]) -> str:
+    """Stored digest when present, else computed from the row."""
+    stored = (candidate or {}).get("profile_digest")
+    if stored:
+        return stored
+    candidate = candidate or {}
+    return build_profile_digest(candidate.get("skills"), candidate.get("experience"), candidate.get("education"))
+
+
+def compact_candidate_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat context view of a candidate row: raw skills/experience/education -> "profile"."""
+    if not row:
+        return row
+    compact = {key: value for key, value in row.items() if key not in DIGEST_SOURCE_FIELDS and key != "profile_digest"}
+    compact["profile"] = candidate_digest(row)
+    return compact
+
+
+def store_profile_digest(cursor, candidate_id, skills, experience, education) -> None:
+    cursor.execute(
+        "UPDATE candidates SET profile_digest = %s WHERE id = %s",
+        (build_profile_digest(skills, experience, education), candidate_id),
+    )
+
+
+def ensure_profile_digest_schema(cursor) -> None:
+    cursor.execute("SHOW COLUMNS FROM candidates LIKE 'profile_digest'")
+    if not cursor.fetchone():
+        print("⚠️ Adding 'profile_digest' column to candidates...")
+        cursor.execute("ALTER TABLE candidates ADD COLUMN profile_digest TEXT")
+
+
+def backfill_profile_digests(conn, batch_size: int = 500) -> int:
+    """Compute digests for rows that have none (e.g. created before the column existed)."""
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    updated = 0
+    try:
+        while True:
+            cursor.execute(
+                "SELECT id, skills, experience, education FROM candidates WHERE profile_digest IS NULL LIMIT %s",
+                (batch_size,),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                "UPDATE candidates SET profile_digest = %s WHERE id = %s",
+                [(build_profile_digest(r["skills"], r["experience"], r["education"]), r["id"]) for r in rows],
+            )
+            conn.commit()
+            updated += len(rows)
+    finally:
+        cursor.close()
+    return updated
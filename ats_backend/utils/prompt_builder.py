@@ -1,20 +1,48 @@
+from utils.profile_digest import candidate_digest
+
+# Bump whenever the screening prompt template changes; it is part of the
+# screening result cache key (utils/screening_cache.py).
+PROMPT_VERSION = "3"
+
+
 def _safe_get(record, key, fallback=""):
 	if not record:
 		return fallback
 	return record.get(key) or fallback
 
 
-def build_prompt(candidate, req):
-	"""
-	Build a resilient prompt for Gemini. Any missing DB fields are replaced
-	by friendly fallbacks so the AI call never crashes.
-	"""
-	candidate_name = _safe_get(candidate, "name", "Unknown Candidate")
-	candidate_skills = _safe_get(candidate, "skills", "Not provided")
-	candidate_experience = _safe_get(candidate, "experience", "Not provided")
-	candidate_education = _safe_get(candidate, "education", "Not provided")
+def _compact_profile(candidate):
+	"""One line per candidate: id + the stored profile digest."""
+	return f"- id={candidate.get('id')} | {candidate_digest(candidate)}"
+
+
+# Static instruction blocks come first so they can be sent once as a Gemini
+# cached-content prefix (utils/context_cache.py); the *_input builders hold
+# the per-call part.  Inline prompt = instructions + "\n\n" + input.
+PACKED_SCREENING_INSTRUCTIONS = """
+You are an AI recruiter. Evaluate EACH candidate independently against the requirement.
+Base your judgement strictly on the provided data. Never hallucinate new facts.
+
+Return ONLY a clean JSON array with exactly one object per candidate id:
+[
+  {"candidate_id": 1, "score": 85, "rationale": ["point 1", "point 2"], "recommend": "SHORTLISTED|REJECTED|NEEDS_INTERVIEW", "red_flags": []}
+]
+""".strip()
+
+SCREENING_INSTRUCTIONS = """
+You are an AI recruiter. Evaluate the candidate against the requirement.
+
+Return ONLY clean JSON:
+{
+  "score": 85,
+  "rationale": ["point 1", "point 2", "point 3"],
+  "recommend": "SCREENED",
+  "red_flags": []
+}
+""".strip()
 
-	req_title = _safe_get(req, "title", "Unknown Role")
+
+def _requirement_block(req, with_description=True):
 	req_skills = (
 		_safe_get(req, "skills_required")
 		or _safe_get(req, "skills")
@@ -25,52 +53,37 @@ def build_prompt(candidate, req):
 		or _safe_get(req, "experience")
 		or "Not provided"
 	)
-	req_description = _safe_get(req, "description", "Not provided")
+	lines = [
+		"Requirement:",
+		f"Title: {_safe_get(req, 'title', 'Unknown Role')}",
+		f"Skills Required: {req_skills}",
+		f"Experience Needed: {req_experience}",
+	]
+	if with_description:
+		lines.append(f"Description: {_safe_get(req, 'description', 'Not provided')}")
+	return "\n".join(lines)
 
-	return f"""
-You are an AI recruiter. Evaluate the candidate against the requirement.
-Base your judgement strictly on the provided data. Never hallucinate new facts.
 
-Candidate:
-Name: {candidate_name}
-Skills: {candidate_skills}
-Experience: {candidate_experience}
-Education: {candidate_education}
+def build_packed_input(candidates, req):
+	profiles = "\n".join(_compact_profile(candidate) for candidate in candidates)
+	return f"{_requirement_block(req)}\n\nCandidates ({len(candidates)}):\n{profiles}"
 
-Requirement:
-Title: {req_title}
-Skills Required: {req_skills}
-Experience Needed: {req_experience}
-Description: {req_description}
 
-Return ONLY clean JSON:
-{{
-  "score": 85,
-  "rationale": ["point 1", "point 2", "point 3"],
-  "recommend": "SHORTLISTED|REJECTED|NEEDS_INTERVIEW",
-  "red_flags": []
-}}
-""".strip()
-def build_prompt(candidate, req):
-    return f"""
-You are an AI recruiter. Evaluate the candidate against the requirement.
+def build_packed_prompt(candidates, req):
+	"""
+	One requirement + several compact candidate profiles in a single prompt.
+	The model must answer with a JSON array with one object per candidate id.
+	"""
+	return f"{PACKED_SCREENING_INSTRUCTIONS}\n\n{build_packed_input(candidates, req)}"
 
-Candidate:
-Name: {candidate['name']}
-Skills: {candidate['skills']}
-Experience: {candidate['experience']}
-Education: {candidate['education']}
 
-Requirement:
-Title: {req['title']}
-Skills Required: {req['skills_required']}
-Experience Needed: {req['experience_required']}
+def build_screening_input(candidate, req):
+	return (
+		f"Candidate:\nName: {_safe_get(candidate, 'name', 'Unknown Candidate')}\n"
+		f"Profile: {candidate_digest(candidate)}\n\n"
+		f"{_requirement_block(req, with_description=False)}"
+	)
 
-Return ONLY clean JSON:
-{{
-  "score": 85,
-  "rationale": ["point 1", "point 2", "point 3"],
-  "recommend": "SCREENED",
-  "red_flags": []
-}}
-"""
+
+def build_prompt(candidate, req):
+	return f"{SCREENING_INSTRUCTIONS}\n\n{build_screening_input(candidate, req)}"
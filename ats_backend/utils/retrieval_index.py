@@ -0,0 +1,470 @@
+"""
+In-process BM25 retrieval over ATS records for AI chat.
+
+search_records(question, user) returns the RETRIEVAL_TOP_N requirements,
+candidates, clients and interviews whose text best matches the question,
+whatever intent _detect_intent picked, filtered by the user's role scope
+(the same rules as the fetchers in services/ai_data_service).
+
+Each kind has an inverted index (term -> {slot: term frequency}) over its
+tokenized text fields.  Scoring gathers the postings of the question's terms
+into arrays and accumulates Okapi BM25 (k1=RETRIEVAL_BM25_K1,
+b=RETRIEVAL_BM25_B) with NumPy; without NumPy the same sums run in pure
+Python.
+
+Updates are incremental.  app.py's after_request hook passes every
+successful write to note_write(), which queues per-row work from
+WRITE_ROUTES:
+
+    "new"               pull rows with an id above the highest indexed one
+    "arg:<name>"        re-read the row whose id is the route's <name> argument
+    "arg:<name>@<col>"  re-read every row whose <col> is that argument
+    "response:<field>"  re-read the row whose id the response returned
+    "stale"             rebuild the kind
+
+A write route missing from WRITE_ROUTES marks stale the kinds whose table
+(KIND_TABLES) data_versions.ENDPOINT_TABLES says it writes, or every kind
+when it is in neither map; writers outside a request call mark_stale().
+utils/entity_index applies the same routing (write_actions) to its name
+tries, which is why WRITE_ROUTES also lists the recruiter kind.  The
+queue is applied at the start of the next search.  Allocations (used for
+recruiter scope) are reloaded when requirement_allocations' version changes,
+and everything is rebuilt after RETRIEVAL_INDEX_MAX_AGE seconds to pick up
+writes made by other processes.
+
+DB reads for updates run without the search lock, one updating thread at a
+time; finished indexes and row changes are swapped in under the lock.  While
+one search is updating, others search the index as it stands.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pymysql.cursors
+
+from utils.context_assembler import QUESTION_STOPWORDS
+from utils.data_versions import ENDPOINT_TABLES, table_versions
+from utils.db import get_db_connection
+from utils.entity_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; scoring falls back to pure Python
+    np = None
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") not in ("0", "false", "False")
+RETRIEVAL_TOP_N = int(os.getenv("RETRIEVAL_TOP_N", "8"))
+RETRIEVAL_INDEX_MAX_AGE = float(os.getenv("RETRIEVAL_INDEX_MAX_AGE", "300"))
+RETRIEVAL_BM25_K1 = float(os.getenv("RETRIEVAL_BM25_K1", "1.2"))
+RETRIEVAL_BM25_B = float(os.getenv("RETRIEVAL_BM25_B", "0.75"))
+
+# Longest text value kept in a returned record (the full text is indexed)
+RECORD_TEXT_LIMIT = 300
+
+# kind -> (SELECT over the main table aliased `t`, indexed text columns)
+SOURCES = {
+    "requirement": (
+        """
+        SELECT t.id, t.title, t.description, t.location, t.skills_required, t.experience_required,
+               t.status, t.client_id, c.name AS client_name
+        FROM requirements t
+        LEFT JOIN clients c ON c.id = t.client_id
+        """,
+        ("title", "description", "location", "skills_required", "status", "client_name"),
+    ),
+    "candidate": (
+        "SELECT t.id, t.name, t.email, t.skills, t.education, t.experience FROM candidates t",
+        ("name", "email", "skills", "education"),
+    ),
+    "client": (
+        "SELECT t.id, t.name, t.contact_person, t.email, t.address, t.status FROM clients t",
+        ("name", "contact_person", "email", "address"),
+    ),
+    "interview": (
+        """
+        SELECT t.id, t.candidate_id, t.requirement_id, t.category, t.stage, t.mode, t.interviewer,
+               t.status, t.date, t.time, cand.name AS candidate_name, r.title AS requirement_title,
+               r.client_id AS requirement_client_id
+        FROM interviews t
+        LEFT JOIN candidates cand ON cand.id = t.candidate_id
+        LEFT JOIN requirements r ON r.id = t.requirement_id
+        """,
+        ("candidate_name", "requirement_title", "stage", "category", "mode", "interviewer", "status"),
+    ),
+}
+
+# kind -> table its rows come from (for write routes only ENDPOINT_TABLES knows)
+KIND_TABLES = {
+    "requirement": "requirements",
+    "candidate": "candidates",
+    "client": "clients",
+    "interview": "interviews",
+    "recruiter": "users",
+}
+
+# View function name -> index work after a successful write (see module docstring);
+# kinds an index doesn't hold are skipped by it
+WRITE_ROUTES = {
+    "submit_candidate": [("candidate", "new")],
+    "update_candidate": [("candidate", "arg:id"), ("interview", "arg:id@candidate_id")],
+    "delete_candidate": [("candidate", "arg:id"), ("interview", "arg:id@candidate_id")],
+    "create_client": [("client", "new")],
+    "update_client": [("client", "arg:id"), ("requirement", "arg:id@client_id")],
+    "delete_client": [("client", "arg:id"), ("requirement", "arg:id@client_id"), ("interview", "stale")],
+    "create_requirement": [("requirement", "response:id")],
+    "update_requirement": [("requirement", "arg:req_id"), ("interview", "arg:req_id@requirement_id")],
+    "delete_requirement": [("requirement", "arg:req_id"), ("interview", "arg:req_id@requirement_id")],
+    "archive_requirements": [("interview", "stale")],
+    "create_interview": [("interview", "new")],
+    "recruiter_decision": [("interview", "new")],
+    "update_stage": [("interview", "stale")],
+    "signup": [("recruiter", "new")],
+    "add_user": [("recruiter", "new")],
+    "create_user": [("recruiter", "new")],  # the response carries no id
+    "update_user": [("recruiter", "arg:id")],
+    "update_user_status": [("recruiter", "arg:user_id")],
+    "delete_user": [("recruiter", "arg:id")],
+    # Pipeline writes that leave every indexed row alone
+    "assign_requirement": [],
+    "create_screening_process": [],
+    "update_stage_status": [],
+    "assign_candidate": [],
+    "screen_candidate": [],
+    "screen_batch": [],
+}
+
+
+class _KindIndex:
+    """BM25 postings for one kind; deleted documents leave an empty slot until the next rebuild."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.fields = SOURCES[kind][1]
+        self.slots: Dict[str, int] = {}  # str(id) -> slot
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+        self.max_id = None
+        self._lengths_array = None
+        self._arrays: Dict[str, Tuple[Any, Any]] = {}  # term -> (slots, tfs) as NumPy arrays
+
+    @property
+    def live(self) -> int:
+        return len(self.slots)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.remove(row["id"])
+        terms = Counter(token for field in self.fields for token in tokenize(str(row.get(field) or "")))
+        slot = len(self.docs)
+        self.docs.append(row)
+        self.lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            self.postings[term][slot] = tf
+            self._arrays.pop(term, None)
+        self.slots[str(row["id"])] = slot
+        self.total_length += self.lengths[slot]
+        if isinstance(row["id"], int) and (self.max_id is None or row["id"] > self.max_id):
+            self.max_id = row["id"]
+        self._lengths_array = None
+
+    def remove(self, doc_id) -> None:
+        slot = self.slots.pop(str(doc_id), None)
+        if slot is None:
+            return
+        row = self.docs[slot]
+        for field in self.fields:
+            for token in tokenize(str(row.get(field) or "")):
+                postings = self.postings.get(token)
+                if postings is not None:
+                    postings.pop(slot, None)
+                    self._arrays.pop(token, None)
+                    if not postings:
+                        del self.postings[token]
+        self.total_length -= self.lengths[slot]
+        self.docs[slot] = None
+        self.lengths[slot] = 0
+        self._lengths_array = None
+
+    def rows_where(self, column: str, value) -> List[Any]:
+        return [row["id"] for row in self.docs if row is not None and str(row.get(column)) == str(value)]
+
+    def _posting_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = self._arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+            )
+        return arrays
+
+    def score(self, terms: List[str]) -> Iterator[Tuple[float, int]]:
+        """(score, slot) for documents matching any term, best first (lazily, callers stop early)."""
+        if not self.live:
+            return
+        n = self.live
+        avgdl = max(self.total_length / n, 1.0)
+        k1, b = RETRIEVAL_BM25_K1, RETRIEVAL_BM25_B
+        matched = [(term, self.postings[term]) for term in set(terms) if term in self.postings]
+        if not matched:
+            return
+
+        if np is not None:
+            if self._lengths_array is None:
+                self._lengths_array = np.asarray(self.lengths, dtype=np.float64)
+            scores = np.zeros(len(self.docs), dtype=np.float64)
+            for term, postings in matched:
+                df = len(postings)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                slots, tf = self._posting_arrays(term)
+                norm = k1 * (1 - b + b * self._lengths_array[slots] / avgdl)
+                scores[slots] += idf * tf * (k1 + 1) / (tf + norm)
+            hits = np.flatnonzero(scores > 0)
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            for slot in hits:
+                yield float(scores[slot]), int(slot)
+            return
+
+        scores: Dict[int, float] = defaultdict(float)
+        for _term, postings in matched:
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for slot, tf in postings.items():
+                norm = k1 * (1 - b + b * self.lengths[slot] / avgdl)
+                scores[slot] += idf * tf * (k1 + 1) / (tf + norm)
+        yield from sorted(((score, slot) for slot, score in scores.items()), key=lambda item: (-item[0], item[1]))
+
+
+_lock = threading.RLock()  # guards the indexes while they are searched or changed
+_update_lock = threading.Lock()  # held by the one thread reading the DB to update them
+_kinds: Dict[str, _KindIndex] = {}
+_built_at = 0.0
+_pending: List[Tuple[str, str, Any]] = []  # (kind, action, value)
+_allocations: Dict[str, set] = {}
+_allocations_version = None
+_stats = {"searches": 0, "total_search_ms": 0.0, "rebuilds": 0, "row_updates": 0}
+
+
+def _select(kind: str, where: str = "", params: Tuple = ()) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    if not conn:
+        return []
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(SOURCES[kind][0] + where, params)
+        return [dict(row) for row in cursor.fetchall() or []]
+    finally:
+        cursor.close()
+
+
+def _build(kind: str) -> _KindIndex:
+    index = _KindIndex(kind)
+    for row in _select(kind):
+        index.add(row)
+    return index
+
+
+def _apply(kind: str, action: str, value) -> None:
+    """Apply one queued action (with _update_lock held): rows are read first, _lock only covers the change."""
+    index = _kinds.get(kind)
+    if index is None:
+        return  # built from scratch on first use anyway
+    if action == "stale":
+        fresh = _build(kind)
+        with _lock:
+            _kinds[kind] = fresh
+            _stats["rebuilds"] += 1
+        return
+    if action == "new":
+        gone = []
+        rows = _select(kind, " WHERE t.id > %s", (index.max_id,)) if index.max_id is not None else _select(kind)
+    else:
+        # Re-read the rows whose `column` equals the value, dropping ones that are gone
+        column, row_value = value
+        gone = [row_value] if column == "id" else index.rows_where(column, row_value)
+        rows = _select(kind, f" WHERE t.{column} = %s", (row_value,))
+    with _lock:
+        for doc_id in gone:
+            index.remove(doc_id)
+        for row in rows:
+            index.add(row)
+        _stats["row_updates"] += 1
+
+
+def _load_allocations() -> None:
+    global _allocations, _allocations_version
+    version = table_versions(("requirement_allocations",))
+    if version == _allocations_version and _allocations:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute("SELECT requirement_id, recruiter_id FROM requirement_allocations")
+        allocations: Dict[str, set] = defaultdict(set)
+        for row in cursor.fetchall() or []:
+            allocations[str(row["requirement_id"])].add(str(row["recruiter_id"]))
+    finally:
+        cursor.close()
+    _allocations, _allocations_version = allocations, version
+
+
+def _ensure_current() -> None:
+    """Full build when missing/old, else apply queued row work; skipped while another search updates."""
+    global _built_at
+    if not _update_lock.acquire(blocking=not _kinds):
+        return
+    try:
+        if not _kinds or time.time() - _built_at > RETRIEVAL_INDEX_MAX_AGE:
+            started = time.perf_counter()
+            # Queued work up to now is covered by the full read (writes are committed before they are noted)
+            with _lock:
+                _pending.clear()
+            fresh = {kind: _build(kind) for kind in SOURCES}
+            with _lock:
+                _kinds.clear()
+                _kinds.update(fresh)
+                _stats["rebuilds"] += len(fresh)
+                _built_at = time.time()
+            print(f"🔎 Retrieval index built ({', '.join(f'{k}={i.live}' for k, i in fresh.items())}) "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        while True:
+            with _lock:
+                if not _pending:
+                    break
+                item = _pending.pop(0)
+            _apply(*item)
+        _load_allocations()
+    finally:
+        _update_lock.release()
+
+
+def write_actions(
+    endpoint: Optional[str], view_args: Optional[Dict[str, Any]], response_json: Optional[Dict[str, Any]]
+) -> Optional[List[Tuple[str, str, Any]]]:
+    """
+    (kind, action, value) work for a successful write request: action is
+    "new", "stale" or "rows" with value (column, value).  None for a write
+    route no map knows, after which every kind must be rebuilt.
+    """
+    name = (endpoint or "").rsplit(".", 1)[-1]
+    if name not in WRITE_ROUTES:
+        if name not in ENDPOINT_TABLES:
+            return None
+        return [(kind, "stale", None) for kind, table in KIND_TABLES.items() if table in ENDPOINT_TABLES[name]]
+    actions = []
+    for kind, how in WRITE_ROUTES[name]:
+        if how in ("new", "stale"):
+            actions.append((kind, how, None))
+            continue
+        source, _, field = how.partition(":")
+        arg, _, column = field.partition("@")
+        value = (view_args or {}).get(arg) if source == "arg" else (response_json or {}).get(arg)
+        actions.append((kind, "rows", (column or "id", value)) if value is not None else (kind, "stale", None))
+    return actions
+
+
+def note_write(endpoint: Optional[str], view_args: Optional[Dict[str, Any]], response_json: Optional[Dict[str, Any]]) -> None:
+    """Queue index work for a successful write request (called from app.py's after_request)."""
+    actions = write_actions(endpoint, view_args, response_json)
+    if actions is None:
+        mark_stale()
+        return
+    queued = [action for action in actions if action[0] in SOURCES]
+    if queued:
+        with _lock:
+            _pending.extend(queued)
+
+
+def mark_stale(*kinds: str) -> None:
+    """Rebuild `kinds` (no arguments = every kind) on the next search."""
+    with _lock:
+        _pending.extend((kind, "stale", None) for kind in kinds or SOURCES)
+
+
+def _visible(kind: str, row: Dict[str, Any], user: Dict[str, Any]) -> bool:
+    role = (user.get("role") or "").upper()
+    if role in ("ADMIN", "DELIVERY_MANAGER"):
+        return True
+    if kind == "client":
+        return role in ("RECRUITER", "CLIENT") and (row.get("status") or "").upper() == "ACTIVE"
+    if kind == "requirement":
+        requirement_id, client_id = row.get("id"), row.get("client_id")
+    elif kind == "interview":
+        requirement_id, client_id = row.get("requirement_id"), row.get("requirement_client_id")
+    else:
+        return False  # candidates: ADMIN / DELIVERY_MANAGER only
+    if role == "RECRUITER":
+        return str(user.get("id")) in _allocations.get(str(requirement_id), ())
+    if role == "CLIENT":
+        return client_id is not None and str(client_id) == str(user.get("client_id"))
+    return False
+
+
+def _record(kind: str, row: Dict[str, Any], score: float) -> Dict[str, Any]:
+    record = {"type": kind, "relevance": round(score, 3)}
+    for key, value in row.items():
+        if key == "requirement_client_id":
+            continue
+        if isinstance(value, str) and len(value) > RECORD_TEXT_LIMIT:
+            value = value[:RECORD_TEXT_LIMIT] + "..."
+        record[key] = value
+    return record
+
+
+def search_records(question: str, user: Dict[str, Any], top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Top records of any kind for `question` that `user` may see, best first."""
+    if not RETRIEVAL_ENABLED:
+        return []
+    terms = [term for term in tokenize(question) if term not in QUESTION_STOPWORDS]
+    limit = RETRIEVAL_TOP_N if top_n is None else top_n
+    if not terms or limit <= 0:
+        return []
+
+    started = time.perf_counter()
+    _ensure_current()
+    with _lock:
+        hits = []
+        for kind, index in _kinds.items():
+            found = 0
+            for score, slot in index.score(terms):
+                row = index.docs[slot]
+                if _visible(kind, row, user or {}):
+                    hits.append(_record(kind, row, score))
+                    found += 1
+                    if found >= limit:
+                        break
+        _stats["searches"] += 1
+        _stats["total_search_ms"] += (time.perf_counter() - started) * 1000
+    hits.sort(key=lambda hit: -hit["relevance"])
+    return hits[:limit]
+
+
+def retrieval_index_stats() -> Dict[str, Any]:
+    with _lock:
+        searches = _stats["searches"]
+        return {
+            "enabled": RETRIEVAL_ENABLED,
+            "numpy": np is not None,
+            "documents": {kind: index.live for kind, index in _kinds.items()},
+            "terms": {kind: len(index.postings) for kind, index in _kinds.items()},
+            "pending_updates": len(_pending),
+            "searches": searches,
+            "avg_search_ms": round(_stats["total_search_ms"] / searches, 3) if searches else 0.0,
+            "rebuilds": _stats["rebuilds"],
+            "row_updates": _stats["row_updates"],
+        }
+
+
+def reset_retrieval_index_stats() -> None:
+    with _lock:
+        _stats["searches"] = 0
+        _stats["total_search_ms"] = 0.0
+        _stats["rebuilds"] = 0
+        _stats["row_updates"] = 0
@@ -0,0 +1,181 @@
+"""
+Content-addressed cache for AI screening results.
+
+Key = sha256(prompt template version + LLM model + rendered screening prompt),
+so any change to the candidate/requirement fields the prompt uses, to the
+template or to the model produces a new key.  Lookups hit an in-process LRU
+first, then the `screening_cache` table.  Lookups use the routing policy's
+first choice (current_model()); results are stored under the model that
+actually answered, so a result from a fallback model is never served as the
+primary's.  Only real LLM results are stored (never the heuristic fallback).
+
+Cache rows are read and written on their own connection
+(get_dedicated_connection), so storing a result never commits or rolls back
+the caller's pending writes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import pymysql.cursors
+
+from utils.db import get_dedicated_connection
+from utils.model_router import primary_model
+from utils.prompt_builder import PROMPT_VERSION, build_prompt
+
+SCREENING_CACHE_SIZE = int(os.getenv("SCREENING_CACHE_SIZE", "2048"))
+SCREENING_CACHE_ENABLED = os.getenv("SCREENING_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+_lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def current_model() -> str:
+    # The routing policy's first choice for screening (LLM_MODEL unless overridden)
+    return primary_model("screening")
+
+
+def screening_cache_key(candidate, requirement, model: Optional[str] = None) -> str:
+    prompt = build_prompt(candidate, requirement)
+    material = f"{PROMPT_VERSION}\n{model or current_model()}\n{prompt}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def ensure_screening_cache_schema(cursor) -> None:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS screening_cache (
+            cache_key CHAR(64) PRIMARY KEY,
+            candidate_id INT,
+            requirement_id VARCHAR(64),
+            model VARCHAR(100),
+            prompt_version VARCHAR(20),
+            result TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    try:
+        cursor.execute("CREATE INDEX idx_screening_cache_req ON screening_cache (requirement_id)")
+    except Exception:
+        pass  # Index already exists
+
+    # Where each stored screening came from: llm / fallback / memory / db
+    cursor.execute("SHOW COLUMNS FROM candidate_screening LIKE 'result_source'")
+    if not cursor.fetchone():
+        print("⚠️ Adding 'result_source' column to candidate_screening...")
+        cursor.execute("ALTER TABLE candidate_screening ADD COLUMN result_source VARCHAR(20) DEFAULT 'llm'")
+
+
+def _lru_get(key):
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is not None:
+            _lru.move_to_end(key)
+        return entry
+
+
+def _lru_put(key, entry):
+    with _lru_lock:
+        _lru[key] = entry
+        _lru.move_to_end(key)
+        while len(_lru) > SCREENING_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def get_cached_screening(key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Return (result, source) where source is 'memory' or 'db'; (None, None) on miss."""
+    if not SCREENING_CACHE_ENABLED:
+        return None, None
+
+    entry = _lru_get(key)
+    if entry is not None:
+        return entry["result"], "memory"
+
+    conn = get_dedicated_connection("screening_cache")
+    if not conn:
+        return None, None
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        cursor.execute(
+            "SELECT requirement_id, model, result FROM screening_cache WHERE cache_key = %s",
+            (key,),
+        )
+        row = cursor.fetchone()
+    except Exception as e:
+        print(f"⚠️ Screening cache lookup failed: {e}")
+        row = None
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not row:
+        return None, None
+    try:
+        result = json.loads(row["result"])
+    except (TypeError, ValueError):
+        return None, None
+    _lru_put(key, {"result": result, "requirement_id": row["requirement_id"], "model": row["model"]})
+    return result, "db"
+
+
+def store_cached_screening(key, candidate_id, requirement_id, result, model) -> None:
+    """Store an LLM result; `key` and `model` must name the model that produced it."""
+    if not SCREENING_CACHE_ENABLED:
+        return
+    _lru_put(key, {"result": result, "requirement_id": str(requirement_id), "model": model})
+
+    conn = get_dedicated_connection("screening_cache")
+    if not conn:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO screening_cache (cache_key, candidate_id, requirement_id, model, prompt_version, result)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE result=VALUES(result)
+        """, (key, candidate_id, requirement_id, model, PROMPT_VERSION, json.dumps(result)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Screening cache write failed: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def invalidate_screening_cache(requirement_id=None, model=None) -> Dict[str, int]:
+    """Drop cached results for a requirement and/or model (both None → everything)."""
+    with _lru_lock:
+        doomed = [
+            key for key, entry in _lru.items()
+            if (requirement_id is None or entry["requirement_id"] == str(requirement_id))
+            and (model is None or entry["model"] == model)
+        ]
+        for key in doomed:
+            del _lru[key]
+
+    clauses, params = [], []
+    if requirement_id is not None:
+        clauses.append("requirement_id = %s")
+        params.append(str(requirement_id))
+    if model is not None:
+        clauses.append("model = %s")
+        params.append(model)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    deleted = 0
+    conn = get_dedicated_connection("screening_cache")
+    if conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM screening_cache {where}", tuple(params))
+            deleted = cursor.rowcount or 0
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    return {"memory": len(doomed), "db": deleted}
@@ -0,0 +1,309 @@
+"""
+SQLite storage mode for local tests and benchmarks.
+
+Enabled with DB_BACKEND=sqlite (see utils/db.py).  The connection/cursor
+wrappers mimic the small part of the PyMySQL API the app uses and translate
+the MySQL-specific SQL found in this codebase:
+
+- `%s` placeholders, `ON DUPLICATE KEY UPDATE` / `VALUES(col)`, `INSERT IGNORE`
+- `AUTO_INCREMENT`, `ENUM(...)`, `UNIQUE KEY name (...)`, `ON UPDATE CURRENT_TIMESTAMP`
+- `SHOW TABLES LIKE`, `SHOW COLUMNS FROM ... LIKE`, `CREATE TABLE ... LIKE`, `USE db`
+- `DATE_FORMAT()`, `CONCAT()`, `NOW()`, `DATABASE()` and `FOR UPDATE [SKIP LOCKED]`
+
+It is not a general MySQL emulator; statements SQLite cannot run (e.g.
+`ALTER TABLE ... MODIFY`) raise, exactly where the MySQL migrations already
+wrap them in try/except.
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+import pymysql.cursors
+import pymysql.err
+
+# ENUM definitions captured from CREATE TABLE so SHOW COLUMNS can report them
+_enum_columns = {}
+
+_MYSQL_DATE_FORMAT = {
+    "%Y": "%Y", "%y": "%y", "%m": "%m", "%c": "%m", "%d": "%d", "%e": "%d",
+    "%H": "%H", "%h": "%I", "%i": "%M", "%s": "%S", "%S": "%S", "%p": "%p",
+    "%M": "%B", "%b": "%b", "%W": "%A", "%a": "%a", "%%": "%",
+}
+
+_ERROR_MAP = (
+    (sqlite3.IntegrityError, pymysql.err.IntegrityError),
+    (sqlite3.OperationalError, pymysql.err.OperationalError),
+    (sqlite3.ProgrammingError, pymysql.err.ProgrammingError),
+    (sqlite3.DatabaseError, pymysql.err.DatabaseError),
+)
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+
+# -------------------------------------
+# SQL helper functions registered on every connection
+# -------------------------------------
+def _date_format(value, fmt):
+    if value is None or fmt is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    py_fmt = re.sub(r"%[a-zA-Z%]", lambda m: _MYSQL_DATE_FORMAT.get(m.group(0), m.group(0)), fmt)
+    return parsed.strftime(py_fmt)
+
+
+def _concat(*parts):
+    if any(part is None for part in parts):
+        return None
+    return "".join(str(part) for part in parts)
+
+
+def _register_functions(conn, database_name):
+    conn.create_function("DATE_FORMAT", 2, _date_format)
+    conn.create_function("CONCAT", -1, _concat)
+    conn.create_function("DATABASE", 0, lambda: database_name)
+
+
+# -------------------------------------
+# MySQL -> SQLite translation
+# -------------------------------------
+def _split_literals(sql):
+    """Yield (is_literal, chunk) pieces so rewrites never touch quoted strings."""
+    pos = 0
+    for match in re.finditer(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"", sql):
+        if match.start() > pos:
+            yield False, sql[pos:match.start()]
+        yield True, match.group(0)
+        pos = match.end()
+    if pos < len(sql):
+        yield False, sql[pos:]
+
+
+def _rewrite_code(chunk, has_params):
+    if has_params:
+        chunk = chunk.replace("%s", "?").replace("%%", "%")
+    chunk = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", chunk, flags=re.I)
+    chunk = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", chunk, flags=re.I)
+    chunk = re.sub(r"\bFOR\s+UPDATE(\s+SKIP\s+LOCKED|\s+NOWAIT)?\b", "", chunk, flags=re.I)
+    return chunk
+
+
+def _rewrite_ddl(sql):
+    table_match = re.search(r"\bTABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?", sql, re.I)
+    table = table_match.group(1) if table_match else ""
+
+    def _enum(match):
+        _enum_columns[(table, match.group(1))] = f"enum({match.group(2)})"
+        return f"{match.group(1)} TEXT"
+
+    sql = re.sub(r"\b(\w+)\s+ENUM\s*\(([^)]*)\)", _enum, sql, flags=re.I)
+    sql = re.sub(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", "INTEGER PRIMARY KEY AUTOINCREMENT", sql, flags=re.I)
+    sql = re.sub(r"\bAUTO_INCREMENT\b", "", sql, flags=re.I)
+    sql = re.sub(r"\bON\s+UPDATE\s+CURRENT_TIMESTAMP\b", "", sql, flags=re.I)
+    sql = re.sub(r"\bUNIQUE\s+KEY\s+\w+\s*\(", "UNIQUE (", sql, flags=re.I)
+    sql = re.sub(r"\)\s*ENGINE\s*=\s*\w+[^;]*", ")", sql, flags=re.I)
+    return sql
+
+
+def translate(query, args=None):
+    """
+    Translate one MySQL statement.
+    Returns (kind, payload): ("sql", (sql, params)), ("show_columns", (table, pattern)) or ("noop", None).
+    """
+    stripped = query.strip().rstrip(";").strip()
+    has_params = args is not None
+
+    if re.match(r"^USE\s+\w+$", stripped, re.I):
+        return "noop", None
+
+    match = re.match(r"^SHOW\s+TABLES\s+LIKE\s+'([^']*)'$", stripped, re.I)
+    if match:
+        return "sql", ("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (match.group(1),))
+
+    match = re.match(r"^SHOW\s+COLUMNS\s+FROM\s+`?(\w+)`?(?:\s+LIKE\s+'([^']*)')?$", stripped, re.I)
+    if match:
+        return "show_columns", (match.group(1), match.group(2) or "%")
+
+    match = re.match(r"^CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s+LIKE\s+`?(\w+)`?$", stripped, re.I)
+    if match:
+        if_not_exists = "IF NOT EXISTS " if match.group(1) else ""
+        for (table, column), enum_type in list(_enum_columns.items()):
+            if table == match.group(3):
+                _enum_columns[(match.group(2), column)] = enum_type
+        return "sql", (f"CREATE TABLE {if_not_exists}{match.group(2)} AS SELECT * FROM {match.group(3)} WHERE 0", ())
+
+    if re.match(r"^(CREATE|ALTER)\s+TABLE\b", stripped, re.I):
+        stripped = _rewrite_ddl(stripped)
+
+    sql = "".join(
+        chunk if is_literal else _rewrite_code(chunk, has_params)
+        for is_literal, chunk in _split_literals(stripped)
+    )
+
+    # Upserts: SQLite >= 3.35 accepts a target-less DO UPDATE as the last clause
+    upsert = re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", sql, re.I)
+    if upsert:
+        tail = re.sub(r"\bVALUES\s*\(\s*(\w+)\s*\)", r"excluded.\1", sql[upsert.end():], flags=re.I)
+        sql = sql[:upsert.start()] + "ON CONFLICT DO UPDATE SET" + tail
+
+    params = tuple(args) if isinstance(args, (list, tuple)) else (() if args is None else (args,))
+    return "sql", (sql, params)
+
+
+# -------------------------------------
+# Connection / cursor wrappers
+# -------------------------------------
+class SQLiteCursor:
+    """PyMySQL-like cursor over sqlite3 (tuple rows or DictCursor-style dicts)."""
+
+    def __init__(self, owner, dict_rows=False):
+        self._owner = owner
+        self._cursor = owner._conn.cursor()
+        self._dict_rows = dict_rows
+        self._rows = None  # materialized rows for emulated SHOW statements
+
+    def _as_row(self, row, description):
+        if row is None or not self._dict_rows:
+            return row
+        return {col[0]: value for col, value in zip(description, row)}
+
+    def execute(self, query, args=None):
+        kind, payload = translate(query, args)
+        self._rows = None
+        try:
+            with self._owner._lock:
+                if kind == "noop":
+                    self._rows = []
+                    return 0
+                if kind == "show_columns":
+                    return self._show_columns(*payload)
+                sql, params = payload
+                self._cursor.execute(sql, params)
+        except sqlite3.Error as e:
+            for sqlite_error, mysql_error in _ERROR_MAP:
+                if isinstance(e, sqlite_error):
+                    raise mysql_error(str(e)) from e
+            raise
+        return self._cursor.rowcount
+
+    def executemany(self, query, seq_of_args):
+        total = 0
+        for args in seq_of_args:
+            total += max(self.execute(query, args) or 0, 0)
+        return total
+
+    def _show_columns(self, table, pattern):
+        self._cursor.execute(
+            """
+            SELECT name, type, CASE WHEN "notnull" THEN 'NO' ELSE 'YES' END,
+                   CASE WHEN pk THEN 'PRI' ELSE '' END, dflt_value, ''
+            FROM pragma_table_info(?) WHERE name LIKE ?
+            """,
+            (table, pattern),
+        )
+        names = ("Field", "Type", "Null", "Key", "Default", "Extra")
+        rows = []
+        for row in self._cursor.fetchall():
+            row = list(row)
+            row[1] = _enum_columns.get((table, row[0]), row[1])
+            rows.append(dict(zip(names, row)) if self._dict_rows else tuple(row))
+        self._rows = rows
+        return len(rows)
+
+    def fetchone(self):
+        if self._rows is not None:
+            return self._rows.pop(0) if self._rows else None
+        return self._as_row(self._cursor.fetchone(), self._cursor.description)
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        description = self._cursor.description
+        return [self._as_row(row, description) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [row for row in (self.fetchone() for _ in range(size)) if row is not None]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        if self._rows is not None:
+            return len(self._rows)
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        try:
+            self._cursor.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class SQLiteConnection:
+    """
+    Drop-in stand-in for utils.db.RobustConnection backed by sqlite3.
+    close() is a no-op like the MySQL wrapper; force_close() really closes.
+    """
+
+    def __init__(self, path=":memory:", database_name="ats_system", lock=None):
+        self.path = path
+        self._lock = lock or threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+        _register_functions(self._conn, database_name)
+
+    def cursor(self, *args, **kwargs):
+        cursor_class = kwargs.pop("cursor", args[0] if args else None)
+        dict_rows = bool(kwargs.pop("dictionary", False)) or (
+            isinstance(cursor_class, type) and issubclass(cursor_class, pymysql.cursors.DictCursor)
+        )
+        return SQLiteCursor(self, dict_rows=dict_rows)
+
+    def commit(self):
+        with self._lock:
+            return self._conn.commit()
+
+    def rollback(self):
+        with self._lock:
+            return self._conn.rollback()
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        return True
+
+    def is_connected(self):
+        return self._conn is not None
+
+    def close(self):
+        pass
+
+    def force_close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def open(self):
+        return self._conn is not None
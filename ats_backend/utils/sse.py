@@ -0,0 +1,15 @@
+import json
+
+
+def sse_event(data, event=None) -> str:
+    """Format one Server-Sent Events message (data is JSON-encoded unless already a str)."""
+    payload = data if isinstance(data, str) else json.dumps(data, default=str)
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in payload.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # disable proxy buffering (nginx)
+}